@@ -1,11 +1,17 @@
 import streamlit as st
 import plotly.express as px
-from utils import load_data, top_n
+from utils import derived, finish_rerun, get_store, histogram_bins, histogram_figure, map_points, plotly_chart, quality_report, render_search, render_warmup_status, start_rerun
 
 st.set_page_config(page_title="Home - Fome Zero", layout="wide")
 
-# Carrega dados
-df = load_data()
+profiler = start_rerun("home")
+
+# Carrega dados (frame + índice de culinárias, compartilhados entre sessões)
+store = get_store()
+df = store.view(["country", "city", "cuisines", "rating", "latitude", "longitude"])
+
+render_search(store)
+render_warmup_status()
 
 # --- Sidebar: filtros iniciais ---
 st.sidebar.header("Filtros iniciais")
@@ -13,7 +19,8 @@ st.sidebar.header("Filtros iniciais")
 # Segurança: checar se colunas existem e preparar opções
 country_options = df["country"].dropna().unique().tolist() if "country" in df.columns and df["country"].notna().sum() > 0 else []
 city_options = df["city"].dropna().unique().tolist() if "city" in df.columns and df["city"].notna().sum() > 0 else []
-cuisine_options = df["cuisines"].dropna().unique().tolist() if "cuisines" in df.columns and df["cuisines"].notna().sum() > 0 else []
+# culinárias individuais (a coluna original traz combinações como "Italian, Pizza")
+cuisine_options = store.cuisines.keys
 
 paises = st.sidebar.multiselect(
     "Selecione os países:",
@@ -27,12 +34,10 @@ selected_cuisines = st.sidebar.multiselect(
     default=None
 )
 
-# Aplica os filtros escolhidos
-df_filtered = df.copy()
-if paises:
-    df_filtered = df_filtered[df_filtered["country"].isin(paises)]
-if selected_cuisines:
-    df_filtered = df_filtered[df_filtered["cuisines"].isin(selected_cuisines)]
+# Aplica os filtros escolhidos: posições de linha via índices (sem cópias do frame).
+# Resultados derivados ficam no cache da sessão, chaveados pela seleção normalizada.
+rows = derived(store, "rows", lambda: store.select(countries=paises, cuisines=selected_cuisines),
+               paises, None, selected_cuisines)
 
 # --- Cabeçalho e descrição ---
 st.image("logo.png", width=160)
@@ -48,19 +53,20 @@ st.markdown("---")
 # --- Principais KPIs ---
 col1, col2, col3 = st.columns(3)
 
+# KPIs respondidos pelo cubo de agregados (sem varrer o frame filtrado)
+kpis = derived(store, "kpis", lambda: store.cube.query(countries=paises, cuisines=selected_cuisines),
+               paises, None, selected_cuisines)
+
 with col1:
-    n_countries = int(df_filtered["country"].nunique()) if "country" in df_filtered.columns and df_filtered["country"].notna().sum() > 0 else 0
-    st.metric("🌍 Nº de Países", f"{n_countries}")
+    st.metric("🌍 Nº de Países", f"{kpis['n_countries']}")
 
 with col2:
-    n_cities = int(df_filtered["city"].nunique()) if "city" in df_filtered.columns and df_filtered["city"].notna().sum() > 0 else 0
-    st.metric("🏙️ Nº de Cidades", f"{n_cities}")
+    st.metric("🏙️ Nº de Cidades", f"{kpis['n_cities']}")
 
 with col3:
     # média de rating com fallback
-    if df_filtered["rating"].notna().sum() > 0:
-        avg_rating = df_filtered["rating"].mean()
-        st.metric("⭐ Avaliação Média", f"{avg_rating:.2f}")
+    if kpis["rating_mean"] is not None:
+        st.metric("⭐ Avaliação Média", f"{kpis['rating_mean']:.2f}")
     else:
         st.metric("⭐ Avaliação Média", "—")
 
@@ -71,40 +77,57 @@ left, right = st.columns([1, 1])
 
 with left:
     st.subheader("Top Culinárias")
-    if "cuisines" in df_filtered.columns and df_filtered["cuisines"].notna().sum() > 0:
-        top_cuis = top_n(df_filtered, "cuisines", "name" if "name" in df_filtered.columns else df_filtered.columns[0], n=10)
+    cuisine_counts = derived(store, "cuisine_counts", lambda: store.cuisines.counts(rows=rows),
+                             paises, None, selected_cuisines)
+    top_cuis = (
+        cuisine_counts
+        .head(10)
+        .rename_axis("cuisines")
+        .reset_index(name="value")
+    )
+    if not top_cuis.empty:
         fig = px.bar(top_cuis, x="cuisines", y="value", labels={"value": "# Restaurantes", "cuisines": "Culinária"})
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig, use_container_width=True)
     else:
         st.info("Coluna 'cuisines' não encontrada ou sem dados no dataset.")
 
 with right:
-    st.subheader("Distribuição de Avaliações (amostra)")
-    if "rating" in df_filtered.columns and df_filtered["rating"].notna().sum() > 0:
-        # amostra para desempenho
-        sample = df_filtered.dropna(subset=["rating"])
-        sample = sample.sample(min(len(sample), 2000))
-        fig2 = px.histogram(sample, x="rating", nbins=20, title="Distribuição de avaliações")
-        st.plotly_chart(fig2, use_container_width=True)
+    st.subheader("Distribuição de Avaliações")
+    # contagem por faixa no servidor: todas as linhas, payload de 20 barras
+    bins = derived(store, "rating_bins", lambda: histogram_bins(store.frame(rows, ["rating"])["rating"], nbins=20),
+                   paises, None, selected_cuisines)
+    if bins["count"].sum() > 0:
+        fig2 = histogram_figure(bins, title="Distribuição de avaliações", x_label="rating")
+        plotly_chart(fig2, use_container_width=True)
     else:
         st.info("Sem dados de avaliação disponíveis para plotar.")
 
 st.markdown("---")
 
-# --- Mapa (amostragem controlada) ---
-st.subheader("📍 Distribuição geográfica (amostragem)")
+# --- Mapa (pontos agregados em grade, tamanho limitado) ---
+st.subheader("📍 Distribuição geográfica")
 
-if "latitude" in df_filtered.columns and "longitude" in df_filtered.columns and df_filtered[["latitude","longitude"]].notna().sum().sum() > 0:
-    map_df = df_filtered.dropna(subset=["latitude", "longitude"])
-    if len(map_df) == 0:
-        st.info("Sem coordenadas válidas para exibir no mapa.")
-    else:
-        # limitar amostra para performance
-        display_df = map_df.sample(500) if len(map_df) > 500 else map_df
-        st.map(display_df[["latitude", "longitude"]])
-        st.caption("Mapa amostrado para evitar lentidão. Use a aba 'Cidades' para análise geográfica mais detalhada.")
+map_df, map_zoom = derived(store, "map", lambda: store.geo.aggregate(rows, max_points=500),
+                           paises, None, selected_cuisines)
+if map_df.empty:
+    st.info("Sem coordenadas válidas para exibir no mapa.")
 else:
-    st.info("Colunas de coordenadas não encontradas (latitude/longitude) ou sem dados válidos.")
+    st.map(map_points(map_df, map_zoom), latitude="latitude", longitude="longitude", size="size", color="color")
+    st.caption(
+        "Restaurantes agregados em grade: tamanho = nº de restaurantes, cor = avaliação média. "
+        "Use a aba 'Cidades' para análise geográfica mais detalhada."
+    )
 
 st.markdown("---")
 st.caption("Dica: use os filtros no painel lateral para ajustar o universo de análise rapidamente.")
+
+# Relatório de qualidade do carregamento (duplicatas e valores inválidos)
+report = quality_report(store.df)
+if report:
+    st.caption(
+        f"Qualidade dos dados: {report['rows_out']:,} restaurantes únicos de {report['rows_in']:,} linhas "
+        f"({report['duplicate_rows']:,} duplicadas removidas; {report['not_rated']:,} sem avaliação e "
+        f"{report['invalid_prices']:,} preços inválidos tratados como nulos)."
+    )
+
+finish_rerun(profiler)
@@ -0,0 +1,446 @@
+"""
+Benchmark do caminho de dados do dashboard + gerador de dataset sintético.
+
+Gera CSVs no schema do Zomato (com a mesma distribuição assimétrica de países,
+cidades e culinárias do dataset real), roda headless as computações de cada
+página e reporta, por etapa: tempo de parede, pico de memória e throughput.
+
+Uso:
+    python benchmark.py --rows 10k 1M                  # gera (se preciso) e mede
+    python benchmark.py --rows 10k --save-baseline     # grava benchmark_baseline.json
+    python benchmark.py --rows 10k --baseline benchmark_baseline.json --fail-on-regression
+    python benchmark.py --rows 10M --generate-only     # só gera o CSV sintético
+
+Os CSVs ficam em dataset/.cache/bench/ (fora do git) e são reaproveitados.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+SEED_CSV = "dataset/zomato.csv"
+BENCH_DIR = Path("dataset") / utils.SNAPSHOT_DIRNAME / "bench"
+DEFAULT_BASELINE = "benchmark_baseline.json"
+GEN_CHUNK_ROWS = 500_000
+
+# faixas de avaliação do Zomato: (limite superior, texto, cor)
+RATING_BANDS = [
+    (2.5, "Poor", "CB202D"),
+    (3.5, "Average", "FFBA00"),
+    (4.0, "Good", "9ACD32"),
+    (4.5, "Very Good", "5BA829"),
+    (5.1, "Excellent", "3F7E00"),
+]
+
+
+def parse_rows(label):
+    """'10k' -> 10000, '1M' -> 1000000, '2500' -> 2500."""
+    label = str(label).strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(label[-1], 1)
+    number = label[:-1] if label[-1] in "km" else label
+    return int(float(number) * factor)
+
+
+def _zipf_weights(n, s=1.1):
+    w = 1.0 / np.arange(1, n + 1) ** s
+    return w / w.sum()
+
+
+# ---------------------------------------------------------------------------
+# Gerador sintético
+# ---------------------------------------------------------------------------
+
+class SyntheticProfile:
+    """
+    Distribuições extraídas do CSV real: países (moeda, custo típico), cidades
+    (centro geográfico), combinações de culinárias, nomes e bairros. As
+    frequências seguem Zipf sobre o ranking real, para manter a assimetria.
+    """
+
+    def __init__(self, seed_csv=SEED_CSV):
+        real = pd.read_csv(seed_csv, encoding="utf-8")
+        real.columns = [c.strip() for c in real.columns]
+        self.columns = list(real.columns)
+
+        countries = real["Country Code"].value_counts()
+        self.country_codes = countries.index.to_numpy()
+        self.country_weights = _zipf_weights(len(countries), s=0.9)
+        by_country = real.groupby("Country Code")
+        self.currency = by_country["Currency"].agg(lambda s: s.mode().iat[0])
+        self.cost = by_country["Average Cost for two"].median().clip(lower=1)
+
+        valid = real[(real["Latitude"] != 0) | (real["Longitude"] != 0)]
+        cities = valid.groupby(["Country Code", "City"]).agg(
+            n=("Restaurant ID", "size"), lat=("Latitude", "median"), lon=("Longitude", "median")
+        ).reset_index()
+        self.cities = {
+            code: group.sort_values("n", ascending=False).reset_index(drop=True)
+            for code, group in cities.groupby("Country Code")
+        }
+
+        combos = real["Cuisines"].dropna().value_counts()
+        self.cuisine_combos = combos.index.to_numpy(dtype=object)
+        self.cuisine_weights = _zipf_weights(len(combos))
+        self.names = real["Restaurant Name"].dropna().unique().astype(object)
+        self.localities = real["Locality"].dropna().unique().astype(object)
+
+    def generate(self, n_rows, rng, first_id=10_000_000, dup_rate=0.03):
+        """Um bloco de `n_rows` linhas no schema do Zomato (com ~dup_rate de linhas repetidas)."""
+        n_unique = max(int(n_rows * (1 - dup_rate)), 1)
+        country = rng.choice(self.country_codes, size=n_unique, p=self.country_weights)
+
+        city = np.empty(n_unique, dtype=object)
+        lat = np.empty(n_unique)
+        lon = np.empty(n_unique)
+        for code in np.unique(country):
+            idx = np.flatnonzero(country == code)
+            cities = self.cities[code]
+            pick = rng.choice(len(cities), size=len(idx), p=_zipf_weights(len(cities)))
+            city[idx] = cities["City"].to_numpy(dtype=object)[pick]
+            lat[idx] = cities["lat"].to_numpy()[pick] + rng.normal(0, 0.05, len(idx))
+            lon[idx] = cities["lon"].to_numpy()[pick] + rng.normal(0, 0.05, len(idx))
+
+        rated = rng.random(n_unique) > 0.03
+        rating = np.where(rated, np.clip(rng.normal(3.9, 0.45, n_unique), 1.8, 4.9).round(1), 0.0)
+        band = np.searchsorted([b[0] for b in RATING_BANDS], rating, side="right")
+        band = np.minimum(band, len(RATING_BANDS) - 1)
+        rating_text = np.where(rated, np.array([b[1] for b in RATING_BANDS], dtype=object)[band], "Not rated")
+        rating_color = np.where(rated, np.array([b[2] for b in RATING_BANDS], dtype=object)[band], "CBCBC8")
+
+        typical = self.cost.reindex(country).to_numpy()
+        ratio = rng.lognormal(0, 0.5, n_unique)
+        step = np.maximum(typical / 10, 1)
+        cost = (np.round(typical * ratio / step) * step).astype(np.int64)
+        price_range = np.digitize(ratio, [0.6, 1.0, 1.6]) + 1
+        locality = rng.choice(self.localities, size=n_unique)
+
+        frame = pd.DataFrame({
+            "Restaurant ID": np.arange(first_id, first_id + n_unique, dtype=np.int64),
+            "Restaurant Name": rng.choice(self.names, size=n_unique),
+            "Country Code": country,
+            "City": city,
+            "Address": pd.Series(locality) + ", " + pd.Series(city),
+            "Locality": locality,
+            "Locality Verbose": pd.Series(locality) + ", " + pd.Series(city),
+            "Longitude": lon.round(6),
+            "Latitude": lat.round(6),
+            "Cuisines": rng.choice(self.cuisine_combos, size=n_unique, p=self.cuisine_weights),
+            "Average Cost for two": cost,
+            "Currency": self.currency.reindex(country).to_numpy(),
+            "Has Table booking": (rng.random(n_unique) < 0.12).astype(np.int64),
+            "Has Online delivery": (rng.random(n_unique) < 0.25).astype(np.int64),
+            "Is delivering now": (rng.random(n_unique) < 0.01).astype(np.int64),
+            "Switch to order menu": 0,
+            "Price range": price_range,
+            "Aggregate rating": rating,
+            "Rating color": rating_color,
+            "Rating text": rating_text,
+            "Votes": np.where(rated, rng.lognormal(5, 1.5, n_unique), 0).astype(np.int64),
+        })
+        # linhas repetidas, como no dump real
+        dups = frame.iloc[rng.integers(0, n_unique, n_rows - n_unique)]
+        return pd.concat([frame, dups], ignore_index=True)[self.columns]
+
+
+def generate_csv(n_rows, path, seed=0, profile=None):
+    """Grava um CSV sintético de `n_rows` linhas em `path`, em blocos (memória limitada)."""
+    profile = profile or SyntheticProfile()
+    rng = np.random.default_rng(seed)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    written = 0
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        while written < n_rows:
+            n = min(GEN_CHUNK_ROWS, n_rows - written)
+            chunk = profile.generate(n, rng, first_id=10_000_000 + written)
+            chunk.to_csv(f, index=False, header=written == 0)
+            written += n
+    os.replace(tmp, path)
+    return path
+
+
+def dataset_for(n_rows, regenerate=False, seed=0):
+    path = BENCH_DIR / f"zomato_{n_rows}.csv"
+    if regenerate or not path.exists():
+        t0 = time.perf_counter()
+        generate_csv(n_rows, path, seed=seed)
+        print(f"  gerado {path} ({n_rows:,} linhas) em {time.perf_counter() - t0:.1f}s")
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Medição
+# ---------------------------------------------------------------------------
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Stage:
+    """
+    Mede uma etapa: tempo de parede e pico de RSS acima do início (amostrado
+    em uma thread a cada 5 ms; None fora do Linux).
+    """
+
+    def __init__(self, results, name, rows, calls=1):
+        self.results, self.name, self.rows, self.calls = results, name, rows, calls
+
+    def _sample(self):
+        while not self._done.is_set():
+            rss = _rss_bytes()
+            if rss is not None:
+                self._peak = max(self._peak, rss)
+            self._done.wait(0.005)
+
+    def __enter__(self):
+        self._start_rss = _rss_bytes()
+        self._peak = self._start_rss or 0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._t0
+        self._done.set()
+        self._thread.join()
+        end_rss = _rss_bytes()
+        peak = max(self._peak, end_rss or 0)
+        self.results[self.name] = {
+            "seconds": seconds,
+            "peak_mb": (peak - self._start_rss) / 1024 / 1024 if self._start_rss is not None else None,
+            "rows_per_s": self.rows / seconds if seconds > 0 else None,
+            "calls_per_s": self.calls / seconds if seconds > 0 else None,
+        }
+        return False
+
+
+def run_pipeline(path, repeat=3):
+    """Executa as etapas do dashboard sobre o CSV em `path`; retorna dict etapa -> métricas."""
+    results = {}
+    snap = utils.snapshot_path(path)
+    snap.unlink(missing_ok=True)
+
+    with Stage(results, "read_csv_normalized", rows=0):
+        df = utils.read_csv_normalized(path)
+    n = len(df)
+    for name in results:
+        results[name]["rows_per_s"] = n / results[name]["seconds"]
+    for stage, seconds in df.attrs.get("load_timings", {}).items():
+        results[f"  load.{stage}"] = {"seconds": seconds, "peak_mb": None, "rows_per_s": n / seconds if seconds else None, "calls_per_s": None}
+
+    with Stage(results, "snapshot_write", rows=n):
+        utils._write_snapshot(df, snap)
+    with Stage(results, "snapshot_read", rows=n):
+        df = utils.read_dataset(path)
+    memory = utils.memory_report(df)
+    results["memory_mb"] = {"seconds": None, "peak_mb": memory["bytes"].iat[-1] / 1024 / 1024,
+                            "rows_per_s": None, "calls_per_s": None}
+    # as três colunas mais pesadas (a última linha do relatório é o TOTAL)
+    for column, nbytes in memory[["column", "bytes"]].iloc[:3].itertuples(index=False):
+        results[f"  memory.{column}"] = {"seconds": None, "peak_mb": nbytes / 1024 / 1024,
+                                         "rows_per_s": None, "calls_per_s": None}
+
+    with Stage(results, "build_store", rows=n):
+        store = utils.DataStore(df)
+
+    # partida com projeção: só STORE_COLUMNS saem do snapshot; filtro de país empurrado ao leitor
+    with Stage(results, "build_store_projected", rows=n):
+        utils.build_store(str(path))
+    # store compartilhado: publicação (uma vez por máquina) e partida de uma réplica nova
+    shared = Path(path).parent / utils.SNAPSHOT_DIRNAME / utils.SHARED_DIRNAME / "benchmark"
+    with Stage(results, "shared_publish", rows=n):
+        utils.publish_store(utils.DataStore(df), shared)
+    with Stage(results, "shared_attach", rows=n):
+        utils.attach_store(shared)
+    top_country = store.countries.counts().index[0]
+    with Stage(results, "scan_pushdown", rows=n):
+        utils.scan_dataset(str(path), columns=["country", "rating"], filters={"country": [top_country]})
+
+    with Stage(results, "top_n", rows=n * 2, calls=2):
+        utils.top_n(df, "country", "rating", n=10)
+        utils.top_n(df, "cuisines", "rating", n=10)
+
+    countries = store.countries.counts().index[:5].tolist()
+    cuisines = store.cuisines.counts().index[:3].tolist()
+
+    # Home: seleção, KPIs, top culinárias, histograma, mapa
+    filters = [(None, None), (countries[:3], None), (None, cuisines[:1]), (countries[:1], cuisines)]
+    with Stage(results, "page_home", rows=n * len(filters) * repeat, calls=len(filters) * repeat):
+        for _ in range(repeat):
+            for c, q in filters:
+                rows = store.select(countries=c, cuisines=q)
+                store.cube.query(countries=c, cuisines=q)
+                store.cuisines.counts(rows=rows).head(10)
+                utils.histogram_bins(store.frame(rows, ["rating"])["rating"])
+                store.geo.aggregate(rows, max_points=500)
+
+    # tabelas de top restaurantes com as colunas das páginas de País e Cidades
+    top_cols = [c for c in utils.WARM_TOP_COLUMNS if c in store.columns]
+    city_cols = [c for c in utils.WARM_CITY_COLUMNS if c in store.columns]
+
+    # Países: KPIs, histograma e top 10 por país
+    with Stage(results, "page_country", rows=n * len(countries) * repeat, calls=len(countries) * repeat):
+        for _ in range(repeat):
+            for c in countries:
+                rows = store.select(countries=[c])
+                store.cube.query(countries=[c])
+                utils.histogram_bins(store.frame(rows, ["rating"])["rating"])
+                store.frame(store.top_k(k=10, by="rating_score", countries=[c]), top_cols)
+
+    # Cidades: contagem, boxplot das top 8, mapa e top 50
+    with Stage(results, "page_city", rows=n * len(countries) * repeat, calls=len(countries) * repeat):
+        for _ in range(repeat):
+            for c in countries:
+                country_rows = store.select(countries=[c])
+                cities = store.cities.counts(rows=country_rows).index[:8].tolist()
+                rows = store.select(countries=[c], cities=cities)
+                store.cube.query(countries=[c], cities=cities)
+                subset = store.frame(rows, ["city", "rating"])
+                utils.box_stats(subset["city"], subset["rating"], order=cities)
+                store.geo.aggregate(rows, max_points=500)
+                store.frame(store.top_k(rows, k=50, by="rating_score"), city_cols)
+
+    # Culinárias: contagem, boxplot das top 12, agregado por culinária
+    with Stage(results, "page_cuisines", rows=n * len(countries) * repeat, calls=len(countries) * repeat):
+        for _ in range(repeat):
+            for c in countries:
+                rows = store.select(countries=[c])
+                counts = store.cuisines.counts(rows=rows)
+                top = counts.index[:12].tolist()
+                subset = store.cuisines.explode(store.df, top, ["rating"], rows=rows)
+                utils.box_stats(subset["key"], subset["rating"], order=top)
+                store.cuisines.aggregate(store.df["rating"], rows=rows)
+
+    # Proximidade: raio de 5 km e 10 vizinhos a partir de restaurantes aleatórios
+    rng = np.random.default_rng(0)
+    valid = np.flatnonzero(store.geo.valid)
+    probes = rng.choice(valid, size=min(20, len(valid)), replace=False) if len(valid) else []
+    with Stage(results, "page_nearby", rows=0, calls=len(probes)):
+        for r in probes:
+            lat, lon = float(store.df["latitude"].iat[r]), float(store.df["longitude"].iat[r])
+            store.spatial.within(lat, lon, 5.0)
+            store.spatial.nearest(lat, lon, k=10, exclude=r)
+    results["page_nearby"]["rows_per_s"] = None
+
+    # busca na sidebar: índice textual (uma vez) e consultas com prefixo e erro de digitação
+    with Stage(results, "search_build", rows=n):
+        _ = store.search_index
+    names = store.df["name"].dropna().sample(10, random_state=0, replace=True).astype(str).tolist()
+    queries = names + [q[:4] for q in names] + [q[1:] for q in names]
+    with Stage(results, "search", rows=0, calls=len(queries)):
+        for q in queries:
+            store.search(q, k=10)
+    results["search"]["rows_per_s"] = None
+
+    # pré-aquecimento completo (store + seleções padrão de todas as páginas, por país)
+    with Stage(results, "warmup", rows=n):
+        warm = utils.Warmup(str(path)).start()
+        warm.wait()
+    if not warm.ready:
+        raise RuntimeError(f"pré-aquecimento falhou: {warm.error}")
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Relatório e comparação com baseline
+# ---------------------------------------------------------------------------
+
+def _fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def report(size, results, baseline=None, tolerance=0.25):
+    """Imprime a tabela de uma execução; retorna lista de regressões (etapa, razão)."""
+    base = (baseline or {}).get("results", {}).get(str(size), {})
+    regressions = []
+    print(f"\n== {size:,} linhas ==")
+    print(f"{'etapa':<26}{'tempo (s)':>11}{'pico (MB)':>11}{'linhas/s':>14}{'chamadas/s':>12}{'vs base':>10}")
+    for name, m in results.items():
+        ratio = ""
+        old = base.get(name, {}).get("seconds")
+        if old and m["seconds"] is not None:
+            r = m["seconds"] / old
+            ratio = f"{r:.2f}x"
+            # ignora ruído em etapas muito curtas
+            if r > 1 + tolerance and m["seconds"] - old > 0.02 and not name.startswith(" "):
+                ratio += " !"
+                regressions.append((name, r))
+        print(f"{name:<26}{_fmt(m['seconds'], '.4f'):>11}{_fmt(m['peak_mb'], '.1f'):>11}"
+              f"{_fmt(m['rows_per_s'], ',.0f'):>14}{_fmt(m['calls_per_s'], ',.1f'):>12}{ratio:>10}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do caminho de dados do Fome Zero")
+    parser.add_argument("--rows", nargs="+", default=["10k"], help="tamanhos (ex.: 10k 1M 10M)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="repetições das etapas de página")
+    parser.add_argument("--regenerate", action="store_true", help="regera os CSVs sintéticos")
+    parser.add_argument("--generate-only", action="store_true")
+    parser.add_argument("--output", help="grava os resultados em JSON")
+    parser.add_argument("--baseline", help="JSON de referência para comparação")
+    parser.add_argument("--save-baseline", action="store_true", help=f"grava os resultados em {DEFAULT_BASELINE}")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="piora relativa tolerada (0.25 = 25%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="sai com código 1 se houver regressão")
+    args = parser.parse_args()
+
+    sizes = [parse_rows(r) for r in args.rows]
+    print("Datasets sintéticos:")
+    paths = {n: dataset_for(n, regenerate=args.regenerate, seed=args.seed) for n in sizes}
+    if args.generate_only:
+        return 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    output = {
+        "meta": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+    regressions = []
+    for n, path in paths.items():
+        results = run_pipeline(path, repeat=args.repeat)
+        output["results"][str(n)] = results
+        regressions += [(n, name, r) for name, r in report(n, results, baseline, args.tolerance)]
+
+    for target in filter(None, [args.output, DEFAULT_BASELINE if args.save_baseline else None]):
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"\nresultados gravados em {target}")
+
+    if regressions:
+        print("\nRegressões acima da tolerância:")
+        for n, name, r in regressions:
+            print(f"  {n:,} linhas / {name}: {r:.2f}x mais lento")
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
 import streamlit as st
-import plotly.express as px
-from utils import load_data
+from utils import derived, finish_rerun, get_store, histogram_bins, histogram_figure, plotly_chart, render_search, render_warmup_status, start_rerun
 
 st.set_page_config(page_title="Países - Fome Zero", layout="wide")
 
+profiler = start_rerun("country")
+
 # Sidebar com logo e filtro
 with st.sidebar:
     st.image("logo.png", width=160)
@@ -11,7 +12,13 @@ with st.sidebar:
     st.title("🌍 Países")
 
 # Carrega dados
-df = load_data()
+store = get_store()
+df = store.view([
+    "country", "name", "cuisines", "rating", "Votes", "rating_score", "score_pct_country", "price_num", "price_usd",
+])
+
+render_search(store)
+render_warmup_status()
 
 st.title("📊 Visão por País")
 st.markdown("Esta página apresenta uma análise consolidada por país, sem detalhamento de cidades.")
@@ -23,33 +30,36 @@ if "country" not in df.columns:
 
 # Sidebar - filtro com opção "Todos"
 with st.sidebar:
-    countries = sorted(df["country"].dropna().unique().tolist())
+    countries = store.countries.keys
     countries_with_all = ["Todos"] + countries
     country_selected = st.selectbox("Selecione o país", countries_with_all)
 
-# Filtrar
-if country_selected == "Todos":
-    df_country = df.copy()
-else:
-    df_country = df[df["country"] == country_selected]
+# Filtrar (posições de linha; só as colunas usadas são materializadas)
+country_filter = None if country_selected == "Todos" else [country_selected]
+rows = derived(store, "rows", lambda: store.select(countries=country_filter), country_filter, None, None)
 
 st.markdown(f"### 🌐 País selecionado: **{country_selected}**")
 st.markdown("---")
 
-# KPIs revisados
+# KPIs revisados (cubo de agregados)
+kpis = derived(store, "kpis", lambda: store.cube.query(countries=country_filter), country_filter, None, None)
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    st.metric("🍽️ Restaurantes cadastrados", f"{len(df_country):,}")
+    st.metric("🍽️ Restaurantes cadastrados", f"{kpis['count']:,}")
 
 with col2:
-    avg_rating = df_country["rating"].mean() if "rating" in df_country.columns and df_country["rating"].notna().sum() > 0 else None
+    avg_rating = kpis["rating_mean"]
     st.metric("⭐ Avaliação média", f"{avg_rating:.2f}" if avg_rating else "—")
 
 with col3:
-    if "price_num" in df_country.columns and df_country["price_num"].notna().sum() > 0:
-        avg_price = df_country["price_num"].median()
-        st.metric("💰 Ticket mediano", f"R$ {avg_price:,.2f}")
+    # preço para dois, convertido para dólar (cada país tem sua moeda local)
+    if kpis["price_median"] is not None:
+        avg_price = kpis["price_median"]
+        st.metric("💰 Ticket mediano (US$)", f"US$ {avg_price:,.2f}")
+        if country_selected in store.price_quantiles.index:
+            local = store.price_quantiles.loc[country_selected]
+            st.caption(f"Em moeda local: {local['currency_code']} {local['local_q50']:,.2f}")
     else:
         st.metric("💰 Ticket mediano", "—")
 
@@ -57,15 +67,11 @@ st.markdown("---")
 
 # Distribuição de rating
 st.subheader("Distribuição de Avaliação (Rating)")
-if "rating" in df_country.columns and df_country["rating"].notna().sum() > 0:
-    fig = px.histogram(
-        df_country,
-        x="rating",
-        nbins=20,
-        title="Distribuição de notas dos restaurantes",
-        labels={"rating": "Avaliação"}
-    )
-    st.plotly_chart(fig, use_container_width=True)
+bins = derived(store, "rating_bins", lambda: histogram_bins(store.frame(rows, ["rating"])["rating"], nbins=20),
+               country_filter, None, None)
+if bins["count"].sum() > 0:
+    fig = histogram_figure(bins, title="Distribuição de notas dos restaurantes", x_label="Avaliação")
+    plotly_chart(fig, use_container_width=True)
 else:
     st.info("Dados de avaliação não disponíveis para este contexto.")
 
@@ -74,13 +80,19 @@ st.markdown("---")
 # Top restaurantes (APENAS PAÍS ou Todos)
 st.subheader("🏆 Top restaurantes (melhores avaliações)")
 
-cols_display = [c for c in ["name", "cuisines", "rating", "price_num"] if c in df_country.columns]
+cols_display = [
+    c for c in ["name", "cuisines", "rating", "Votes", "rating_score", "score_pct_country", "price_num", "price_usd"]
+    if c in df.columns
+]
 
-top_table = (
-    df_country
-    .sort_values(by="rating", ascending=False)
-    .head(10)[cols_display]
-    .reset_index(drop=True)
+# top-k servido da ordem pré-computada por país, pela nota ponderada por votos
+top_table = derived(
+    store, "top_table",
+    lambda: store.frame(store.top_k(k=10, by="rating_score", countries=country_filter), cols_display).reset_index(drop=True),
+    country_filter, None, None, 10,
 )
 
 st.dataframe(top_table)
+st.caption("Ordem pela nota ponderada por votos (rating_score); score_pct_country = percentil no país (1 = melhor).")
+
+finish_rerun(profiler)
@@ -1,9 +1,11 @@
 import streamlit as st
 import plotly.express as px
-from utils import load_data, top_n
+from utils import box_figure, box_stats, derived, finish_rerun, get_store, map_points, plotly_chart, render_search, render_warmup_status, start_rerun
 
 st.set_page_config(page_title="Cidades - Fome Zero", layout="wide")
 
+profiler = start_rerun("city")
+
 # Sidebar com logo e filtros (funil)
 with st.sidebar:
     st.image("logo.png", width=160)
@@ -11,7 +13,14 @@ with st.sidebar:
     st.title("🏙️ Cidades")
 
 # Carrega dados
-df = load_data()
+store = get_store()
+df = store.view([
+    "country", "city", "name", "cuisines", "rating", "Votes", "rating_score", "score_pct_city",
+    "price_num", "price_usd", "latitude", "longitude",
+])
+
+render_search(store)
+render_warmup_status()
 
 # Validação básica
 if "country" not in df.columns or df["country"].dropna().empty:
@@ -19,16 +28,15 @@ if "country" not in df.columns or df["country"].dropna().empty:
     st.stop()
 
 # Country selector (inclui "Todos")
-country_list = sorted(df["country"].dropna().unique().tolist())
+country_list = store.countries.keys
 country_options = ["Todos"] + country_list
 country_selected = st.sidebar.selectbox("Selecione o país", country_options, index=0)
 
 # City selector dependente do país (se "Todos", mostrar todas as cidades)
-if country_selected == "Todos":
-    cities_for_country = df["city"].dropna().unique().tolist()
-else:
-    cities_for_country = df[df["country"] == country_selected]["city"].dropna().unique().tolist()
-cities_for_country = sorted(cities_for_country)
+country_filter = None if country_selected == "Todos" else [country_selected]
+country_rows = derived(store, "rows", lambda: store.select(countries=country_filter), country_filter, None, None)
+city_counts = derived(store, "city_counts", lambda: store.cities.counts(rows=country_rows), country_filter, None, None)
+cities_for_country = sorted(city_counts.index.tolist())
 
 city_selected = st.sidebar.multiselect(
     "Selecione a(s) cidade(s)",
@@ -36,15 +44,10 @@ city_selected = st.sidebar.multiselect(
     default=cities_for_country if len(cities_for_country) <= 10 else cities_for_country[:10]
 )
 
-# Aplica filtros: país e cidade (cidade só se selecionada)
-if country_selected == "Todos":
-    df_country = df.copy()
-else:
-    df_country = df[df["country"] == country_selected].copy()
-
-df_filtered = df_country.copy()
-if city_selected:
-    df_filtered = df_country[df_country["city"].isin(city_selected)]
+# Aplica filtros: país e cidade (cidade só se selecionada) via índices de linha
+# (resultados derivados ficam no cache da sessão, chaveados pela seleção normalizada)
+rows = derived(store, "rows", lambda: store.select(countries=country_filter, cities=city_selected),
+               country_filter, city_selected, None)
 
 # Cabeçalho
 title_country = "Todos os países" if country_selected == "Todos" else country_selected
@@ -52,31 +55,32 @@ st.title(f"🏙️ Visão por Cidade — {title_country}")
 st.markdown("Análise detalhada das cidades do país selecionado. Use o filtro de cidade para afinar o universo.")
 
 # KPIs por seleção (macro por país / micro por cidades selecionadas)
+kpis = derived(store, "kpis", lambda: store.cube.query(countries=country_filter, cities=city_selected),
+               country_filter, city_selected, None)
 col1, col2, col3 = st.columns(3)
 with col1:
-    st.metric("🍽️ Restaurantes (no universo filtrado)", f"{len(df_filtered):,}")
+    st.metric("🍽️ Restaurantes (no universo filtrado)", f"{kpis['count']:,}")
 with col2:
-    if df_filtered["rating"].notna().sum() > 0:
-        st.metric("⭐ Avaliação média (filtrada)", f"{df_filtered['rating'].mean():.2f}")
+    if kpis["rating_mean"] is not None:
+        st.metric("⭐ Avaliação média (filtrada)", f"{kpis['rating_mean']:.2f}")
     else:
         st.metric("⭐ Avaliação média (filtrada)", "—")
 with col3:
-    if "price_num" in df_filtered.columns and df_filtered["price_num"].notna().sum() > 0:
-        st.metric("💰 Ticket mediano (filtrado)", f"{df_filtered['price_num'].median():.2f}")
+    if kpis["price_median"] is not None:
+        st.metric("💰 Ticket mediano (filtrado, US$)", f"US$ {kpis['price_median']:.2f}")
     else:
-        st.metric("💰 Ticket mediano (filtrado)", "—")
+        st.metric("💰 Ticket mediano (filtrado, US$)", "—")
 
 st.markdown("---")
 
 # --- Top cidades por número de restaurantes (robusto) ---
 st.subheader("Top cidades por número de restaurantes")
-if "city" in df_country.columns and df_country["city"].notna().sum() > 0:
-    vc = df_country["city"].value_counts().head(20).reset_index()
-    vc.columns = ["city", "count"]
+vc = city_counts.head(20).rename_axis("city").reset_index(name="count")
+if not vc.empty:
     fig1 = px.bar(vc, x="count", y="city", orientation="h",
                   labels={"count":"# Restaurantes", "city":"Cidade"},
                   title=f"Top cidades em {title_country}")
-    st.plotly_chart(fig1, use_container_width=True)
+    plotly_chart(fig1, use_container_width=True)
 else:
     st.info("Sem dados de cidade para este contexto.")
 
@@ -84,19 +88,27 @@ st.markdown("---")
 
 # --- Distribuição de rating por cidade (robusto) ---
 st.subheader("Distribuição de avaliações por cidade")
-if df_filtered["rating"].notna().sum() > 0 and "city" in df_filtered.columns:
+if kpis["rating_mean"] is not None:
     # escolher cidades a plotar: selecionadas > top por volume
     if city_selected:
         cities_plot = city_selected
     else:
-        cities_plot = vc["city"].tolist()[:8] if not vc.empty else df_country["city"].dropna().unique().tolist()[:8]
-
-    subset = df_filtered[df_filtered["city"].isin(cities_plot)]
-    if not subset.empty:
-        fig2 = px.box(subset, x="city", y="rating", points="outliers",
-                      labels={"rating":"Avaliação","city":"Cidade"},
-                      title="Boxplot de avaliações por cidade")
-        st.plotly_chart(fig2, use_container_width=True)
+        cities_plot = vc["city"].tolist()[:8] if not vc.empty else cities_for_country[:8]
+
+    # com cidades selecionadas é a mesma seleção de `rows` (mesma chave no cache)
+    plot_rows = derived(store, "rows", lambda: store.select(countries=country_filter, cities=cities_plot),
+                        country_filter, cities_plot, None)
+
+    # quartis/bigodes calculados no servidor; só outliers extremos vão ao navegador
+    def city_box_stats():
+        subset = store.frame(plot_rows, ["city", "rating"])
+        return box_stats(subset["city"], subset["rating"], order=cities_plot)
+
+    stats = derived(store, "city_box", city_box_stats, country_filter, tuple(cities_plot))
+    if not stats.empty:
+        fig2 = box_figure(stats, title="Boxplot de avaliações por cidade",
+                          x_label="Cidade", y_label="Avaliação")
+        plotly_chart(fig2, use_container_width=True)
     else:
         st.info("Sem dados suficientes para plotar avaliações por cidade.")
 else:
@@ -105,12 +117,12 @@ else:
 st.markdown("---")
 
 # --- Mapa das cidades filtradas ---
-st.subheader("📍 Mapa das cidades selecionadas (amostragem)")
-if "latitude" in df_filtered.columns and "longitude" in df_filtered.columns and df_filtered[["latitude","longitude"]].notna().sum().sum() > 0:
-    map_df = df_filtered.dropna(subset=["latitude","longitude"])
-    display_df = map_df.sample(500) if len(map_df) > 500 else map_df
-    st.map(display_df[["latitude", "longitude"]])
-    st.caption("Mapa amostrado — zoom para explorar concentrações locais.")
+st.subheader("📍 Mapa das cidades selecionadas")
+map_df, map_zoom = derived(store, "map", lambda: store.geo.aggregate(rows, max_points=500),
+                           country_filter, city_selected, None)
+if not map_df.empty:
+    st.map(map_points(map_df, map_zoom), latitude="latitude", longitude="longitude", size="size", color="color")
+    st.caption("Restaurantes agregados em grade: tamanho = nº de restaurantes, cor = avaliação média.")
 else:
     st.info("Sem coordenadas válidas para exibição no mapa desta aba.")
 
@@ -118,9 +130,19 @@ st.markdown("---")
 
 # Tabela: top restaurantes por avaliação dentro do universo filtrado
 st.subheader("Top restaurantes (por avaliação) — universo filtrado")
-display_cols = [c for c in ["name", "city", "cuisines", "rating", "price_num"] if c in df_filtered.columns]
+display_cols = [
+    c for c in ["name", "city", "cuisines", "rating", "Votes", "rating_score", "score_pct_city", "price_num", "price_usd"]
+    if c in df.columns
+]
 if display_cols:
-    table = df_filtered.sort_values(by="rating", ascending=False).head(50)[display_cols].fillna("-")
+    table = derived(
+        store, "city_top_table",
+        lambda: store.frame(store.top_k(rows, k=50, by="rating_score"), display_cols).astype(object).fillna("-"),
+        country_filter, city_selected, None, 50,
+    )
     st.dataframe(table)
+    st.caption("Ordem pela nota ponderada por votos (rating_score); score_pct_city = percentil na cidade (1 = melhor).")
 else:
     st.info("Não há colunas suficientes para exibir tabela de top restaurantes.")
+
+finish_rerun(profiler)
@@ -1,17 +1,26 @@
 import streamlit as st
 import plotly.express as px
-from utils import load_data, top_n
+from utils import box_figure, box_stats, derived, finish_rerun, get_store, plotly_chart, render_search, render_warmup_status, start_rerun
 
 st.set_page_config(page_title="Culinárias - Fome Zero", layout="wide")
 
+profiler = start_rerun("cuisines")
+
 # Sidebar com logo e filtros (funil país -> cidade -> culinária)
 with st.sidebar:
     st.image("logo.png", width=160)
     st.markdown("---")
     st.title("🍽️ Culinárias")
 
-# Carrega dados
-df = load_data()
+# Carrega dados (frame + índice de culinárias individuais)
+store = get_store()
+df = store.view([
+    "country", "city", "name", "cuisines", "rating", "Votes", "rating_score", "score_pct_cuisine",
+    "price_num", "price_usd",
+])
+
+render_search(store)
+render_warmup_status()
 
 # Validação
 if "country" not in df.columns or df["country"].dropna().empty:
@@ -19,38 +28,33 @@ if "country" not in df.columns or df["country"].dropna().empty:
     st.stop()
 
 # País selector (inclui Todos)
-country_list = sorted(df["country"].dropna().unique().tolist())
+country_list = store.countries.keys
 country_options = ["Todos"] + country_list
 country_selected = st.sidebar.selectbox("Selecione o país", country_options, index=0)
 
 # Cidades disponíveis para o país (dependente do país selecionado)
-if country_selected == "Todos":
-    cities_for_country = df["city"].dropna().unique().tolist()
-else:
-    cities_for_country = df[df["country"] == country_selected]["city"].dropna().unique().tolist()
-cities_for_country = sorted(cities_for_country)
+country_filter = None if country_selected == "Todos" else [country_selected]
+country_rows = derived(store, "rows", lambda: store.select(countries=country_filter), country_filter, None, None)
+city_counts = derived(store, "city_counts", lambda: store.cities.counts(rows=country_rows), country_filter, None, None)
+cities_for_country = sorted(city_counts.index.tolist())
 city_options = ["Todos"] + cities_for_country
 city_selected = st.sidebar.selectbox("Selecione a cidade (opcional)", city_options)
 
-# Filtrar por país e cidade
-if country_selected == "Todos":
-    df_country = df.copy()
-else:
-    df_country = df[df["country"] == country_selected].copy()
+# Filtrar por país e cidade (posições de linha, sem cópias do frame).
+# Resultados derivados ficam no cache da sessão, chaveados pela seleção normalizada.
+city_filter = None if city_selected == "Todos" else [city_selected]
+country_city_rows = derived(store, "rows", lambda: store.select(countries=country_filter, cities=city_filter),
+                            country_filter, city_filter, None)
 
-if city_selected != "Todos":
-    df_country_city = df_country[df_country["city"] == city_selected]
-else:
-    df_country_city = df_country
-
-# Cuisines disponíveis com base no país/cidade selecionados
-cuisines_available = sorted(df_country_city["cuisines"].dropna().unique().tolist())
+# Cuisines disponíveis com base no país/cidade selecionados (culinárias individuais)
+cuisine_counts = derived(store, "cuisine_counts", lambda: store.cuisines.counts(rows=country_city_rows),
+                         country_filter, city_filter, None)
+cuisines_available = sorted(cuisine_counts.index.tolist())
 cuisine_selected = st.sidebar.multiselect("Selecione culinária(s)", options=cuisines_available, default=None)
 
 # Filtrar principal
-df_filtered = df_country_city.copy()
-if cuisine_selected:
-    df_filtered = df_filtered[df_filtered["cuisines"].isin(cuisine_selected)]
+rows = derived(store, "rows", lambda: store.select(countries=country_filter, cities=city_filter, cuisines=cuisine_selected),
+               country_filter, city_filter, cuisine_selected)
 
 # Cabeçalho
 title_country = "Todos os países" if country_selected == "Todos" else country_selected
@@ -59,31 +63,28 @@ st.title(f"🍽️ Análise de Culinárias — {title_country}{title_city}")
 st.markdown("Explore a performance de tipos de culinária no contexto selecionado.")
 
 # KPIs rápidos
+kpis = derived(store, "kpis", lambda: store.cube.query(countries=country_filter, cities=city_filter, cuisines=cuisine_selected),
+               country_filter, city_filter, cuisine_selected)
 col1, col2, col3 = st.columns(3)
 with col1:
     st.metric("🍽️ Tipos de culinária disponíveis", f"{len(cuisines_available)}")
 with col2:
-    if df_filtered["rating"].notna().sum() > 0:
-        st.metric("⭐ Avaliação média (filtrada)", f"{df_filtered['rating'].mean():.2f}")
+    if kpis["rating_mean"] is not None:
+        st.metric("⭐ Avaliação média (filtrada)", f"{kpis['rating_mean']:.2f}")
     else:
         st.metric("⭐ Avaliação média (filtrada)", "—")
 with col3:
-    if "price_num" in df_filtered.columns and df_filtered["price_num"].notna().sum() > 0:
-        st.metric("💰 Ticket mediano (filtrado)", f"{df_filtered['price_num'].median():.2f}")
+    if kpis["price_median"] is not None:
+        st.metric("💰 Ticket mediano (filtrado, US$)", f"US$ {kpis['price_median']:.2f}")
     else:
-        st.metric("💰 Ticket mediano (filtrado)", "—")
+        st.metric("💰 Ticket mediano (filtrado, US$)", "—")
 
 st.markdown("---")
 
 # --- Top culinárias por número de restaurantes (sempre útil) ---
 st.subheader("Top Culinárias (por número de restaurantes)")
 if cuisines_available:
-    vc = (
-        df_country_city["cuisines"]
-        .value_counts()
-        .reset_index(name="count")
-        .rename(columns={"index": "cuisines"})
-    )
+    vc = cuisine_counts.rename_axis("cuisines").reset_index(name="count")
     vc_top = vc.head(20)
 
     fig = px.bar(
@@ -94,7 +95,7 @@ if cuisines_available:
         labels={"count":"# Restaurantes","cuisines":"Culinária"},
         title="Top culinárias no contexto"
     )
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
 else:
     st.info("Nenhuma culinária disponível no contexto selecionado.")
 
@@ -108,10 +109,19 @@ top_n_cuis = st.slider("Mostrar top N culinárias por volume", min_value=5, max_
 top_cuis_list = vc.head(top_n_cuis)["cuisines"].tolist() if 'vc' in locals() and not vc.empty else []
 
 if top_cuis_list:
-    subset = df_country_city[df_country_city["cuisines"].isin(top_cuis_list) & df_country_city["rating"].notna()]
-    if not subset.empty:
-        fig_box = px.box(subset, x="cuisines", y="rating", points="outliers", labels={"rating":"Avaliação","cuisines":"Culinária"}, title="Boxplot de avaliação por culinária (Top selecionado)")
-        st.plotly_chart(fig_box, use_container_width=True)
+    def cuisine_box_stats():
+        subset = (
+            store.cuisines.explode(df, top_cuis_list, ["rating"], rows=country_city_rows)
+            .rename(columns={"key": "cuisines"})
+            .dropna(subset=["rating"])
+        )
+        return box_stats(subset["cuisines"], subset["rating"], order=top_cuis_list)
+
+    stats = derived(store, "cuisine_box", cuisine_box_stats, country_filter, city_filter, tuple(top_cuis_list))
+    if not stats.empty:
+        fig_box = box_figure(stats, title="Boxplot de avaliação por culinária (Top selecionado)",
+                             x_label="Culinária", y_label="Avaliação")
+        plotly_chart(fig_box, use_container_width=True)
     else:
         st.info("Sem avaliações suficientes para gerar o boxplot.")
 else:
@@ -121,12 +131,15 @@ st.markdown("---")
 
 # --- Agregado: número vs avaliação média (muito robusto) ---
 st.subheader("Popularidade vs Avaliação média por culinária")
-agg = (
-    df_country_city
-    .groupby("cuisines")
-    .agg(count=("name","count"), rating_mean=("rating","mean"))
-    .reset_index()
-    .dropna(subset=["rating_mean"])
+# agregado por culinária em cache: mover o slider de mínimo só refiltra o resultado
+agg = derived(
+    store, "cuisine_agg",
+    lambda: (
+        store.cuisines.aggregate(df["rating"], rows=country_city_rows)
+        .rename(columns={"key": "cuisines", "mean": "rating_mean"})
+        .dropna(subset=["rating_mean"])
+    ),
+    country_filter, city_filter, None,
 )
 # slider minimo de restaurantes para considerar
 min_count = st.slider("Mínimo de restaurantes por culinária", min_value=1, max_value=20, value=3)
@@ -135,7 +148,7 @@ if not agg_filtered.empty:
     fig_sc = px.scatter(agg_filtered, x="count", y="rating_mean", size="count", hover_name="cuisines",
                         labels={"count":"# Restaurantes","rating_mean":"Avaliação média"},
                         title="# Restaurantes vs Avaliação média (por culinária)")
-    st.plotly_chart(fig_sc, use_container_width=True)
+    plotly_chart(fig_sc, use_container_width=True)
 else:
     st.info("Ajuste o filtro de mínimo de restaurantes para ver o gráfico.")
 
@@ -143,9 +156,21 @@ st.markdown("---")
 
 # Tabela: top restaurantes por culinária (filtrada)
 st.subheader("Top restaurantes no contexto selecionado")
-display_cols = [c for c in ["name", "city", "cuisines", "rating", "price_num"] if c in df_filtered.columns]
+display_cols = [
+    c for c in [
+        "name", "city", "cuisines", "rating", "Votes", "rating_score", "score_pct_cuisine", "price_num", "price_usd",
+    ]
+    if c in df.columns
+]
 if display_cols:
-    table = df_filtered.sort_values(by="rating", ascending=False).head(50)[display_cols].fillna("-")
+    table = derived(
+        store, "cuisine_top_table",
+        lambda: store.frame(store.top_k(rows, k=50, by="rating_score"), display_cols).astype(object).fillna("-"),
+        country_filter, city_filter, cuisine_selected, 50,
+    )
     st.dataframe(table)
+    st.caption("Ordem pela nota ponderada por votos (rating_score); score_pct_cuisine = percentil na culinária principal (1 = melhor).")
 else:
     st.info("Sem colunas suficientes para exibir a tabela.")
+
+finish_rerun(profiler)
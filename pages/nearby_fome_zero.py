@@ -0,0 +1,138 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from utils import NEARBY_K, NEARBY_RADIUS_KM, derived, finish_rerun, get_store, map_points, plotly_chart, render_search, render_warmup_status, start_rerun
+
+st.set_page_config(page_title="Proximidade - Fome Zero", layout="wide")
+
+profiler = start_rerun("nearby")
+
+# Sidebar com logo e filtros (ponto de referência -> raio -> concorrentes)
+with st.sidebar:
+    st.image("logo.png", width=160)
+    st.markdown("---")
+    st.title("📌 Proximidade")
+
+# Carrega dados (frame + índice espacial)
+store = get_store()
+df = store.view([
+    "country", "city", "name", "Restaurant Name", "cuisines", "rating",
+    "latitude", "longitude", "price_num", "price_usd",
+])
+
+render_search(store)
+render_warmup_status()
+
+# Validação
+if "latitude" not in df.columns or "longitude" not in df.columns or len(store.spatial.rows) == 0:
+    st.error("Colunas de coordenadas ausentes ou sem dados válidos. Verifique o dataset.")
+    st.stop()
+
+# coluna com o nome do restaurante (fallback para o nome original do Zomato)
+name_col = "name" if "name" in df.columns and df["name"].notna().any() else "Restaurant Name"
+
+# Ponto de referência: restaurante existente ou coordenadas manuais
+ref_mode = st.sidebar.radio("Ponto de referência", ["Restaurante", "Coordenadas"])
+
+ref_row = None
+ref_cuisines = []
+if ref_mode == "Restaurante":
+    country_selected = st.sidebar.selectbox("País", store.countries.keys)
+    country_filter = [country_selected]
+    country_rows = derived(store, "rows", lambda: store.select(countries=country_filter), country_filter, None, None)
+    city_counts = derived(store, "city_counts", lambda: store.cities.counts(rows=country_rows), country_filter, None, None)
+    city_selected = st.sidebar.selectbox("Cidade", sorted(city_counts.index.tolist()))
+    city_filter = [city_selected]
+    city_rows = derived(store, "rows", lambda: store.select(countries=country_filter, cities=city_filter),
+                        country_filter, city_filter, None)
+    # só restaurantes com coordenadas válidas servem de referência
+    geo_rows = derived(store, "geo_rows", lambda: city_rows[store.geo.valid[city_rows]].tolist(),
+                       country_filter, city_filter, None)
+    if not geo_rows:
+        st.info("Nenhum restaurante com coordenadas válidas nesta cidade.")
+        st.stop()
+    ref_row = st.sidebar.selectbox(
+        "Restaurante",
+        geo_rows,
+        format_func=lambda r: f"{df[name_col].iat[r]} ({df['cuisines'].iat[r]})",
+    )
+    ref_lat = float(df["latitude"].iat[ref_row])
+    ref_lon = float(df["longitude"].iat[ref_row])
+    ref_cuisines = [c.strip() for c in str(df["cuisines"].iat[ref_row]).split(",") if c.strip()]
+else:
+    ref_lat = st.sidebar.number_input("Latitude", min_value=-90.0, max_value=90.0, value=28.6139, format="%.5f")
+    ref_lon = st.sidebar.number_input("Longitude", min_value=-180.0, max_value=180.0, value=77.2090, format="%.5f")
+
+radius_km = st.sidebar.slider("Raio de busca (km)", min_value=0.5, max_value=50.0, value=NEARBY_RADIUS_KM, step=0.5)
+k_nearest = st.sidebar.slider("Nº de concorrentes mais próximos", min_value=3, max_value=50, value=NEARBY_K)
+
+# Concorrentes: opcionalmente só restaurantes com alguma culinária em comum
+same_cuisine = False
+if ref_row is not None:
+    same_cuisine = st.sidebar.checkbox("Apenas mesma culinária", value=bool(ref_cuisines))
+cuisine_filter = tuple(ref_cuisines) if same_cuisine else ()
+
+# Consultas espaciais (mesma chave em todos os resultados que dependem delas)
+nearby_key = (ref_lat, ref_lon, radius_km, k_nearest, ref_row, cuisine_filter)
+in_radius, nearest = derived(
+    store, "nearby",
+    lambda: store.nearby(ref_lat, ref_lon, radius_km, k=k_nearest, exclude=ref_row, cuisines=list(cuisine_filter)),
+    *nearby_key,
+)
+
+# Cabeçalho
+ref_label = df[name_col].iat[ref_row] if ref_row is not None else f"({ref_lat:.4f}, {ref_lon:.4f})"
+st.title(f"📌 Restaurantes próximos — {ref_label}")
+st.markdown("Busca por raio e concorrentes mais próximos a partir do ponto de referência escolhido.")
+
+# KPIs da vizinhança
+rating_mean = derived(store, "nearby_rating", lambda: store.frame(in_radius["row"].to_numpy(), ["rating"])["rating"].mean(),
+                      *nearby_key)
+col1, col2, col3 = st.columns(3)
+with col1:
+    st.metric(f"🍽️ Restaurantes em {radius_km:g} km", f"{len(in_radius):,}")
+with col2:
+    if pd.notna(rating_mean):
+        st.metric("⭐ Avaliação média no raio", f"{rating_mean:.2f}")
+    else:
+        st.metric("⭐ Avaliação média no raio", "—")
+with col3:
+    if not nearest.empty:
+        st.metric("📏 Concorrente mais próximo", f"{nearest['distance_km'].iat[0]:.2f} km")
+    else:
+        st.metric("📏 Concorrente mais próximo", "—")
+
+st.markdown("---")
+
+# --- Mapa da vizinhança (pontos agregados) ---
+st.subheader("📍 Restaurantes no raio")
+if not in_radius.empty:
+    map_df, map_zoom = derived(store, "nearby_map", lambda: store.geo.aggregate(in_radius["row"].to_numpy(), max_points=500),
+                               *nearby_key)
+    st.map(map_points(map_df, map_zoom), latitude="latitude", longitude="longitude", size="size", color="color")
+    st.caption("Restaurantes agregados em grade: tamanho = nº de restaurantes, cor = avaliação média.")
+else:
+    st.info("Nenhum restaurante encontrado no raio selecionado.")
+
+st.markdown("---")
+
+# --- Concorrentes mais próximos ---
+st.subheader("🏁 Concorrentes mais próximos")
+if not nearest.empty:
+    display_cols = [c for c in [name_col, "city", "cuisines", "rating", "price_num", "price_usd"] if c in df.columns]
+    def nearest_table():
+        table = store.frame(nearest["row"].to_numpy(), display_cols).reset_index(drop=True)
+        table.insert(0, "distância (km)", nearest["distance_km"].round(2))
+        return table
+    table = derived(store, "nearby_table", nearest_table, *nearby_key, tuple(display_cols))
+    st.dataframe(table.astype(object).fillna("-"))
+
+    fig = px.scatter(
+        table, x="distância (km)", y="rating", hover_name=name_col,
+        labels={"rating": "Avaliação"}, title="Distância × Avaliação dos concorrentes"
+    )
+    plotly_chart(fig, use_container_width=True)
+else:
+    st.info("Nenhum concorrente encontrado.")
+
+finish_rerun(profiler)
@@ -0,0 +1,280 @@
+"""
+Modo serviço (headless): API HTTP/JSON sobre a mesma camada de dados do dashboard.
+
+O DataStore é carregado uma única vez no início e compartilhado por todas as
+requisições (servidor com uma thread por conexão). As respostas já serializadas
+ficam em um cache LRU chaveado por (rota, versão do store, filtros normalizados).
+
+Uso:
+    python service.py --port 8600 --data dataset/zomato.csv
+
+Rotas (GET; filtros repetíveis ou separados por vírgula: country, city, cuisine):
+    /health                         estado do serviço
+    /kpis?country=India             count, rating_mean, price_median (US$), n_countries, n_cities
+    /top?k=10&city=Goa              top-k por nota ponderada por votos (by=rating_score; columns=...)
+    /counts/cities?country=India    nº de restaurantes por país/cidade/culinária (limit=...)
+    /cuisines/aggregate?min_count=3 nº de restaurantes e avaliação média por culinária
+    /search?q=pizza+hut&k=10        busca por nome, bairro, cidade ou endereço (com filtros)
+    /stats                          contadores do cache de respostas
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from utils import (
+    REFERENCE_CURRENCY, ResultCache, build_store, filter_key, quality_report, shared_enabled, shared_store,
+)
+
+DEFAULT_COLUMNS = ["name", "country", "city", "cuisines", "rating", "Votes", "rating_score", "price_num", "price_usd"]
+MAX_K = 1000
+# parâmetros que cada rota lê além dos filtros; só eles entram na chave do cache
+ROUTE_PARAMS = {
+    "/kpis": (),
+    "/top": ("k", "by", "columns"),
+    "/counts/countries": ("limit",),
+    "/counts/cities": ("limit",),
+    "/counts/cuisines": ("limit",),
+    "/cuisines/aggregate": ("min_count",),
+    "/search": ("q", "k"),
+}
+
+
+class BadRequest(ValueError):
+    """Parâmetro inválido na requisição (vira HTTP 400)."""
+
+
+class NotFound(LookupError):
+    """Rota desconhecida (vira HTTP 404)."""
+
+
+def _json_default(value):
+    """Converte tipos NumPy/pandas para tipos nativos do JSON."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if value is pd.NA or value is pd.NaT:
+        return None
+    raise TypeError(f"tipo não serializável: {type(value).__name__}")
+
+
+def _records(frame):
+    """DataFrame -> lista de dicts, com nulos como None (float32 arredondado, sem ruído de conversão)."""
+    frame = frame.astype({c: "float64" for c in frame.columns if frame[c].dtype == np.float32})
+    frame = frame.round({c: 4 for c in frame.columns if frame[c].dtype == np.float64}).astype(object)
+    return frame.where(frame.notna(), None).to_dict("records")
+
+
+def _values(params, name):
+    """Valores de um filtro: `?city=A&city=B` ou `?city=A,B` (vazio = sem filtro)."""
+    values = []
+    for raw in params.get(name, []):
+        values.extend(v.strip() for v in raw.split(",") if v.strip())
+    return values or None
+
+
+def _int(params, name, default, low=0, high=None):
+    raw = params.get(name, [None])[0]
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise BadRequest(f"'{name}' deve ser inteiro") from None
+    if high is None and value < low:
+        raise BadRequest(f"'{name}' deve ser >= {low}")
+    if high is not None and not low <= value <= high:
+        raise BadRequest(f"'{name}' fora do intervalo [{low}, {high}]")
+    return value
+
+
+class QueryService:
+    """Consultas do dashboard (KPIs, top-N, agregados) com cache de respostas thread-safe."""
+
+    def __init__(self, store, cache_entries=1024, loader=None, reload_interval=5.0):
+        self.store = store
+        self.cache = ResultCache(max_entries=cache_entries)
+        self._cache_lock = threading.Lock()
+        self.started = time.time()
+        # `loader`: devolve o store atual (ex.: versão CURRENT do store compartilhado),
+        # consultado no máximo a cada `reload_interval` segundos
+        self.loader = loader
+        self.reload_interval = reload_interval
+        self._checked = time.monotonic()
+        # pré-computa a ordem global usada pelo top-k antes da primeira requisição
+        store.rank("rating_score")
+
+    def _maybe_reload(self):
+        """Troca para o store novo quando outro processo publicou uma versão."""
+        if self.loader is None or time.monotonic() - self._checked < self.reload_interval:
+            return
+        self._checked = time.monotonic()
+        store = self.loader()
+        if store is not self.store:
+            store.rank("rating_score")
+            self.store = store
+
+    def handle(self, path, params):
+        """Resposta JSON (bytes) para `path`/`params`; erros levantam BadRequest/NotFound."""
+        route = path.rstrip("/") or "/"
+        self._maybe_reload()
+        if route == "/health":
+            return self._encode(self.health())
+        if route == "/stats":
+            with self._cache_lock:
+                return self._encode(self.cache.stats())
+
+        handlers = {
+            "/kpis": self.kpis,
+            "/top": self.top,
+            "/counts/countries": lambda s, p: self.counts(s, "countries", p),
+            "/counts/cities": lambda s, p: self.counts(s, "cities", p),
+            "/counts/cuisines": lambda s, p: self.counts(s, "cuisines", p),
+            "/cuisines/aggregate": self.cuisine_aggregate,
+            "/search": self.search,
+        }
+        if route not in handlers:
+            raise NotFound(route)
+
+        # o mesmo store na chave e no cálculo: uma troca de versão no meio da
+        # requisição não grava a resposta nova sob o token antigo
+        store = self.store
+        filters = self._filters(params)
+        others = tuple((name, tuple(params.get(name, ()))) for name in ROUTE_PARAMS[route])
+        key = (route, store.cache_token) + filter_key(*filters.values()) + (others,)
+        with self._cache_lock:
+            if key in self.cache:
+                return self.cache.get(key, None)
+        # cálculo fora do lock: requisições diferentes rodam em paralelo
+        body = self._encode(handlers[route](store, params))
+        with self._cache_lock:
+            return self.cache.get(key, lambda: body)
+
+    def _encode(self, payload):
+        return json.dumps(payload, default=_json_default, ensure_ascii=False).encode("utf-8")
+
+    def _filters(self, params):
+        return {
+            "countries": _values(params, "country"),
+            "cities": _values(params, "city"),
+            "cuisines": _values(params, "cuisine"),
+        }
+
+    def health(self):
+        store = self.store
+        return {
+            "status": "ok",
+            "rows": len(store.df),
+            "version": store.version,
+            "shared_version": getattr(store, "shared_version", None),
+            "quality": quality_report(store.df),
+            "uptime_s": round(time.time() - self.started, 1),
+        }
+
+    def kpis(self, store, params):
+        return {**store.cube.query(**self._filters(params)), "price_currency": REFERENCE_CURRENCY}
+
+    def top(self, store, params):
+        k = _int(params, "k", 10, low=1, high=MAX_K)
+        by = params.get("by", ["rating_score"])[0]
+        if by not in store.columns or not pd.api.types.is_numeric_dtype(store.view([by])[by]):
+            raise BadRequest(f"'by' deve ser uma coluna numérica, recebido '{by}'")
+        columns = _values(params, "columns") or DEFAULT_COLUMNS
+        rows = store.top_k(k=k, by=by, **self._filters(params))
+        table = store.frame(rows, columns).reset_index(names="row")
+        return {"k": k, "by": by, "results": _records(table)}
+
+    def counts(self, store, dimension, params):
+        limit = _int(params, "limit", 20, low=1)
+        rows = store.select(**self._filters(params))
+        counts = getattr(store, dimension).counts(rows=rows).head(limit)
+        return {"dimension": dimension, "counts": [{"key": k, "count": int(v)} for k, v in counts.items()]}
+
+    def cuisine_aggregate(self, store, params):
+        min_count = _int(params, "min_count", 1, low=1)
+        rows = store.select(**self._filters(params))
+        agg = (
+            store.cuisines.aggregate(store.df["rating"], rows=rows)
+            .rename(columns={"key": "cuisine", "mean": "rating_mean"})
+        )
+        agg = agg[agg["count"] >= min_count]
+        return {"min_count": min_count, "cuisines": _records(agg)}
+
+    def search(self, store, params):
+        query = params.get("q", [""])[0]
+        if not query.strip():
+            raise BadRequest("'q' é obrigatório")
+        k = _int(params, "k", 10, low=1, high=MAX_K)
+        found = store.search(query, k=k, **self._filters(params))
+        table = store.frame(found["row"].to_numpy(), ["name", "Locality", "city", "country", "rating"])
+        table = table.reset_index(names="row").assign(score=found["score"].to_numpy())
+        return {"q": query, "k": k, "results": _records(table)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    # keep-alive: clientes reaproveitam a conexão entre consultas
+    protocol_version = "HTTP/1.1"
+    service = None
+    verbose = False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            body = self.service.handle(url.path, parse_qs(url.query))
+            status = 200
+        except BadRequest as e:
+            body, status = json.dumps({"error": str(e)}).encode("utf-8"), 400
+        except NotFound:
+            body, status = json.dumps({"error": f"rota desconhecida: {url.path}"}).encode("utf-8"), 404
+        except Exception as e:
+            body, status = json.dumps({"error": f"erro interno: {e}"}).encode("utf-8"), 500
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON headless do Fome Zero")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--data", default="dataset/zomato.csv", help="CSV, Parquet, diretório ou glob")
+    parser.add_argument("--cache-entries", type=int, default=1024, help="tamanho do cache de respostas")
+    parser.add_argument("--verbose", action="store_true", help="loga cada requisição")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    # FOME_ZERO_SHARED=1: conecta ao segmento publicado pelo dashboard em vez de recarregar
+    # e acompanha as versões novas publicadas depois (refresh em outra réplica)
+    if shared_enabled():
+        Handler.service = QueryService(shared_store(args.data), cache_entries=args.cache_entries,
+                                       loader=lambda: shared_store(args.data))
+    else:
+        Handler.service = QueryService(build_store(args.data), cache_entries=args.cache_entries)
+    Handler.verbose = args.verbose
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"Fome Zero service: {len(Handler.service.store.df):,} linhas carregadas em "
+          f"{time.perf_counter() - t0:.1f}s — http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
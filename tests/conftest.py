@@ -0,0 +1,26 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def repo_root():
+    """Roda os testes a partir da raiz do repositório (caminhos relativos de dataset/ e config/)."""
+    previous = os.getcwd()
+    os.chdir(ROOT)
+    yield ROOT
+    os.chdir(previous)
+
+
+@pytest.fixture
+def small_csv(tmp_path, repo_root):
+    """Cópia das primeiras 300 linhas do dataset em um diretório temporário."""
+    lines = (repo_root / "dataset" / "zomato.csv").read_text(encoding="utf-8").splitlines(keepends=True)
+    path = tmp_path / "zomato.csv"
+    path.write_text("".join(lines[:301]), encoding="utf-8")
+    return path
@@ -0,0 +1,96 @@
+"""Caches de resultados: LRU por entradas e bytes e chaves de `derived`."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Cache de sessão fora do Streamlit e sem pré-aquecimento do processo."""
+    cache = utils.ResultCache()
+    monkeypatch.setattr(utils, "session_cache", lambda: cache)
+    monkeypatch.setattr(utils, "_warmup", None)
+    return cache
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = utils.ResultCache(max_entries=2)
+    for key in "abc":
+        cache.get(key, lambda: np.zeros(1))
+        if key == "b":
+            cache.get("a", None)
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_result_cache_is_bounded_by_bytes():
+    cache = utils.ResultCache(max_entries=100, max_bytes=1000)
+    for key in range(3):
+        cache.get(key, lambda: np.zeros(50))  # 400 bytes cada
+    assert 0 not in cache and 1 in cache and 2 in cache
+    assert cache.nbytes == 800
+    # maior que o teto: devolvido, mas não guardado
+    assert len(cache.get("big", lambda: np.zeros(200))) == 200
+    assert "big" not in cache and cache.nbytes == 800
+
+
+def test_derived_recomputes_after_refresh(cache, small_csv):
+    store = utils.DataStore(utils.read_dataset(small_csv, use_snapshot=False))
+    calls = []
+
+    def count():
+        calls.append(store.version)
+        return len(store.df)
+
+    country = store.countries.keys[:1]
+    assert utils.derived(store, "count", count, country, None) == len(store.df)
+    # mesma seleção (em outra forma) e mesma versão: vem do cache
+    assert utils.derived(store, "count", count, list(country), []) == len(store.df)
+    assert calls == [0]
+
+    raw = pd.read_csv(small_csv, encoding="utf-8")
+    raw.columns = [c.strip() for c in raw.columns]
+    new = raw.iloc[[0]].copy()
+    new["Restaurant ID"] = 3_000_000_000
+    store.refresh(new)
+    assert utils.derived(store, "count", count, country, None) == len(store.df)
+    assert calls == [0, 1]
+
+
+PAGES = ["Home.py", "pages/1_country_fome_zero.py", "pages/city_fome_zero.py",
+         "pages/cuisines_fome_zero.py", "pages/nearby_fome_zero.py"]
+
+
+def test_warmup_keys_match_page_keys(monkeypatch):
+    testing = pytest.importorskip("streamlit.testing.v1")
+    monkeypatch.setattr(utils, "start_warmup", lambda path=None: None)
+    monkeypatch.delenv(utils.SHARED_ENV, raising=False)
+
+    # chaves pedidas pelas páginas com a seleção padrão
+    page_keys = set()
+    real_derived = utils.derived
+
+    def recording_derived(store, name, compute, *parts):
+        page_keys.add((name, utils.filter_key(*parts)))
+        return real_derived(store, name, compute, *parts)
+
+    monkeypatch.setattr(utils, "derived", recording_derived)
+    for page in PAGES:
+        app = testing.AppTest.from_file(page, default_timeout=300).run()
+        assert not app.exception, page
+
+    # chaves do pré-aquecimento das seleções padrão (os passos por país cobrem as outras seleções)
+    warm_keys = set()
+
+    def put(name, compute, *parts):
+        warm_keys.add((name, utils.filter_key(*parts)))
+        return compute()
+
+    store = utils._load_store("dataset/zomato.csv")
+    for name, step in utils.warm_steps(store, put):
+        if name in ("indexes", "home", "Todos", "nearby"):
+            step()
+    assert warm_keys == page_keys
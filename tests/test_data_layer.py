@@ -0,0 +1,391 @@
+"""
+Camada de dados (utils.py) contra os mesmos cálculos feitos direto em pandas
+sobre o dataset do repositório.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from haversine import Unit, haversine_vector
+
+import utils
+
+CSV = "dataset/zomato.csv"
+CASES = ["all", "country", "cities", "cuisine", "country+cuisines"]
+
+
+def brute_mask(df, countries=None, cities=None, cuisines=None):
+    """Máscara dos filtros calculada linha a linha (culinárias individuais, como no índice)."""
+    mask = np.ones(len(df), dtype=bool)
+    if countries:
+        mask &= df["country"].astype(object).isin(countries).to_numpy()
+    if cities:
+        mask &= df["city"].astype(object).isin(cities).to_numpy()
+    if cuisines:
+        wanted = set(cuisines)
+        mask &= df["cuisines"].astype(object).map(
+            lambda s: pd.notna(s) and bool(wanted & {c.strip() for c in str(s).split(",")})
+        ).to_numpy(dtype=bool)
+    return mask
+
+
+def brute_kpis(df, mask):
+    sub = df[mask]
+    rating = pd.to_numeric(sub["rating"], errors="coerce").astype("float64")
+    price = pd.to_numeric(sub["price_usd"], errors="coerce").astype("float64")
+    return {
+        "count": int(mask.sum()),
+        "rating_mean": float(rating.mean()) if rating.notna().any() else None,
+        "price_median": float(price.median()) if price.notna().any() else None,
+        "n_countries": int(sub["country"].nunique()),
+        "n_cities": int(sub["city"].nunique()),
+    }
+
+
+def brute_top(df, rows, k, by):
+    """`k` melhores de `rows` por `by` desc (nulos no fim), Votes desc e posição no frame."""
+    value = pd.to_numeric(df[by], errors="coerce").astype("float64").fillna(-np.inf).to_numpy()
+    votes = pd.to_numeric(df["Votes"], errors="coerce").fillna(0).astype("float64").to_numpy()
+    order = pd.DataFrame({"value": value[rows], "votes": votes[rows], "pos": rows})
+    order = order.sort_values(["value", "votes", "pos"], ascending=[False, False, True])
+    return order["pos"].to_numpy()[:k]
+
+
+def assert_kpis_equal(got, expected):
+    assert got["count"] == expected["count"]
+    assert got["n_countries"] == expected["n_countries"]
+    assert got["n_cities"] == expected["n_cities"]
+    for key in ["rating_mean", "price_median"]:
+        if expected[key] is None:
+            assert got[key] is None
+        else:
+            assert got[key] == pytest.approx(expected[key], rel=1e-6)
+
+
+def column_values(series):
+    """Valores comparáveis entre dtypes (categoria/objeto/string; inteiros/floats)."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return pd.to_numeric(series).astype("float64").to_numpy()
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return utils.read_dataset(CSV, use_snapshot=False)
+
+
+@pytest.fixture(scope="module")
+def store(frame):
+    return utils.DataStore(frame)
+
+
+@pytest.fixture(scope="module")
+def filters(store):
+    country = store.countries.counts().index[0]
+    cities = store.cities.counts(rows=store.select(countries=[country])).index[:2].tolist()
+    cuisines = store.cuisines.counts().index[:2].tolist()
+    return {
+        "all": {},
+        "country": {"countries": [country]},
+        "cities": {"countries": [country], "cities": cities},
+        "cuisine": {"cuisines": cuisines[:1]},
+        "country+cuisines": {"countries": [country], "cuisines": cuisines},
+    }
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_cube_kpis_match_pandas(store, filters, case):
+    f = filters[case]
+    assert_kpis_equal(store.cube.query(**f), brute_kpis(store.df, brute_mask(store.df, **f)))
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_select_matches_pandas(store, filters, case):
+    f = filters[case]
+    np.testing.assert_array_equal(store.select(**f), np.flatnonzero(brute_mask(store.df, **f)))
+
+
+@pytest.mark.parametrize("by", ["rating", "rating_score"])
+@pytest.mark.parametrize("case", CASES)
+def test_top_k_matches_full_sort(store, filters, case, by):
+    f = filters[case]
+    rows = np.flatnonzero(brute_mask(store.df, **f))
+    expected = brute_top(store.df, rows, 10, by)
+    # filtro de um único país usa a lista pré-ordenada; os demais, seleção parcial
+    np.testing.assert_array_equal(store.top_k(k=10, by=by, **f), expected)
+    np.testing.assert_array_equal(store.top_k(rows, k=10, by=by), expected)
+
+
+def test_refresh_upserts_and_is_idempotent():
+    store = utils.DataStore(utils.read_dataset(CSV, use_snapshot=False))
+    n_rows = len(store.df)
+    loaded = utils.quality_report(store.df)
+
+    raw = pd.read_csv(CSV, encoding="utf-8")
+    raw.columns = [c.strip() for c in raw.columns]
+    rated = raw.drop_duplicates("Restaurant ID")
+    rated = rated[rated["Aggregate rating"] > 0]
+    changed = rated.iloc[[0]].copy()
+    new_rating = 1.0 if changed["Aggregate rating"].iat[0] != 1.0 else 2.0
+    changed["Aggregate rating"] = new_rating
+    changed["Votes"] += 1
+    unchanged = rated.iloc[[1]]
+    # ID acima do int32 compactado do store: precisa sobreviver ao refresh sem estourar
+    inserted = rated.iloc[[2]].copy()
+    inserted["Restaurant ID"] = 3_000_000_000
+    inserted["Restaurant Name"] = "Restaurante Novo"
+    delta = pd.concat([changed, unchanged, inserted], ignore_index=True)
+
+    stats = store.refresh(delta)
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (1, 1, 1)
+    assert store.version == 1
+    assert len(store.df) == n_rows + 1
+
+    ids = store.df["Restaurant ID"].astype("int64")
+    assert (ids == 3_000_000_000).sum() == 1
+    pos = np.flatnonzero(ids == changed["Restaurant ID"].iat[0])
+    assert len(pos) == 1
+    assert float(store.df["rating"].iat[pos[0]]) == pytest.approx(new_rating)
+
+    # índices e cubo seguem o frame novo
+    country = str(store.df["country"].iat[int(np.flatnonzero(ids == 3_000_000_000)[0])])
+    for f in [{}, {"countries": [country]}]:
+        mask = brute_mask(store.df, **f)
+        np.testing.assert_array_equal(store.select(**f), np.flatnonzero(mask))
+        assert_kpis_equal(store.cube.query(**f), brute_kpis(store.df, mask))
+
+    # relatório de qualidade do carregamento sobrevive ao concat das linhas novas
+    report = utils.quality_report(store.df)
+    assert report["rows_out"] == n_rows + 1
+    assert report["duplicate_rows"] == loaded["duplicate_rows"]
+    assert "load_timings" in store.df.attrs
+
+    again = store.refresh(delta)
+    assert (again["inserted"], again["updated"], again["unchanged"]) == (0, 0, 3)
+    assert store.version == 1
+    assert len(store.df) == n_rows + 1
+
+
+def test_ingest_stream_matches_read_dataset(tmp_path, frame):
+    out = tmp_path / "stream.parquet"
+    stats = utils.ingest_stream(CSV, out_path=out, chunksize=1000)
+    streamed = utils.read_dataset(str(out))
+
+    assert stats["chunks"] > 1
+    assert stats["rows_written"] == len(frame) == len(streamed)
+    assert stats["duplicates"] == utils.quality_report(frame)["duplicate_rows"]
+    columns = ["Restaurant ID", "name", "country", "city", "cuisines", "rating",
+               "latitude", "longitude", "price_num", "price_usd"]
+    for c in columns:
+        got, expected = column_values(streamed[c]), column_values(frame[c])
+        if isinstance(expected, np.ndarray):
+            np.testing.assert_array_equal(got, expected, err_msg=c)
+        else:
+            assert got == expected, c
+
+    # cubo mesclado bloco a bloco = cubo do frame inteiro
+    cube = utils.AggCube.read_parquet(out)
+    country = frame["country"].astype(object).value_counts().index[0]
+    for f in [{}, {"countries": [country]}]:
+        assert_kpis_equal(cube.query(**f), brute_kpis(frame, brute_mask(frame, **f)))
+
+
+def test_currency_conversion_leaves_unknown_countries_null():
+    rates = pd.DataFrame({"iso_code": ["BRL"], "usd_per_unit": [0.2]}, index=pd.Index(["Brazil"], name="country"))
+    df = pd.DataFrame({"country": ["Brazil", "Atlantis", None, "Brazil"], "price_num": [10.0, 5.0, 3.0, 20.0]})
+    out = utils.normalize_currency(df, rates)
+    np.testing.assert_allclose(out["price_usd"].to_numpy(), [2.0, np.nan, np.nan, 4.0])
+    assert out["currency_code"].isna().tolist() == [False, True, True, False]
+    assert out["currency_code"].iat[0] == "BRL"
+
+    q = utils.price_quantiles(out)
+    assert q.loc["Brazil", "usd_q50"] == pytest.approx(3.0)
+    assert q.loc["Atlantis", "n"] == 1 and np.isnan(q.loc["Atlantis", "usd_q50"])
+
+
+def test_price_quantiles_are_built_with_the_store(store, frame):
+    # montados junto com o cubo, não no primeiro acesso
+    assert store._state.price_quantiles is not None
+    pd.testing.assert_frame_equal(store.price_quantiles, utils.price_quantiles(frame))
+
+
+def test_view_loads_only_the_declared_columns(small_csv):
+    store = utils.build_store(str(small_csv))
+    assert set(store.df.columns) <= set(utils.STORE_COLUMNS)
+    assert "latitude" in store.columns and "latitude" not in store.df.columns
+
+    view = store.view(["city", "latitude", "longitude"])
+    assert list(view.columns) == ["city", "latitude", "longitude"]
+    assert {"latitude", "longitude"} <= set(store.df.columns)
+    assert "Address" in store.columns and "Address" not in store.df.columns
+
+    expected = utils.read_dataset(small_csv)
+    for c in view.columns:
+        np.testing.assert_equal(column_values(view[c]), column_values(expected[c]), err_msg=c)
+
+
+def brute_nearby(lat, lon, points, rows, allowed=None):
+    """(linhas, distâncias) de todos os `points` ordenados por distância e linha, via haversine direto."""
+    dist = haversine_vector([(lat, lon)], points, Unit.KILOMETERS, comb=True).ravel()
+    keep = np.ones(len(rows), dtype=bool) if allowed is None else allowed[rows]
+    order = np.lexsort((rows[keep], dist[keep]))
+    return rows[keep][order], dist[keep][order]
+
+
+def test_spatial_index_matches_haversine(store):
+    spatial = store.spatial
+    view = store.view(["latitude", "longitude", "cuisines"])
+    lat, lon = view["latitude"].to_numpy(np.float64), view["longitude"].to_numpy(np.float64)
+    rows = spatial.rows
+    points = np.column_stack([lat[rows], lon[rows]])
+    for ref in rows[[0, len(rows) // 2, -1]]:
+        cuisines = [c.strip() for c in str(view["cuisines"].iat[ref]).split(",")][:1]
+        for allowed in [None, store.cuisines.mask_for(cuisines)]:
+            expected, dist = brute_nearby(lat[ref], lon[ref], points, rows, allowed)
+            within = spatial.within(lat[ref], lon[ref], 5.0, allowed=allowed)
+            np.testing.assert_array_equal(within["row"].to_numpy(), expected[dist <= 5.0])
+
+            nearest = spatial.nearest(lat[ref], lon[ref], k=10, allowed=allowed, exclude=ref)
+            others = expected != ref
+            np.testing.assert_array_equal(nearest["row"].to_numpy(), expected[others][:10])
+            np.testing.assert_allclose(nearest["distance_km"].to_numpy(), dist[others][:10])
+
+        in_radius, near = store.nearby(lat[ref], lon[ref], 5.0, k=10, exclude=ref, cuisines=cuisines)
+        assert ref not in in_radius["row"].to_numpy()
+        pd.testing.assert_frame_equal(
+            near, spatial.nearest(lat[ref], lon[ref], k=10, allowed=store.cuisines.mask_for(cuisines), exclude=ref)
+        )
+
+
+def test_attached_store_matches_published(tmp_path, store, filters):
+    version = utils.publish_store(store, tmp_path)
+    attached = utils.attach_store(tmp_path, version)
+
+    # cubo e busca saem de .npy/Arrow mapeados; no pickle só metadados pequenos
+    assert (tmp_path / version / "meta.pkl").stat().st_size < 256 * 1024
+    assert isinstance(attached.cube._n, np.memmap)
+    assert isinstance(attached.search_index.deletion_keys, np.memmap)
+    for f in filters.values():
+        assert attached.cube.query(**f) == store.cube.query(**f)
+        np.testing.assert_array_equal(attached.select(**f), store.select(**f))
+    for query in ["pizza", "piza hut", "conn"]:
+        pd.testing.assert_frame_equal(attached.search(query), store.search(query))
+
+
+def test_geo_grid_bins_match_pandas(store):
+    view = store.view(["latitude", "longitude", "rating"])
+    geo = store.geo
+    rows = store.select(countries=[store.countries.counts().index[0]])
+    points, zoom = geo.aggregate(rows, max_points=200)
+    assert len(points) <= 200 and zoom in utils.GEO_ZOOM_LEVELS
+
+    sub = view.iloc[rows].astype("float64")
+    sub = sub[geo.valid[rows]]
+    size = 360.0 / 2 ** zoom
+    cell = (np.floor((sub["latitude"] + 90) / size) * 2 ** zoom + np.floor((sub["longitude"] + 180) / size))
+    expected = sub.groupby(cell).agg(count=("rating", "size"), latitude=("latitude", "mean"),
+                                     rating_mean=("rating", "mean"))
+    np.testing.assert_array_equal(points["count"].to_numpy(), expected["count"].to_numpy())
+    np.testing.assert_allclose(points["latitude"].to_numpy(), expected["latitude"].to_numpy())
+    np.testing.assert_allclose(points["rating_mean"].to_numpy(), expected["rating_mean"].to_numpy())
+    # o próximo zoom mais fino passaria do limite de pontos
+    finer = [z for z in utils.GEO_ZOOM_LEVELS if z > zoom]
+    if finer:
+        assert len(np.unique(geo._cells[finer[0]][rows[geo.valid[rows]]])) > 200
+
+
+def test_box_and_histogram_stats_match_pandas(store):
+    view = store.view(["city", "rating"])
+    cities = store.cities.counts().index[:5].tolist()
+    sub = view[view["city"].astype(object).isin(cities)].astype({"city": object, "rating": "float64"})
+    stats = utils.box_stats(sub["city"], sub["rating"], order=cities, max_outliers=1000).set_index("group")
+    assert stats.index.tolist() == cities
+
+    for city, values in sub.dropna().groupby("city")["rating"]:
+        row = stats.loc[city]
+        q1, median, q3 = values.quantile([0.25, 0.5, 0.75])
+        assert row["n"] == len(values)
+        assert [row["q1"], row["median"], row["q3"]] == pytest.approx([q1, median, q3])
+        inside = values[values.between(q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1))]
+        assert (row["lowerfence"], row["upperfence"]) == (inside.min(), inside.max())
+        assert sorted(row["outliers"]) == sorted(values[~values.index.isin(inside.index)])
+
+    bins = utils.histogram_bins(view["rating"], nbins=20)
+    counts, edges = np.histogram(view["rating"].dropna().astype("float64"), bins=20)
+    np.testing.assert_array_equal(bins["count"].to_numpy(), counts)
+    np.testing.assert_allclose(bins["bin_start"].to_numpy(), edges[:-1])
+    assert bins["count"].sum() == view["rating"].notna().sum()
+
+
+def test_clean_frame_counts_duplicates_and_invalid_values():
+    df = pd.DataFrame({
+        "Restaurant ID": [1, 2, 1, 3, 1, 4],
+        "name": ["a", "b", "a", "c", "a2", "d"],
+        "latitude": [10.0, 0.0, 10.0, 95.0, 10.0, -20.0],
+        "longitude": [20.0, 0.0, 20.0, 30.0, 20.0, 40.0],
+        "rating": [4.0, 0.0, 4.0, 7.5, 4.0, 3.0],
+        "Rating text": ["Good", "Not rated", "Good", "Good", "Good", "Average"],
+        "price_num": [10.0, 5.0, 10.0, -1.0, 10.0, 0.0],
+    })
+    out, report = utils.clean_frame(df)
+
+    # ID 1 aparece três vezes (uma cópia diverge no nome): fica a primeira
+    assert out["Restaurant ID"].tolist() == [1, 2, 3, 4]
+    assert out["name"].astype(object).tolist() == ["a", "b", "c", "d"]
+    assert (report["rows_in"], report["rows_out"]) == (6, 4)
+    assert (report["duplicate_rows"], report["conflicting_ids"]) == (2, 1)
+    # (0, 0) e latitude 95 viram coordenadas nulas; 7.5 e "Not rated" viram nota nula
+    assert (report["invalid_coordinates"], report["missing_coordinates"]) == (2, 2)
+    assert (report["invalid_ratings"], report["not_rated"]) == (1, 1)
+    assert report["invalid_prices"] == 2
+    assert out["latitude"].isna().tolist() == [False, True, True, False]
+    assert out["rating"].isna().tolist() == [False, True, True, False]
+    assert out["price_num"].isna().tolist() == [False, False, True, True]
+
+
+def test_search_matches_prefixes_and_typos():
+    df = pd.DataFrame({
+        "name": ["Pizza Hut", "Pizzeria Napoli", "Burger King", "Café Coffee Day", "Domino's Pizza"],
+        "city": ["Goa", "Napoli", "Goa", "Delhi", "Delhi"],
+    })
+    index = utils.SearchIndex.from_frame(df)
+
+    def rows(query, **kwargs):
+        return index.search(query, **kwargs)["row"].tolist()
+
+    assert rows("pizza")[:2] == [0, 4]
+    assert set(rows("pizz")) == {0, 1, 4}          # prefixo
+    assert rows("burgr") == [2]                     # letra faltando
+    assert rows("kign") == [2]                      # transposição
+    assert rows("cafe") == [3] and rows("dominos") == [4]
+    assert rows("napoli pizzeria")[0] == 1          # casa os dois termos
+    assert rows("pizza", allowed=np.array([False, True, True, True, True])) == [4]
+    assert rows("xyzzy") == [] and rows("") == []
+
+
+def test_rating_scores_are_bayesian_with_group_percentiles():
+    df = pd.DataFrame({
+        "rating": [4.9, 4.7, 3.0, np.nan, 4.0],
+        "Votes": [1, 2000, 50, 0, 10],
+        "country": ["A", "A", "A", "A", "B"],
+        "city": ["x", "x", "y", "y", "z"],
+        "cuisines": ["Pizza, Italian", "Pizza", "Sushi", "Pizza", "Italian"],
+    })
+    out = utils.rating_scores(df, prior_votes=100)
+
+    rated = df["rating"].notna()
+    mean = df.loc[rated, "rating"].mean()
+    expected = (df["Votes"] * df["rating"] + 100 * mean) / (df["Votes"] + 100)
+    np.testing.assert_allclose(out["rating_score"], expected, rtol=1e-6)
+    # 4.9 com um voto fica atrás de 4.7 com milhares
+    assert out["rating_score"].iat[1] > out["rating_score"].iat[0]
+    assert out.loc[~rated].isna().all(axis=None)
+
+    score = expected.where(rated)
+    for column, keys in [("score_pct_country", df["country"]), ("score_pct_city", df["city"]),
+                         ("score_pct_cuisine", df["cuisines"].str.split(",").str[0])]:
+        np.testing.assert_allclose(out[column], score.groupby(keys).rank(pct=True), rtol=1e-6, err_msg=column)
+
+    # sem prior explícito, m = mediana dos votos das linhas avaliadas
+    default = utils.rating_scores(df)
+    np.testing.assert_allclose(default["rating_score"], utils.rating_scores(df, df.loc[rated, "Votes"].median())["rating_score"])
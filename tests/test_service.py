@@ -0,0 +1,71 @@
+"""Rotas do modo serviço (service.py): respostas, cache por versão e erros 400/404."""
+
+import json
+import re
+
+import pytest
+
+import utils
+from service import BadRequest, NotFound, QueryService
+
+CSV = "dataset/zomato.csv"
+
+
+@pytest.fixture(scope="module")
+def service():
+    return QueryService(utils.DataStore(utils.read_dataset(CSV, use_snapshot=False)))
+
+
+def get(service, path, **params):
+    return json.loads(service.handle(path, {k: [str(v)] for k, v in params.items()}))
+
+
+def test_routes_answer_from_the_store(service):
+    store = service.store
+    country = store.countries.counts().index[0]
+
+    kpis = get(service, "/kpis", country=country)
+    assert kpis["count"] == len(store.select(countries=[country]))
+    assert kpis["price_currency"] == utils.REFERENCE_CURRENCY
+
+    top = get(service, "/top", k=5, country=country)
+    assert [r["row"] for r in top["results"]] == store.top_k(k=5, countries=[country]).tolist()
+
+    counts = get(service, "/counts/countries", limit=3)["counts"]
+    assert [c["key"] for c in counts] == store.countries.counts().index[:3].tolist()
+
+    found = get(service, "/search", q=store.df["name"].iat[0], k=10)["results"]
+    assert 0 in [r["row"] for r in found]
+
+    assert get(service, "/health")["rows"] == len(store.df)
+
+
+def test_cache_key_ignores_unused_params(service):
+    first = get(service, "/kpis")
+    hits = service.cache.stats()["hits"]
+    # `k` não é lido por /kpis: mesma entrada do cache
+    assert get(service, "/kpis", k=7) == first
+    assert service.cache.stats()["hits"] == hits + 1
+
+
+@pytest.mark.parametrize("path, params, message", [
+    ("/top", {"k": "abc"}, "deve ser inteiro"),
+    ("/top", {"k": "0"}, "fora do intervalo [1, 1000]"),
+    ("/counts/cities", {"limit": "0"}, "deve ser >= 1"),
+    ("/top", {"by": "name"}, "coluna numérica"),
+    ("/search", {}, "obrigatório"),
+])
+def test_bad_params_raise_bad_request(service, path, params, message):
+    with pytest.raises(BadRequest, match=re.escape(message)):
+        service.handle(path, {k: [v] for k, v in params.items()})
+
+
+def test_bad_int_hides_the_parse_error(service):
+    with pytest.raises(BadRequest) as info:
+        service.handle("/top", {"k": ["abc"]})
+    assert info.value.__suppress_context__
+
+
+def test_unknown_route_raises_not_found(service):
+    with pytest.raises(NotFound):
+        service.handle("/nope", {})
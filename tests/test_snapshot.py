@@ -0,0 +1,71 @@
+"""Snapshot Parquet do CSV normalizado: chave, reaproveitamento e fallback para o CSV."""
+
+import os
+import shutil
+
+import pandas as pd
+
+import utils
+
+
+def _bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_snapshot_is_written_and_reused(small_csv):
+    first = utils.read_dataset(small_csv)
+    snap = utils.snapshot_path(small_csv)
+    assert snap.exists()
+    assert "read_snapshot" not in first.attrs["load_timings"]
+
+    second = utils.read_dataset(small_csv)
+    assert set(second.attrs["load_timings"]) == {"read_snapshot"}
+    pd.testing.assert_frame_equal(second, first, check_dtype=False, check_categorical=False)
+
+
+def test_snapshot_key_follows_csv_version_and_rates(small_csv, tmp_path, monkeypatch):
+    rates = tmp_path / "currency_rates.csv"
+    shutil.copy(utils.CURRENCY_RATES_PATH, rates)
+    monkeypatch.setattr(utils, "CURRENCY_RATES_PATH", str(rates))
+
+    keys = {utils.snapshot_path(small_csv)}
+    _bump_mtime(small_csv)
+    keys.add(utils.snapshot_path(small_csv))
+    with open(small_csv, "a", encoding="utf-8") as f:
+        f.write("\n")
+    keys.add(utils.snapshot_path(small_csv))
+    monkeypatch.setattr(utils, "SNAPSHOT_VERSION", utils.SNAPSHOT_VERSION + 1)
+    keys.add(utils.snapshot_path(small_csv))
+    _bump_mtime(rates)
+    keys.add(utils.snapshot_path(small_csv))
+    assert len(keys) == 5
+    # sem mudanças, a mesma chave
+    assert utils.snapshot_path(small_csv) in keys
+
+
+def test_new_snapshot_replaces_the_old_one_only(small_csv):
+    utils.read_dataset(small_csv)
+    old = utils.snapshot_path(small_csv)
+    # snapshot de um CSV irmão (zomato-1.csv) casa o mesmo glob e deve ficar
+    sibling = old.parent / "zomato-1-0123456789abcdef.parquet"
+    shutil.copy(old, sibling)
+
+    _bump_mtime(small_csv)
+    utils.read_dataset(small_csv)
+    assert utils.snapshot_path(small_csv).exists()
+    assert not old.exists()
+    assert sibling.exists()
+
+
+def test_corrupt_snapshot_falls_back_to_csv(small_csv):
+    expected = utils.read_dataset(small_csv, use_snapshot=False)
+    snap = utils.snapshot_path(small_csv)
+    snap.parent.mkdir(parents=True, exist_ok=True)
+    snap.write_bytes(b"not a parquet file")
+
+    df = utils.read_dataset(small_csv)
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False, check_categorical=False)
+    # o snapshot é refeito a partir do CSV
+    reread = utils.read_dataset(small_csv)
+    assert set(reread.attrs["load_timings"]) == {"read_snapshot"}
@@ -1,5 +1,32 @@
+import atexit
+import bisect
+import functools
+import glob
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
+import plotly.graph_objects as go
 import streamlit as st
+from haversine import Unit, haversine_vector
+
+try:
+    import pyarrow  # noqa: F401  (engine do snapshot Parquet)
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
 
 # Mapeamento de Country Code (padrão Zomato)
 COUNTRY_MAP = {
@@ -10,114 +37,840 @@ COUNTRY_MAP = {
     215: "United Kingdom", 216: "United States"
 }
 
+# Câmbio para a moeda de referência, por país (o preço do Zomato vem na moeda
+# local). A chave é o país e não a coluna Currency, que é ambígua ("Dollar($)"
+# em Austrália, Canadá, Singapura e EUA) e às vezes errada ("Botswana Pula(P)"
+# nas Filipinas).
+CURRENCY_RATES_PATH = "config/currency_rates.csv"
+REFERENCE_CURRENCY = "USD"
+
+# Snapshot colunar do frame já normalizado (evita reparse do CSV a cada cold start).
+# Incrementar SNAPSHOT_VERSION sempre que a normalização mudar o resultado.
+SNAPSHOT_VERSION = 10
+SNAPSHOT_DIRNAME = ".cache"
+# row groups menores permitem ao leitor descartar blocos pelos filtros (pushdown)
+SNAPSHOT_ROW_GROUP = 100_000
+
+# Colunas que o DataStore carrega na partida (índices de filtro, cubo e ranking);
+# as demais são lidas do snapshot colunar só quando alguma página pede.
+STORE_COLUMNS = [
+    "country", "city", "cuisines", "rating", "Votes", "price_num", "price_usd", "currency_code", "rating_score",
+]
+PRICE_COLUMNS = ["price_num", "price_usd", "currency_code"]
+
+# Tipos compactos aplicados na normalização
+# - categóricas: colunas de baixa cardinalidade repetidas em muitas linhas
+# - flags 0/1 do Zomato viram bool
+# - numéricas: float32 / inteiros com downcast
+CATEGORY_COLS = [
+    "country", "city", "cuisines", "currency_code",
+    "City", "Cuisines", "Locality", "Rating text",
+]
+FLAG_COLS = ["Has Table booking", "Has Online delivery", "Is delivering now", "Switch to order menu"]
+# Valores aceitos nas flags (qualquer outro mantém a coluna como veio)
+FLAG_VALUES = {1: True, "1": True, "Yes": True, 0: False, "0": False, "No": False}
+# Nota ponderada por votos e percentis por grupo (calculados no carregamento)
+SCORE_COLUMNS = ["rating_score", "score_pct_country", "score_pct_city", "score_pct_cuisine"]
+
+FLOAT32_COLS = [
+    "rating", "latitude", "longitude", "price_num", "price_usd", "Latitude", "Longitude", "Aggregate rating",
+] + SCORE_COLUMNS
+INT_COLS = ["Restaurant ID", "Country Code", "Average Cost for two", "Price range", "Votes"]
+
+# Colunas largas (texto livre) que nenhuma página usa; descartáveis com drop_wide=True
+WIDE_COLS = ["Address", "Locality Verbose"]
+
+
+# ---------------------------------------------------------------------------
+# Instrumentação (latência e memória por etapa, por rerun)
+# ---------------------------------------------------------------------------
+
+# FOME_ZERO_METRICS=<arquivo.jsonl> grava um registro por rerun;
+# FOME_ZERO_DEBUG=1 (ou ?debug=1 na URL) mostra o painel de perfil na sidebar.
+METRICS_ENV = "FOME_ZERO_METRICS"
+DEBUG_ENV = "FOME_ZERO_DEBUG"
+RERUN_HISTORY_KEY = "_rerun_history"
+RERUN_HISTORY_SIZE = 50
+
+metrics_logger = logging.getLogger("fome_zero.metrics")
+_profiling = threading.local()
+_metrics_lock = threading.Lock()
+
+
+def _rss_mb():
+    """Memória residente atual do processo em MB (None fora do Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RerunProfiler:
+    """
+    Registros (etapa, segundos, variação de RSS) de um rerun de página.
+    Tempos são inclusivos: uma etapa chamada dentro de outra conta nas duas.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.rss_start_mb = _rss_mb()
+        self.records = []
+        self.total_s = None
+
+    def record(self, stage, seconds, rss_delta_mb):
+        self.records.append({"stage": stage, "seconds": seconds, "rss_delta_mb": rss_delta_mb})
+
+    def finish(self):
+        self.total_s = time.perf_counter() - self._t0
+        return self
+
+    def summary(self):
+        """DataFrame por etapa: calls, total_s, max_s, rss_delta_mb (maior total primeiro)."""
+        if not self.records:
+            return pd.DataFrame(columns=["stage", "calls", "total_s", "max_s", "rss_delta_mb"])
+        records = pd.DataFrame(self.records)
+        return (
+            records.groupby("stage", sort=False)
+            .agg(calls=("seconds", "size"), total_s=("seconds", "sum"), max_s=("seconds", "max"),
+                 rss_delta_mb=("rss_delta_mb", "sum"))
+            .sort_values("total_s", ascending=False)
+            .reset_index()
+        )
+
+    def to_dict(self):
+        return {
+            "page": self.page,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "total_s": self.total_s,
+            "rss_mb": _rss_mb(),
+            "stages": self.summary().to_dict("records"),
+        }
+
+
+@contextmanager
+def timed(stage):
+    """Mede o bloco como `stage` no perfil do rerun atual (sem custo fora de um rerun perfilado)."""
+    profiler = getattr(_profiling, "current", None)
+    if profiler is None:
+        yield
+        return
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        rss1 = _rss_mb()
+        profiler.record(stage, time.perf_counter() - t0, rss1 - rss0 if rss0 is not None and rss1 is not None else None)
+
+
+def profiled(stage=None):
+    """Decorator: mede cada chamada da função com `timed` (nome da etapa = `stage` ou qualname)."""
+    def decorator(fn):
+        name = stage or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(_profiling, "current", None) is None:
+                return fn(*args, **kwargs)
+            with timed(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_rerun(page):
+    """
+    Abre o perfil do rerun de `page` na thread atual (cada sessão roda em sua thread).
+    Chamado no topo de cada página, com `finish_rerun` no fim; o painel na sidebar
+    aparece com FOME_ZERO_DEBUG=1 ou ?debug=1 na URL.
+    """
+    _profiling.current = RerunProfiler(page)
+    return _profiling.current
+
+
+def export_metrics(profiler):
+    """Log estruturado (logger fome_zero.metrics) e, se FOME_ZERO_METRICS estiver definido, uma linha JSONL."""
+    record = profiler.to_dict()
+    line = json.dumps(record, default=float)
+    metrics_logger.info(line)
+    path = os.environ.get(METRICS_ENV)
+    if path:
+        with _metrics_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    return record
+
+
+def debug_enabled():
+    if os.environ.get(DEBUG_ENV, "") not in ("", "0"):
+        return True
+    try:
+        return st.query_params.get("debug") == "1"
+    except Exception:
+        return False
+
+
+def finish_rerun(profiler, panel=None):
+    """
+    Fecha o perfil do rerun: guarda no histórico da sessão, exporta as métricas e
+    mostra o painel de debug na sidebar (`panel=None` segue FOME_ZERO_DEBUG / ?debug=1).
+    """
+    _profiling.current = None
+    profiler.finish()
+    record = export_metrics(profiler)
+    if RERUN_HISTORY_KEY not in st.session_state:
+        st.session_state[RERUN_HISTORY_KEY] = deque(maxlen=RERUN_HISTORY_SIZE)
+    st.session_state[RERUN_HISTORY_KEY].append({"page": record["page"], "total_s": record["total_s"]})
+    if panel if panel is not None else debug_enabled():
+        render_debug_panel(profiler)
+    return record
+
+
+def render_debug_panel(profiler):
+    """Painel na sidebar: etapas do último rerun, histórico de tempo total e cache da sessão."""
+    with st.sidebar.expander("🛠️ Perfil do rerun", expanded=True):
+        st.metric("Tempo do script", f"{profiler.total_s * 1000:.0f} ms")
+        summary = profiler.summary()
+        summary["total_ms"] = (summary["total_s"] * 1000).round(1)
+        summary["max_ms"] = (summary["max_s"] * 1000).round(1)
+        st.dataframe(summary[["stage", "calls", "total_ms", "max_ms", "rss_delta_mb"]], hide_index=True)
+        history = pd.DataFrame(list(st.session_state.get(RERUN_HISTORY_KEY, [])))
+        if len(history) > 1:
+            st.caption("Tempo total dos últimos reruns (s)")
+            st.line_chart(history["total_s"])
+        if RESULT_CACHE_KEY in st.session_state:
+            st.caption("Cache da sessão")
+            st.json(st.session_state[RESULT_CACHE_KEY].stats())
+        if _warmup is not None:
+            st.caption("Pré-aquecimento")
+            st.json(_warmup.status())
+        rss = _rss_mb()
+        if rss is not None:
+            st.caption(f"Memória do processo: {rss:,.0f} MB")
+
+
+def snapshot_path(path):
+    """
+    Caminho do snapshot Parquet correspondente ao CSV em `path`.
+    A chave combina caminho, tamanho, mtime, versão da normalização e a
+    tabela de câmbio, então qualquer alteração no CSV ou nas taxas gera um
+    snapshot novo.
+    """
+    stat = os.stat(path)
+    raw_key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{SNAPSHOT_VERSION}"
+    if os.path.exists(CURRENCY_RATES_PATH):
+        rates_stat = os.stat(CURRENCY_RATES_PATH)
+        raw_key += f"|{rates_stat.st_size}|{rates_stat.st_mtime_ns}"
+    key = hashlib.sha1(raw_key.encode("utf-8")).hexdigest()[:16]
+    return Path(path).parent / SNAPSHOT_DIRNAME / f"{Path(path).stem}-{key}.parquet"
+
+
+_SNAPSHOT_KEY_RE = re.compile(r"[0-9a-f]{16}")
+
+
+def _write_snapshot(df, snap):
+    """Grava o snapshot de forma atômica (arquivo temporário + rename)."""
+    snap.parent.mkdir(parents=True, exist_ok=True)
+    tmp = snap.with_suffix(f".{os.getpid()}.tmp")
+    df.to_parquet(tmp, engine="pyarrow", index=False, row_group_size=SNAPSHOT_ROW_GROUP)
+    os.replace(tmp, snap)
+    # remover snapshots antigos do mesmo CSV (só "<stem>-<chave hex>", não os de
+    # CSVs irmãos como zomato-1.csv, que também casam o glob)
+    prefix = snap.stem.rsplit("-", 1)[0]
+    for old in snap.parent.glob(f"{prefix}-*.parquet"):
+        if old != snap and _SNAPSHOT_KEY_RE.fullmatch(old.stem[len(prefix) + 1:]):
+            old.unlink(missing_ok=True)
+
+
+def _drop_wide(df, drop_wide):
+    if not drop_wide:
+        return df
+    return df.drop(columns=[c for c in WIDE_COLS if c in df.columns])
+
+
+def _read_parquet(path, drop_wide=False):
+    columns = None
+    if drop_wide:
+        import pyarrow.parquet as pq
+        columns = [c for c in pq.read_schema(path).names if c not in WIDE_COLS]
+    return pd.read_parquet(path, engine="pyarrow", columns=columns, memory_map=True)
+
+
+def dataset_source(path="dataset/zomato.csv"):
+    """
+    Arquivo Parquet de onde colunas podem ser lidas sob demanda: o próprio
+    `path` quando já é .parquet, ou o snapshot do CSV (gravado se ainda não
+    existir). None para diretórios/globs ou sem pyarrow.
+    """
+    if str(path).endswith(".parquet"):
+        return Path(path)
+    if not HAS_ARROW or not os.path.isfile(path):
+        return None
+    snap = snapshot_path(path)
+    if not snap.exists():
+        read_dataset(path)
+    return snap if snap.exists() else None
+
+
+def _arrow_filters(filters):
+    """{"country": ["India"], ...} -> filtros do leitor Parquet (AND entre colunas)."""
+    filters = [(col, "in", list(values)) for col, values in (filters or {}).items() if values]
+    return filters or None
+
+
+@profiled("scan_dataset")
+def scan_dataset(path="dataset/zomato.csv", columns=None, filters=None):
+    """
+    Leitura preguiçosa do dataset normalizado: só as `columns` pedidas
+    (projeção) e só as linhas cujos valores estão em `filters` (dict coluna ->
+    valores aceitos), ambos empurrados para o leitor Parquet do snapshot, que
+    pula row groups pelas estatísticas. Sem snapshot disponível, carrega tudo
+    e filtra em memória.
+    """
+    source = dataset_source(path)
+    if source is None:
+        df = read_dataset(path)
+        for col, values in (filters or {}).items():
+            if values:
+                df = df[df[col].isin(values)]
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return df.reset_index(drop=True)
+
+    import pyarrow.parquet as pq
+    if columns is not None:
+        available = set(pq.read_schema(source).names)
+        columns = [c for c in columns if c in available]
+    df = pd.read_parquet(source, engine="pyarrow", columns=columns, filters=_arrow_filters(filters), memory_map=True)
+    return compact_dtypes(df)
+
+
+def resolve_paths(path):
+    """
+    Lista de arquivos para `path`: um arquivo, um diretório (todos os *.csv)
+    ou um padrão glob (ex.: "dataset/shards/*.csv"). Ordem alfabética.
+    """
+    path = str(path)
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*.csv")))
+    if any(ch in path for ch in "*?["):
+        return sorted(glob.glob(path))
+    return [path]
+
+
+def concat_frames(frames):
+    """
+    Concatena frames normalizados unificando os dicionários das colunas
+    categóricas (sem isso o pandas cai para dtype object).
+    """
+    frames = [f for f in frames if len(f.columns)]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = dict.fromkeys(c for f in frames for c in f.columns)
+    for c in columns:
+        cats = [f[c] for f in frames if c in f.columns and isinstance(f[c].dtype, pd.CategoricalDtype)]
+        if not cats:
+            continue
+        dtype = pd.CategoricalDtype(pd.api.types.union_categoricals(cats, ignore_order=True).categories)
+        frames = [f.astype({c: dtype}) if c in f.columns else f for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+@profiled("read_dataset")
+def read_dataset(path="dataset/zomato.csv", use_snapshot=True, drop_wide=False, max_workers=None):
+    """
+    Versão sem cache do Streamlit de `load_data`.
+    Lê o snapshot Parquet (memory-mapped) quando ele existe e está válido;
+    caso contrário faz o parse do CSV, normaliza e grava o snapshot.
+    `path` também pode ser um .parquet já normalizado (ex.: saída de ingest_stream),
+    um diretório ou um glob de shards: cada shard é lido/normalizado em um
+    processo do pool (`max_workers`, padrão = nº de CPUs) e o resultado concatenado.
+    Com drop_wide=True as colunas de WIDE_COLS não são carregadas.
+    """
+    paths = resolve_paths(path)
+    if len(paths) != 1 or paths[0] != str(path):
+        if not paths:
+            raise FileNotFoundError(f"Nenhum CSV encontrado em {path}")
+        if len(paths) == 1 or max_workers == 1:
+            frames = [read_dataset(p, use_snapshot, drop_wide) for p in paths]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                frames = list(pool.map(
+                    read_dataset, paths, [use_snapshot] * len(paths), [drop_wide] * len(paths)
+                ))
+        reports = [f.attrs.get("quality_report", {}) for f in frames]
+        df = concat_frames(frames)
+        # duplicatas entre shards (cada shard já chega deduplicado e validado)
+        report = {"rows_in": sum(r.get("rows_in", 0) for r in reports)}
+        for key in QUALITY_COUNTERS:
+            report[key] = sum(r.get(key, 0) for r in reports)
+        cross = {}
+        df = dedupe_frame(df, cross)
+        report["duplicate_rows"] += cross["duplicate_rows"]
+        report["conflicting_ids"] += cross["conflicting_ids"]
+        report["rows_out"] = len(df)
+        # médias e percentis de cada shard valem só para o shard: recalcula no conjunto
+        df = add_rating_scores(df)
+        df.attrs["quality_report"] = report
+        return df
+
+    if str(path).endswith(".parquet"):
+        return compact_dtypes(_read_parquet(path, drop_wide))
+
+    if not (use_snapshot and HAS_ARROW):
+        return read_csv_normalized(path, drop_wide)
+
+    snap = snapshot_path(path)
+    if snap.exists():
+        try:
+            t0 = time.perf_counter()
+            df = _read_parquet(snap, drop_wide)
+            df.attrs["load_timings"] = {"read_snapshot": time.perf_counter() - t0}
+            return df
+        except Exception:
+            # snapshot corrompido/incompatível: refaz a partir do CSV
+            snap.unlink(missing_ok=True)
+
+    df = read_csv_normalized(path)
+    try:
+        _write_snapshot(df, snap)
+    except OSError:
+        # diretório somente leitura: segue sem snapshot
+        pass
+    return _drop_wide(df, drop_wide)
+
+
 @st.cache_data
-def load_data(path="dataset/zomato.csv"):
+def load_data(path="dataset/zomato.csv", drop_wide=False, max_workers=None):
     """
-    Carrega o CSV e aplica padronizações básicas.
+    Carrega o CSV (ou diretório/glob de shards) e aplica padronizações básicas.
     Retorna um DataFrame com colunas usuais:
     - country, city, cuisines, rating, latitude, longitude, price_num, name
+    - price_usd / currency_code: preço convertido para a moeda de referência
+    """
+    return read_dataset(path, drop_wide=drop_wide, max_workers=max_workers)
+
+
+def memory_report(df):
+    """
+    Footprint de memória do DataFrame (bytes, deep=True) por coluna.
+    Retorna DataFrame [column, dtype, bytes] ordenado do maior para o menor,
+    com uma linha final "TOTAL".
+    """
+    usage = df.memory_usage(deep=True, index=True)
+    report = pd.DataFrame({
+        "column": usage.index.astype(str),
+        "dtype": [str(df[c].dtype) if c in df.columns else "index" for c in usage.index],
+        "bytes": usage.to_numpy(),
+    }).sort_values("bytes", ascending=False, ignore_index=True)
+    total = pd.DataFrame({"column": ["TOTAL"], "dtype": [""], "bytes": [int(usage.sum())]})
+    return pd.concat([report, total], ignore_index=True)
+
+
+# Mapeamento declarativo: campo canônico -> candidatos em ordem de preferência.
+# Cada candidato é (padrão, conversor). "nome" casa o cabeçalho exato (sem
+# diferenciar maiúsculas); "~a|b" casa, na ordem do arquivo, qualquer coluna
+# cujo nome contenha "a" ou "b".
+COLUMN_SCHEMA = {
+    "country": [("country code", "country_code"), ("country", "text")],
+    "city": [("city", "text"), ("location", "text")],
+    "cuisines": [("cuisines", "text"), ("cuisine", "text")],
+    "latitude": [("~lat", "float")],
+    "longitude": [("~lon", "float")],
+    "rating": [("~rating", "float")],
+    "price_num": [("~price|cost", "price")],
+    "name": [("name", "text"), ("restaurant name", "text"), ("restaurant_name", "text"), ("restaurant", "text")],
+}
+
+# Campos em que todos os candidatos são tentados até um deles ter dados
+MULTI_CANDIDATE_FIELDS = {"price_num"}
+
+# Colunas brutas lidas além das fontes resolvidas pelo COLUMN_SCHEMA: ID (dedup e
+# refresh), nome original (fallback do mapa), votos, bairro e endereço (busca),
+# status da nota (validação) e flags. As demais colunas do CSV não são lidas.
+RAW_COLUMNS = ["Restaurant ID", "Restaurant Name", "Votes", "Locality", "Address", "Rating text"] + FLAG_COLS
+
+# dtypes explícitos no parse (colunas de texto repetitivo já entram como categoria)
+CSV_DTYPES = {c: "category" for c in ["City", "Cuisines", "Locality", "Rating text"]}
+
+
+def resolve_schema(columns):
     """
-    df = pd.read_csv(path, encoding="utf-8", low_memory=False)
+    Resolve COLUMN_SCHEMA contra um cabeçalho, uma única vez.
+    Retorna dict campo -> lista de (coluna de origem, conversor); lista vazia
+    quando nenhum candidato existe.
+    """
+    columns = [c.strip() for c in columns]
+    lower = {}
+    for c in columns:
+        lower.setdefault(c.lower(), c)
+
+    resolved = {}
+    for field, candidates in COLUMN_SCHEMA.items():
+        matches = []
+        for pattern, converter in candidates:
+            if pattern.startswith("~"):
+                parts = pattern[1:].split("|")
+                matches += [(c, converter) for c in columns if any(p in c.lower() for p in parts)]
+            elif pattern in lower:
+                matches.append((lower[pattern], converter))
+        resolved[field] = matches if field in MULTI_CANDIDATE_FIELDS else matches[:1]
+    return resolved
+
+
+def csv_read_args(path, drop_wide=False):
+    """
+    Argumentos de `pd.read_csv` derivados só do cabeçalho: `usecols` com as
+    fontes do schema mais RAW_COLUMNS (sem WIDE_COLS com `drop_wide`) e
+    `dtype` explícito. Retorna (kwargs, schema).
+    """
+    raw_header = list(pd.read_csv(path, encoding="utf-8", nrows=0).columns)
+    schema = resolve_schema(raw_header)
+    raw = {c for c in RAW_COLUMNS if not (drop_wide and c in WIDE_COLS)}
+    needed = raw | {src for matches in schema.values() for src, _ in matches}
+    usecols = [c for c in raw_header if c.strip() in needed]
+    dtype = {c: CSV_DTYPES[c.strip()] for c in usecols if c.strip() in CSV_DTYPES}
+    return {"usecols": usecols, "dtype": dtype}, schema
+
+
+@profiled("read_csv_normalized")
+def read_csv_normalized(path, drop_wide=False):
+    """
+    Parse + normalização de um CSV com resolução de schema pelo cabeçalho.
+    O tempo de cada etapa fica em df.attrs["load_timings"] (segundos).
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    kwargs, schema = csv_read_args(path, drop_wide)
+    timings["resolve_schema"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    df = pd.read_csv(path, encoding="utf-8", low_memory=False, **kwargs)
+    timings["read_csv"] = time.perf_counter() - t0
+
+    df = normalize_frame(df, schema=schema, timings=timings)
+
+    t0 = time.perf_counter()
+    df, report = clean_frame(df)
+    timings["quality"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    df = add_rating_scores(df)
+    timings["scores"] = time.perf_counter() - t0
+
+    if drop_wide:
+        df = _drop_wide(df, drop_wide)
+    df.attrs["load_timings"] = timings
+    df.attrs["quality_report"] = report
+    return df
+
+
+def _convert(series, converter):
+    if converter == "country_code":
+        return pd.to_numeric(series, errors="coerce").map(COUNTRY_MAP)
+    if converter == "float":
+        return pd.to_numeric(series, errors="coerce")
+    return series
+
+
+def _resolve_price(df, matches):
+    """Primeiro candidato com valores numéricos; senão conta símbolos (ex.: '₹')."""
+    for src, _ in matches:
+        tmp = pd.to_numeric(df[src], errors="coerce")
+        if tmp.notna().sum() > 0:
+            return tmp
+    for src, _ in matches:
+        raw = df[src]
+        tmp = raw.astype(str).str.count("₹").where(raw.notna())
+        if tmp.notna().sum() > 0:
+            return tmp
+    return pd.Series(np.nan, index=df.index)
+
+
+def _strip(series):
+    """strip vetorizado; em categóricas só as categorias são tratadas."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if not pd.api.types.is_string_dtype(series.cat.categories):
+            return series
+        stripped = series.cat.categories.str.strip()
+        if stripped.is_unique:
+            return series.cat.rename_categories(stripped)
+        return series.astype(object).str.strip().astype("category")
+    if pd.api.types.is_string_dtype(series) and series.notna().sum() > 0:
+        return series.str.strip()
+    return series
+
+
+def normalize_frame(df, schema=None, timings=None):
+    """
+    Aplica a resolução de colunas e as padronizações sobre o CSV bruto.
+    `schema` (de resolve_schema) evita refazer a resolução; `timings`, se
+    informado, recebe a duração de cada etapa.
+    """
+    timings = {} if timings is None else timings
 
     # Normalizar nomes de colunas (remover espaços em branco nas extremidades)
     df.columns = [c.strip() for c in df.columns]
 
-    # --- Country ---
-    # Preferir "Country Code" (exato) quando presente
-    if "Country Code" in df.columns:
-        df["country"] = df["Country Code"].map(COUNTRY_MAP)
-    else:
-        # procurar variação lowercase 'country code'
-        lowcols = {c.lower(): c for c in df.columns}
-        if "country code" in lowcols:
-            df["country"] = df[lowcols["country code"]].map(COUNTRY_MAP)
-        elif "country" in lowcols:
-            df["country"] = df[lowcols["country"]]
+    t0 = time.perf_counter()
+    if schema is None:
+        schema = resolve_schema(df.columns)
+    for field, matches in schema.items():
+        if field in MULTI_CANDIDATE_FIELDS:
+            df[field] = _resolve_price(df, matches) if matches else np.nan
+        elif matches:
+            src, converter = matches[0]
+            df[field] = _convert(df[src], converter)
         else:
-            df["country"] = None
-
-    # --- City ---
-    lowcols = {c.lower(): c for c in df.columns}
-    if "city" in lowcols:
-        df["city"] = df[lowcols["city"]]
-    elif "location" in lowcols:
-        df["city"] = df[lowcols["location"]]
-    else:
-        df["city"] = None
-
-    # --- Cuisines ---
-    if "cuisines" in lowcols:
-        df["cuisines"] = df[lowcols["cuisines"]]
-    elif "cuisine" in lowcols:
-        df["cuisines"] = df[lowcols["cuisine"]]
-    else:
-        # algumas bases usam 'listed_in(type)' ou similar; keep None if not found
-        df["cuisines"] = None
-
-    # --- Latitude / Longitude ---
-    # tentar várias colunas possíveis
-    lat_candidates = [c for c in df.columns if "lat" in c.lower()]
-    lon_candidates = [c for c in df.columns if "lon" in c.lower() or "long" in c.lower()]
-    if lat_candidates:
-        df["latitude"] = pd.to_numeric(df[lat_candidates[0]], errors="coerce")
-    else:
-        df["latitude"] = None
-    if lon_candidates:
-        df["longitude"] = pd.to_numeric(df[lon_candidates[0]], errors="coerce")
-    else:
-        df["longitude"] = None
-
-    # --- Rating ---
-    # detectar qualquer coluna que contenha 'rating' no nome
-    possible_rating_cols = [c for c in df.columns if "rating" in c.lower()]
-    if possible_rating_cols:
-        selected = possible_rating_cols[0]
-        df["rating"] = pd.to_numeric(df[selected], errors="coerce")
-    else:
-        df["rating"] = None
-
-    # --- Price / custo (tentar converter) ---
-    price_candidates = [c for c in df.columns if "price" in c.lower() or "cost" in c.lower()]
-    df["price_num"] = None
-    if price_candidates:
-        for pc in price_candidates:
-            tmp = pd.to_numeric(df[pc], errors="coerce")
-            if tmp.notna().sum() > 0:
-                df["price_num"] = tmp
-                break
-        # se ainda vazio, tentar contar símbolos (ex: '₹')
-        if df["price_num"].isna().all():
-            for pc in price_candidates:
-                df["price_num"] = df[pc].astype(str).apply(lambda x: x.count("₹") if pd.notna(x) else None)
-                if df["price_num"].notna().sum() > 0:
-                    break
-
-    # --- Nome / identificador ---
-    if "name" in df.columns:
-        df["name"] = df["name"]
-    elif "restaurant_name" in df.columns:
-        df["name"] = df["restaurant_name"]
-    else:
-        # tentar achar uma coluna que pareça nome
-        name_col = None
-        for c in df.columns:
-            if c.lower() in ["name", "restaurant_name", "restaurant"]:
-                name_col = c
-                break
-        df["name"] = df[name_col] if name_col else None
+            df[field] = None
+    timings["resolve_columns"] = time.perf_counter() - t0
 
     # --- Limpeza final de strings ---
-    str_cols = df.select_dtypes(include="object").columns
-    for c in str_cols:
-        # evitar transformar None em 'None' quando coluna for realmente None
-        if df[c].notna().sum() > 0:
-            df[c] = df[c].astype(str).str.strip()
-        else:
-            df[c] = df[c]
+    t0 = time.perf_counter()
+    for c in df.columns:
+        df[c] = _strip(df[c])
+    timings["strip"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    df = normalize_currency(df)
+    timings["currency"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    df = compact_dtypes(df)
+    timings["compact_dtypes"] = time.perf_counter() - t0
+    return df
+
+
+def load_currency_rates(path=CURRENCY_RATES_PATH):
+    """
+    Tabela de câmbio local: país -> iso_code, usd_per_unit.
+    Vazia quando o arquivo não existe (preços convertidos ficam nulos).
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame({"iso_code": [], "usd_per_unit": []}, index=pd.Index([], name="country"))
+    rates = pd.read_csv(path, encoding="utf-8")
+    rates["country"] = rates["country"].str.strip()
+    return rates.set_index("country")[["iso_code", "usd_per_unit"]]
+
+
+def normalize_currency(df, rates=None):
+    """
+    Converte price_num (moeda local) para a moeda de referência.
+    Mantém price_num como está e acrescenta:
+    - price_usd: preço em REFERENCE_CURRENCY (nulo para países sem taxa)
+    - currency_code: código ISO da moeda local
+    A taxa é resolvida uma vez por país (categorias) e aplicada por código.
+    """
+    if "country" not in df.columns or "price_num" not in df.columns:
+        return df
+    rates = load_currency_rates() if rates is None else rates
+    country = df["country"].astype("category")
+    codes = country.cat.codes.to_numpy()
+    valid = codes >= 0
+    categories = country.cat.categories.astype(str)
+    per_country = rates["usd_per_unit"].reindex(categories).to_numpy(dtype=np.float64)
+    iso_per_country = pd.Categorical(rates["iso_code"].reindex(categories))
+
+    rate = np.full(len(df), np.nan)
+    rate[valid] = per_country[codes[valid]]
+    iso_codes = np.full(len(df), -1, dtype=iso_per_country.codes.dtype)
+    iso_codes[valid] = iso_per_country.codes[codes[valid]]
+
+    price = pd.to_numeric(df["price_num"], errors="coerce").to_numpy(dtype=np.float64)
+    df["price_usd"] = price * rate
+    df["currency_code"] = pd.Categorical.from_codes(iso_codes, categories=iso_per_country.categories)
+    return df
+
+
+def compact_dtypes(df):
+    """
+    Converte as colunas conhecidas para tipos enxutos (categoria, bool,
+    float32, inteiros com downcast). Colunas ausentes ou vazias são ignoradas.
+    Flags só viram bool se todos os valores estiverem em FLAG_VALUES.
+    """
+    for c in CATEGORY_COLS:
+        if c in df.columns and df[c].notna().sum() > 0:
+            df[c] = df[c].astype("category")
+    for c in FLAG_COLS:
+        if c in df.columns and df[c].notna().all():
+            flags = df[c].astype(object).map(FLAG_VALUES)
+            if flags.notna().all():
+                df[c] = flags.astype(bool)
+    for c in FLOAT32_COLS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype("float32")
+    for c in INT_COLS:
+        if c in df.columns and pd.api.types.is_integer_dtype(df[c]):
+            df[c] = pd.to_numeric(df[c], downcast="integer")
+    return df
+
+
+# Qualidade: faixas válidas (fora delas o valor vira nulo) e contadores do relatório
+VALID_RANGES = {"latitude": (-90.0, 90.0), "longitude": (-180.0, 180.0), "rating": (0.0, 5.0)}
+QUALITY_COUNTERS = [
+    "duplicate_rows", "conflicting_ids", "invalid_coordinates", "missing_coordinates",
+    "invalid_ratings", "not_rated", "invalid_prices",
+]
+
+
+@profiled("dedupe_frame")
+def dedupe_frame(df, report=None):
+    """
+    Colapsa linhas repetidas por Restaurant ID usando um índice hash sobre o
+    ID: fica a primeira ocorrência de cada ID, a mesma regra do ingest_stream
+    (que lê em blocos e não pode olhar adiante).
+    `report` (dict), se informado, recebe duplicate_rows (linhas removidas) e
+    conflicting_ids (IDs repetidos com conteúdo diferente entre as cópias).
+    """
+    report = {} if report is None else report
+    if "Restaurant ID" not in df.columns:
+        report.update(duplicate_rows=0, conflicting_ids=0)
+        return df
+    ids = pd.Index(pd.to_numeric(df["Restaurant ID"], errors="coerce"))
+    repeated = ids.duplicated(keep=False) & ids.notna()
+    conflicting = 0
+    if repeated.any():
+        # cópias idênticas geram o mesmo hash; IDs com mais de um hash divergem
+        # (notas/percentis dependem do shard de origem e ficam fora da comparação)
+        copies = df[repeated].drop(columns=["Restaurant ID"] + [c for c in SCORE_COLUMNS if c in df.columns])
+        hashes = pd.DataFrame({"id": ids[repeated], "hash": _row_hash(copies).to_numpy()})
+        conflicting = int((hashes.drop_duplicates().groupby("id").size() > 1).sum())
+    drop = ids.duplicated(keep="first") & ids.notna()
+    report.update(duplicate_rows=int(drop.sum()), conflicting_ids=conflicting)
+    if not drop.any():
+        return df
+    return df[~drop].reset_index(drop=True)
+
+
+@profiled("validate_frame")
+def validate_frame(df, report=None):
+    """
+    Valida faixas e anula valores impossíveis (a linha é mantida):
+    - coordenadas fora de VALID_RANGES ou (0, 0) -> latitude/longitude nulas
+    - rating fora de [0, 5] -> nulo; rating 0 de restaurante "Not rated" (ou sem votos) -> nulo
+    - preço <= 0 -> price_num/price_usd nulos
+    `report` (dict), se informado, recebe as contagens de cada caso.
+    """
+    report = {} if report is None else report
+    if "latitude" in df.columns and "longitude" in df.columns:
+        lat = pd.to_numeric(df["latitude"], errors="coerce")
+        lon = pd.to_numeric(df["longitude"], errors="coerce")
+        (lat_lo, lat_hi), (lon_lo, lon_hi) = VALID_RANGES["latitude"], VALID_RANGES["longitude"]
+        invalid = (lat < lat_lo) | (lat > lat_hi) | (lon < lon_lo) | (lon > lon_hi) | ((lat == 0) & (lon == 0))
+        report["invalid_coordinates"] = int(invalid.sum())
+        if invalid.any():
+            df["latitude"] = lat.mask(invalid)
+            df["longitude"] = lon.mask(invalid)
+        report["missing_coordinates"] = int((df["latitude"].isna() | df["longitude"].isna()).sum())
 
+    if "rating" in df.columns:
+        rating = pd.to_numeric(df["rating"], errors="coerce")
+        lo, hi = VALID_RANGES["rating"]
+        invalid = (rating < lo) | (rating > hi)
+        not_rated = rating == 0
+        if "Rating text" in df.columns:
+            not_rated &= (df["Rating text"].astype(object) == "Not rated")
+        elif "Votes" in df.columns:
+            not_rated &= pd.to_numeric(df["Votes"], errors="coerce").fillna(0) == 0
+        report["invalid_ratings"] = int(invalid.sum())
+        report["not_rated"] = int(not_rated.sum())
+        if (invalid | not_rated).any():
+            df["rating"] = rating.mask(invalid | not_rated)
+
+    if "price_num" in df.columns:
+        price = pd.to_numeric(df["price_num"], errors="coerce")
+        invalid = price <= 0
+        report["invalid_prices"] = int(invalid.sum())
+        if invalid.any():
+            for c in ("price_num", "price_usd"):
+                if c in df.columns:
+                    df[c] = pd.to_numeric(df[c], errors="coerce").mask(invalid)
     return df
 
 
+def clean_frame(df):
+    """
+    Etapa de qualidade do carregamento: deduplicação por Restaurant ID +
+    validação de faixas. Retorna (df, relatório compacto em dict).
+    """
+    report = {"rows_in": len(df)}
+    df = dedupe_frame(df, report)
+    df = validate_frame(df, report)
+    report["rows_out"] = len(df)
+    for key in QUALITY_COUNTERS:
+        report.setdefault(key, 0)
+    return compact_dtypes(df), report
+
+
+def quality_report(df):
+    """Relatório de qualidade gravado no carregamento (dict vazio se ausente)."""
+    return dict(df.attrs.get("quality_report", {}))
+
+
+# Pontuação: votos do "prior" = este quantil dos votos dos restaurantes avaliados
+SCORE_PRIOR_QUANTILE = 0.5
+
+
+def _primary_cuisine(series):
+    """Primeira culinária listada ("Italian, Pizza" -> "Italian"), calculada por categoria."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        firsts = pd.Series(series.cat.categories.astype(str)).str.split(",").str[0].str.strip().to_numpy(dtype=object)
+        codes = series.cat.codes.to_numpy()
+        return pd.Series(np.where(codes >= 0, firsts[np.maximum(codes, 0)], None), index=series.index)
+    return series.str.split(",").str[0].str.strip()
+
+
+@profiled("rating_scores")
+def rating_scores(df, prior_votes=None):
+    """
+    Nota bayesiana ponderada por votos e percentis por grupo, para todas as
+    linhas de uma vez (NumPy + groupby.rank, sem laços por linha).
+
+    rating_score = (v·R + m·C) / (v + m): R = rating, v = Votes, C = rating médio
+    do dataset e m = `prior_votes` (padrão: mediana dos votos dos avaliados).
+    Um 4.9 com 1 voto fica perto de C; com milhares de votos, perto de 4.9.
+    score_pct_{country,city,cuisine}: percentil da nota dentro do país, da
+    cidade e da culinária principal, em (0, 1] (1 = melhor do grupo).
+    Linhas sem avaliação ficam nulas. Retorna DataFrame com SCORE_COLUMNS.
+    """
+    rating = pd.to_numeric(df["rating"], errors="coerce").to_numpy(dtype=np.float64)
+    votes = (
+        pd.to_numeric(df["Votes"], errors="coerce").fillna(0).clip(lower=0).to_numpy(dtype=np.float64)
+        if "Votes" in df.columns else np.zeros(len(df))
+    )
+    rated = np.isfinite(rating)
+    if not rated.any():
+        return pd.DataFrame({c: np.full(len(df), np.nan, dtype=np.float32) for c in SCORE_COLUMNS}, index=df.index)
+    prior_mean = rating[rated].mean()
+    if prior_votes is None:
+        prior_votes = np.quantile(votes[rated], SCORE_PRIOR_QUANTILE)
+    prior_votes = max(float(prior_votes), 1.0)
+    score = np.where(rated, (votes * rating + prior_votes * prior_mean) / (votes + prior_votes), np.nan)
+
+    out = pd.DataFrame({"rating_score": score}, index=df.index)
+    groups = {"score_pct_country": df.get("country"), "score_pct_city": df.get("city"),
+              "score_pct_cuisine": _primary_cuisine(df["cuisines"]) if "cuisines" in df.columns else None}
+    for name, keys in groups.items():
+        if keys is None:
+            out[name] = np.nan
+            continue
+        # agrupa pelos códigos inteiros (categoria/factorize), não pelas strings
+        codes = pd.factorize(keys)[0]
+        pct = out["rating_score"].groupby(codes).rank(pct=True).to_numpy()
+        out[name] = np.where(codes >= 0, pct, np.nan)
+    return out.astype("float32")
+
+
+def add_rating_scores(df, prior_votes=None):
+    """`df` com as SCORE_COLUMNS (re)calculadas sobre o frame inteiro."""
+    if "rating" not in df.columns:
+        return df
+    return df.assign(**rating_scores(df, prior_votes))
+
+
+@profiled("top_n")
 def top_n(df, groupby_col, value_col, n=10, agg="count"):
     """
     Agrupa e retorna os top N por groupby_col.
@@ -127,8 +880,2142 @@ def top_n(df, groupby_col, value_col, n=10, agg="count"):
     if groupby_col not in df.columns:
         return pd.DataFrame({groupby_col: [], "value": []})
 
+    # nlargest faz seleção parcial (heap) em vez de ordenar todos os grupos
     if agg == "count":
-        g = df.groupby(groupby_col)[value_col].count().sort_values(ascending=False).head(n)
+        g = df.groupby(groupby_col, observed=True)[value_col].count().nlargest(n)
     else:
-        g = df.groupby(groupby_col)[value_col].agg(agg).sort_values(ascending=False).head(n)
+        g = df.groupby(groupby_col, observed=True)[value_col].agg(agg).nlargest(n)
     return g.reset_index().rename(columns={value_col: "value"})
+
+
+class PostingIndex:
+    """
+    Índice invertido valor -> posições de linha, em formato CSR
+    (equivalente a uma matriz esparsa linha × valor).
+
+    - keys: valores distintos, em ordem alfabética
+    - rows: posições de linha agrupadas por valor (crescentes dentro de cada valor)
+    - indptr: rows[indptr[i]:indptr[i+1]] são as linhas de keys[i]
+    """
+
+    def __init__(self, codes, keys, rows, n_rows):
+        # codes[i] = índice em `keys` da entrada i (negativo = nulo), rows[i] = sua linha
+        codes = np.asarray(codes, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        valid = codes >= 0
+        codes, rows = codes[valid], rows[valid]
+
+        # chaves em ordem alfabética, sem valores ausentes dos dados
+        keys = np.asarray([str(k) for k in keys], dtype=object)
+        used = np.bincount(codes, minlength=len(keys)) > 0
+        key_order = np.array(sorted(np.flatnonzero(used), key=lambda i: keys[i]), dtype=np.int64)
+        remap = np.full(len(keys), -1, dtype=np.int64)
+        remap[key_order] = np.arange(len(key_order))
+        codes = remap[codes]
+
+        order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes, minlength=len(key_order))
+
+        self.keys = keys[key_order].tolist()
+        self.rows = rows[order]
+        self.codes = codes[order]
+        self.indptr = np.concatenate([[0], np.cumsum(counts)])
+        self.n_rows = int(n_rows)
+        self._pos = {k: i for i, k in enumerate(self.keys)}
+
+    @classmethod
+    def from_series(cls, series):
+        """Índice para coluna de valor único por linha (ex.: country, city)."""
+        rows = np.arange(len(series))
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return cls(series.cat.codes.to_numpy(), series.cat.categories, rows, len(series))
+        codes, uniques = pd.factorize(pd.Series(series.to_numpy(dtype=object)))
+        return cls(codes, uniques, rows, len(series))
+
+    @classmethod
+    def from_lists(cls, series, sep=","):
+        """
+        Índice para coluna com listas separadas por `sep` (ex.: "Italian, Pizza").
+        Em colunas categóricas o split é feito só sobre as categorias e as
+        entradas são expandidas pelos códigos (vetorizado, sem strings por linha).
+        """
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype("category")
+        pairs = (
+            pd.Series(series.cat.categories.astype(str))
+            .str.split(sep)
+            .explode()
+            .str.strip()
+        )
+        pairs = pairs[pairs.notna() & (pairs != "")]
+        pairs = pairs.rename("label").rename_axis("combo").reset_index().drop_duplicates()
+        label_codes, labels = pd.factorize(pairs["label"])
+        combo = pairs["combo"].to_numpy()
+        order = np.argsort(combo, kind="stable")
+        combo, label_codes = combo[order], label_codes[order]
+
+        per_combo = np.bincount(combo, minlength=len(series.cat.categories))
+        combo_start = np.concatenate([[0], np.cumsum(per_combo)])[:-1]
+
+        row_codes = series.cat.codes.to_numpy()
+        rows = np.flatnonzero(row_codes >= 0)
+        row_codes = row_codes[rows]
+        k = per_combo[row_codes]
+        offsets = np.arange(k.sum()) - np.repeat(np.cumsum(k) - k, k)
+        entry_codes = label_codes[np.repeat(combo_start[row_codes], k) + offsets]
+        return cls(entry_codes, labels, np.repeat(rows, k), len(series))
+
+    def rows_for(self, values):
+        """Posições (ordenadas, sem repetição) das linhas que contêm qualquer um dos valores."""
+        slices = [
+            self.rows[self.indptr[i]:self.indptr[i + 1]]
+            for i in (self._pos.get(str(v)) for v in values)
+            if i is not None
+        ]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        if len(slices) == 1:
+            return slices[0]
+        return np.unique(np.concatenate(slices))
+
+    def mask_for(self, values):
+        """Máscara booleana (tamanho n_rows) das linhas que contêm qualquer um dos valores."""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.rows_for(values)] = True
+        return mask
+
+    def _entry_mask(self, rows):
+        if rows is None:
+            return None
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[np.asarray(rows, dtype=np.int64)] = True
+        return mask[self.rows]
+
+    @profiled("index.counts")
+    def counts(self, rows=None):
+        """
+        Nº de linhas por valor (restrito a `rows`, se informado).
+        Retorna Series valor -> contagem, ordenada da maior para a menor, sem zeros.
+        """
+        entry_mask = self._entry_mask(rows)
+        codes = self.codes if entry_mask is None else self.codes[entry_mask]
+        counts = pd.Series(np.bincount(codes, minlength=len(self.keys)), index=self.keys)
+        return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+    @profiled("index.aggregate")
+    def aggregate(self, values, rows=None):
+        """
+        Contagem de linhas e média de `values` (array alinhado ao frame) por valor.
+        Retorna DataFrame [key, count, mean] ordenado por count.
+        """
+        entry_mask = self._entry_mask(rows)
+        codes, entry_rows = self.codes, self.rows
+        if entry_mask is not None:
+            codes, entry_rows = codes[entry_mask], entry_rows[entry_mask]
+
+        v = np.asarray(values, dtype=np.float64)[entry_rows]
+        has_v = ~np.isnan(v)
+        k = len(self.keys)
+        count = np.bincount(codes, minlength=k)
+        v_sum = np.bincount(codes[has_v], weights=v[has_v], minlength=k)
+        v_n = np.bincount(codes[has_v], minlength=k)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(v_n > 0, v_sum / np.maximum(v_n, 1), np.nan)
+        out = pd.DataFrame({"key": self.keys, "count": count, "mean": mean})
+        return out[out["count"] > 0].sort_values("count", ascending=False, kind="stable", ignore_index=True)
+
+    @profiled("index.explode")
+    def explode(self, df, keys, columns, rows=None):
+        """
+        Frame "explodido" com uma linha por (valor, linha) para os valores em `keys`,
+        restrito a `rows`. A coluna "key" traz o valor; `columns` vêm de `df`.
+        """
+        wanted = [self._pos[str(k)] for k in keys if str(k) in self._pos]
+        take = np.concatenate([np.arange(self.indptr[i], self.indptr[i + 1]) for i in wanted]) if wanted else np.empty(0, dtype=np.int64)
+        entry_mask = self._entry_mask(rows)
+        if entry_mask is not None:
+            take = take[entry_mask[take]]
+        out = df.iloc[self.rows[take]][columns].reset_index(drop=True)
+        out.insert(0, "key", [self.keys[c] for c in self.codes[take]])
+        return out
+
+
+# Dimensões do cubo de agregados
+CUBE_DIMS = ["country", "city", "cuisines"]
+
+
+def _quantile_from_counts(values, counts, q):
+    """
+    Quantil (interpolação linear, como pandas) a partir de valores distintos
+    ordenados e suas contagens.
+    """
+    total = int(counts.sum())
+    if total == 0:
+        return None
+    cum = np.cumsum(counts)
+    h = (total - 1) * q
+    lo, hi = int(np.floor(h)), int(np.ceil(h))
+    v_lo = values[np.searchsorted(cum, lo, side="right")]
+    v_hi = values[np.searchsorted(cum, hi, side="right")]
+    return float(v_lo + (v_hi - v_lo) * (h - lo))
+
+
+class AggCube:
+    """
+    Cubo país × cidade × culinária (combinação original) com agregados parciais
+    mescláveis: nº de restaurantes, soma/contagem de rating e um sketch de preço
+    (histograma esparso sobre os valores distintos de preço, exato para quantis).
+
+    Qualquer combinação de filtros é respondida somando células, então o custo
+    de um KPI depende do nº de células, não do nº de linhas.
+    """
+
+    def __init__(self, cells, prices):
+        # cells: CUBE_DIMS + [n, rating_sum, rating_n]; prices: CUBE_DIMS + [price, count]
+        self.cells = cells.reset_index(drop=True)
+        for c in CUBE_DIMS:
+            self.cells[c] = self.cells[c].astype(object)
+        cell_ids = self.cells[CUBE_DIMS].assign(_cell=np.arange(len(self.cells)))
+        prices = prices.astype({c: object for c in CUBE_DIMS}).merge(cell_ids, on=CUBE_DIMS, how="inner")
+        self.prices = prices
+
+        self._n = self.cells["n"].to_numpy(dtype=np.int64)
+        self._rating_sum = self.cells["rating_sum"].to_numpy(dtype=np.float64)
+        self._rating_n = self.cells["rating_n"].to_numpy(dtype=np.int64)
+
+        price_codes, price_values = pd.factorize(prices["price"], sort=True)
+        self._price_values = np.asarray(price_values, dtype=np.float64)
+        self._price_codes = price_codes
+        self._price_cell = prices["_cell"].to_numpy()
+        self._price_count = prices["count"].to_numpy(dtype=np.int64)
+
+        # índices sobre as células (não sobre as linhas do dataset)
+        self._country = PostingIndex.from_series(self.cells["country"])
+        self._city = PostingIndex.from_series(self.cells["city"])
+        self._cuisine = PostingIndex.from_lists(self.cells["cuisines"])
+
+    @classmethod
+    def from_frame(cls, df, price_col="price_usd"):
+        """
+        Constrói o cubo a partir do frame normalizado. O sketch de preço usa o
+        preço na moeda de referência, para que medianas entre países façam
+        sentido (frames antigos, sem price_usd, caem para price_num).
+        """
+        if price_col not in df.columns:
+            price_col = "price_num"
+        rating = pd.to_numeric(df["rating"], errors="coerce").astype("float64")
+        work = df[CUBE_DIMS].assign(
+            n=1,
+            rating_sum=rating.fillna(0.0),
+            rating_n=rating.notna().astype("int64"),
+        )
+        cells = (
+            work.groupby(CUBE_DIMS, observed=True, dropna=False, sort=False)[["n", "rating_sum", "rating_n"]]
+            .sum()
+            .reset_index()
+        )
+
+        price = pd.to_numeric(df[price_col], errors="coerce").astype("float64")
+        has_price = price.notna()
+        prices = (
+            df.loc[has_price, CUBE_DIMS]
+            .assign(price=price[has_price], count=1)
+            .groupby(CUBE_DIMS + ["price"], observed=True, dropna=False, sort=False)["count"]
+            .sum()
+            .reset_index()
+        )
+        return cls(cells, prices)
+
+    def to_parquet(self, prefix):
+        """Grava células e sketch de preço em `<prefix>.cells.parquet` / `<prefix>.prices.parquet`."""
+        self.cells.to_parquet(f"{prefix}.cells.parquet", index=False)
+        self.prices.drop(columns="_cell").to_parquet(f"{prefix}.prices.parquet", index=False)
+
+    @classmethod
+    def read_parquet(cls, prefix):
+        return cls(pd.read_parquet(f"{prefix}.cells.parquet"), pd.read_parquet(f"{prefix}.prices.parquet"))
+
+    @classmethod
+    def merge(cls, cubes):
+        """
+        Mescla cubos parciais (ex.: construídos por chunk ou por arquivo).
+        Aceita cubos negados (ver `negated`); células que zeram são descartadas.
+        """
+        cells = pd.concat([c.cells for c in cubes], ignore_index=True)
+        cells = cells.groupby(CUBE_DIMS, dropna=False, sort=False)[["n", "rating_sum", "rating_n"]].sum().reset_index()
+        prices = pd.concat([c.prices.drop(columns="_cell") for c in cubes], ignore_index=True)
+        prices = prices.groupby(CUBE_DIMS + ["price"], dropna=False, sort=False)["count"].sum().reset_index()
+        return cls(cells[cells["n"] != 0], prices[prices["count"] != 0])
+
+    def negated(self):
+        """Cubo com contagens/somas negativas, para remover linhas via `merge`."""
+        cells = self.cells.copy()
+        cells[["n", "rating_sum", "rating_n"]] = -cells[["n", "rating_sum", "rating_n"]]
+        prices = self.prices.drop(columns="_cell").assign(count=-self.prices["count"])
+        return AggCube(cells, prices)
+
+    def cell_mask(self, countries=None, cities=None, cuisines=None):
+        """Máscara das células que atendem aos filtros (None/vazio = sem filtro)."""
+        mask = np.ones(len(self.cells), dtype=bool)
+        if countries:
+            mask &= self._country.mask_for(countries)
+        if cities:
+            mask &= self._city.mask_for(cities)
+        if cuisines:
+            mask &= self._cuisine.mask_for(cuisines)
+        return mask
+
+    def price_quantile(self, mask, q=0.5):
+        """Quantil de preço sobre as células em `mask`."""
+        sel = mask[self._price_cell]
+        counts = np.bincount(
+            self._price_codes[sel], weights=self._price_count[sel], minlength=len(self._price_values)
+        )
+        return _quantile_from_counts(self._price_values, counts, q)
+
+    @profiled("cube.query")
+    def query(self, countries=None, cities=None, cuisines=None):
+        """
+        KPIs para a combinação de filtros.
+        Retorna dict: count, rating_mean, price_median, n_countries, n_cities
+        (rating_mean/price_median = None quando não há dados).
+        """
+        mask = self.cell_mask(countries, cities, cuisines)
+        mask &= self._n > 0
+        rating_n = int(self._rating_n[mask].sum())
+        selected = self.cells.loc[mask, ["country", "city"]]
+        return {
+            "count": int(self._n[mask].sum()),
+            "rating_mean": float(self._rating_sum[mask].sum() / rating_n) if rating_n else None,
+            "price_median": self.price_quantile(mask, 0.5),
+            "n_countries": int(selected["country"].nunique()),
+            "n_cities": int(selected["city"].nunique()),
+        }
+
+
+# Níveis de zoom pré-computados para o mapa (célula = 360 / 2**zoom graus)
+GEO_ZOOM_LEVELS = (2, 4, 6, 8, 10, 12, 14, 16)
+
+
+class GeoGrid:
+    """
+    Binning geográfico em grade regular, pré-computado para vários níveis de zoom.
+    Para uma seleção de linhas devolve no máximo `max_points` pontos agregados
+    (centróide, nº de restaurantes e rating médio), escolhendo o zoom mais fino
+    que respeita o limite. O resultado é determinístico.
+    """
+
+    def __init__(self, latitude, longitude, rating, zoom_levels=GEO_ZOOM_LEVELS):
+        self.lat = np.asarray(latitude, dtype=np.float64)
+        self.lon = np.asarray(longitude, dtype=np.float64)
+        self.rating = np.asarray(rating, dtype=np.float64)
+        # coordenadas válidas (descarta nulos, fora de faixa e o (0, 0) de placeholder)
+        self.valid = (
+            np.isfinite(self.lat) & np.isfinite(self.lon)
+            & (np.abs(self.lat) <= 90) & (np.abs(self.lon) <= 180)
+            & ~((self.lat == 0) & (self.lon == 0))
+        )
+        self.zoom_levels = tuple(sorted(zoom_levels))
+        self._cells = {}
+        for z in self.zoom_levels:
+            size = 360.0 / 2 ** z
+            n_cols = 2 ** z
+            row = np.floor((np.clip(self.lat, -90, 90) + 90) / size)
+            col = np.floor((np.clip(self.lon, -180, 180 - 1e-9) + 180) / size)
+            cells = np.where(self.valid, row * n_cols + col, -1)
+            self._cells[z] = np.nan_to_num(cells, nan=-1).astype(np.int32 if z <= 15 else np.int64)
+
+    @profiled("geo.aggregate")
+    def aggregate(self, rows, max_points=500):
+        """
+        Pontos agregados para as linhas em `rows`.
+        Retorna DataFrame [latitude, longitude, count, rating_mean] e o zoom usado.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[self.valid[rows]]
+        zoom = self.zoom_levels[0]
+        for z in self.zoom_levels:
+            if len(np.unique(self._cells[z][rows])) > max_points:
+                break
+            zoom = z
+
+        _, inv = np.unique(self._cells[zoom][rows], return_inverse=True)
+        inv = inv.ravel()
+        count = np.bincount(inv)
+        rating = self.rating[rows]
+        has_rating = ~np.isnan(rating)
+        rating_n = np.bincount(inv[has_rating], minlength=len(count))
+        rating_sum = np.bincount(inv[has_rating], weights=rating[has_rating], minlength=len(count))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            points = pd.DataFrame({
+                "latitude": np.bincount(inv, weights=self.lat[rows]) / np.maximum(count, 1),
+                "longitude": np.bincount(inv, weights=self.lon[rows]) / np.maximum(count, 1),
+                "count": count,
+                "rating_mean": np.where(rating_n > 0, rating_sum / np.maximum(rating_n, 1), np.nan),
+            })
+        return points, zoom
+
+
+def map_points(points, zoom):
+    """
+    Prepara a saída de GeoGrid.aggregate para `st.map`: raio (m) proporcional
+    à raiz do nº de restaurantes e cor do vermelho (nota baixa) ao verde (alta).
+    """
+    if points.empty:
+        return points.assign(size=[], color=[])
+    cell_m = 360.0 / 2 ** zoom * 111_000
+    scale = np.sqrt(points["count"] / points["count"].max())
+    size = np.maximum(cell_m * 0.5 * scale, 30.0)
+    t = ((points["rating_mean"].fillna(2.5) - 2.5) / 2.5).clip(0, 1)
+    color = [f"#{int(255 * (1 - v)):02x}{int(180 * v):02x}40" for v in t]
+    return points.assign(size=size, color=color)
+
+
+# Raio médio da Terra e comprimento de 1 grau de latitude (km)
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = 111.195
+
+
+class SpatialIndex:
+    """
+    Índice espacial em buckets de grade (estilo geohash) para consultas de raio
+    e k vizinhos mais próximos. As linhas ficam ordenadas pelo id do bucket, então
+    cada faixa de latitude vira um único intervalo contíguo (searchsorted); só os
+    candidatos dos buckets vizinhos passam pelo haversine vetorizado.
+    """
+
+    def __init__(self, latitude, longitude, cell_deg=0.25):
+        lat = np.asarray(latitude, dtype=np.float64)
+        lon = np.asarray(longitude, dtype=np.float64)
+        valid = (
+            np.isfinite(lat) & np.isfinite(lon)
+            & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+            & ~((lat == 0) & (lon == 0))
+        )
+        self.n_rows = len(lat)
+        self.cell_deg = cell_deg
+        self.n_cols = int(np.ceil(360 / cell_deg))
+        self.n_lat = int(np.ceil(180 / cell_deg))
+        rows = np.flatnonzero(valid)
+        codes = self._cell(lat[rows], lon[rows])
+        order = np.argsort(codes, kind="stable")
+        self.rows = rows[order]
+        self.codes = codes[order]
+        self.coords = np.column_stack([lat[self.rows], lon[self.rows]])
+
+    def _cell(self, lat, lon):
+        r = np.clip(np.floor((lat + 90) / self.cell_deg), 0, self.n_lat - 1).astype(np.int64)
+        c = np.clip(np.floor((lon + 180) / self.cell_deg), 0, self.n_cols - 1).astype(np.int64)
+        return r * self.n_cols + c
+
+    def _candidates(self, lat, lon, radius_km):
+        """Posições (em self.rows) dos pontos nos buckets que cobrem o raio."""
+        dlat = radius_km / KM_PER_DEG
+        cos_lat = np.cos(np.radians(min(abs(lat) + dlat, 90.0)))
+        dlon = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEG * cos_lat), 180.0)
+
+        r0 = int(np.clip(np.floor((lat - dlat + 90) / self.cell_deg), 0, self.n_lat - 1))
+        r1 = int(np.clip(np.floor((lat + dlat + 90) / self.cell_deg), 0, self.n_lat - 1))
+        if dlon >= 180.0:
+            col_ranges = [(0, self.n_cols - 1)]
+        else:
+            c0 = int(np.floor((lon - dlon + 180) / self.cell_deg))
+            c1 = int(np.floor((lon + dlon + 180) / self.cell_deg))
+            if c0 < 0:
+                col_ranges = [(c0 + self.n_cols, self.n_cols - 1), (0, c1)]
+            elif c1 >= self.n_cols:
+                col_ranges = [(c0, self.n_cols - 1), (0, c1 - self.n_cols)]
+            else:
+                col_ranges = [(c0, c1)]
+
+        slices = []
+        for r in range(r0, r1 + 1):
+            for c_lo, c_hi in col_ranges:
+                lo = np.searchsorted(self.codes, r * self.n_cols + c_lo, side="left")
+                hi = np.searchsorted(self.codes, r * self.n_cols + c_hi, side="right")
+                if hi > lo:
+                    slices.append(np.arange(lo, hi))
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def _distances(self, lat, lon, idx):
+        if len(idx) == 0:
+            return np.empty(0)
+        return haversine_vector([(lat, lon)], self.coords[idx], Unit.KILOMETERS, comb=True).ravel()
+
+    @profiled("spatial.within")
+    def within(self, lat, lon, radius_km, allowed=None):
+        """
+        Restaurantes a até `radius_km` de (lat, lon), do mais próximo ao mais distante.
+        `allowed` (máscara booleana por linha do frame) restringe o universo.
+        Retorna DataFrame [row, distance_km].
+        """
+        idx = self._candidates(lat, lon, radius_km)
+        if allowed is not None:
+            idx = idx[allowed[self.rows[idx]]]
+        dist = self._distances(lat, lon, idx)
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+        order = np.lexsort((self.rows[idx], dist))
+        return pd.DataFrame({"row": self.rows[idx][order], "distance_km": dist[order]})
+
+    @profiled("spatial.nearest")
+    def nearest(self, lat, lon, k=10, allowed=None, exclude=None):
+        """
+        Os `k` restaurantes mais próximos de (lat, lon). O raio de busca dobra até
+        conter k pontos (todo ponto dentro do raio é garantidamente encontrado).
+        `exclude`: posição de linha a ignorar (ex.: o próprio restaurante).
+        Retorna DataFrame [row, distance_km].
+        """
+        if exclude is not None:
+            allowed = np.ones(self.n_rows, dtype=bool) if allowed is None else allowed.copy()
+            allowed[exclude] = False
+
+        radius = max(self.cell_deg * KM_PER_DEG, 1.0)
+        max_radius = np.pi * EARTH_RADIUS_KM
+        while True:
+            found = self.within(lat, lon, radius, allowed=allowed)
+            if len(found) >= k or radius >= max_radius:
+                return found.head(k).reset_index(drop=True)
+            radius *= 2
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# campos indexados na busca textual e seus pesos
+SEARCH_FIELDS = {"name": 3.0, "Locality": 2.0, "city": 1.5, "Address": 1.0}
+# qualidade do casamento de cada termo da consulta
+SEARCH_EXACT, SEARCH_PREFIX, SEARCH_FUZZY = 1.0, 0.7, 0.5
+SEARCH_MIN_PREFIX = 2
+SEARCH_MIN_FUZZY = 4
+SEARCH_MAX_PREFIX_TERMS = 200
+
+
+def search_tokens(text):
+    """Texto -> termos: minúsculas, sem acentos nem apóstrofos ("Domino's Café" -> dominos, cafe)."""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return _TOKEN_RE.findall(text.lower().replace("'", ""))
+
+
+def _deletes(term):
+    """Variantes de `term` com um caractere removido (vizinhança de edição 1, estilo SymSpell)."""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a, b):
+    """Distância de edição (com transposição) entre `a` e `b` é no máximo 1."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (
+            len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+        )
+    short, long = (a, b) if len(a) < len(b) else (b, a)
+    i = 0
+    while i < len(short) and short[i] == long[i]:
+        i += 1
+    return short[i:] == long[i + 1:]
+
+
+class SearchIndex:
+    """
+    Índice invertido para busca textual (nome, bairro, cidade, endereço), em CSR
+    como o PostingIndex: termo -> linhas, com o peso do campo em que aparece.
+
+    Cada termo da consulta casa termos do vocabulário de forma exata, por
+    prefixo (busca enquanto digita) ou com até 1 erro de digitação (tabela de
+    deleções pré-computada, sem varrer o vocabulário). A pontuação da linha
+    soma, por termo da consulta, o melhor peso do campo × idf × qualidade do
+    casamento; linhas que casam todos os termos vêm primeiro.
+    """
+
+    def __init__(self, fields, n_rows):
+        # fields: lista de (série, peso), todas com n_rows linhas
+        pair_rows, pair_terms, pair_weights = [], [], []
+        for series, weight in fields:
+            codes, uniques = pd.factorize(pd.Series(series.to_numpy(dtype=object)))
+            # tokeniza só os valores distintos (nomes de rede e bairros se repetem muito)
+            tokens = [sorted(set(search_tokens(u))) for u in uniques]
+            lens = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+            terms = [t for ts in tokens for t in ts]
+            unique_of_pair = np.repeat(np.arange(len(uniques)), lens)
+
+            # linhas agrupadas por valor distinto (CSR) e expansão (valor, termo) -> linhas
+            valid = codes >= 0
+            rows_by_code = np.flatnonzero(valid)[np.argsort(codes[valid], kind="stable")]
+            counts = np.bincount(codes[valid], minlength=len(uniques))
+            starts = np.concatenate([[0], np.cumsum(counts)])[:-1]
+            pair_count = counts[unique_of_pair]
+            offsets = np.arange(pair_count.sum()) - np.repeat(np.cumsum(pair_count) - pair_count, pair_count)
+            pair_rows.append(rows_by_code[np.repeat(starts[unique_of_pair], pair_count) + offsets])
+            pair_terms.append(np.repeat(np.asarray(terms, dtype=object), pair_count))
+            pair_weights.append(np.full(pair_count.sum(), weight, dtype=np.float32))
+
+        rows = np.concatenate(pair_rows) if pair_rows else np.empty(0, dtype=np.int64)
+        term_codes, vocab = pd.factorize(
+            np.concatenate(pair_terms) if pair_terms else np.empty(0, dtype=object), sort=True
+        )
+        weights = np.concatenate(pair_weights) if pair_weights else np.empty(0, dtype=np.float32)
+
+        # um lançamento por (termo, linha), com o maior peso entre os campos
+        order = np.lexsort((-weights, rows, term_codes))
+        term_codes, rows, weights = term_codes[order], rows[order], weights[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (term_codes[1:] != term_codes[:-1]) | (rows[1:] != rows[:-1])
+
+        # termos como bytes de largura fixa (só ASCII, ver search_tokens), em ordem:
+        # busca binária com searchsorted e estado todo em arrays (.npy mapeável no store compartilhado)
+        terms = [str(t).encode("ascii") for t in vocab]
+        self.vocab = np.array(terms, dtype=f"S{max(map(len, terms), default=1)}")
+        self.rows = rows[first]
+        self.weights = weights[first]
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(term_codes[first], minlength=len(self.vocab)))])
+        self.n_rows = int(n_rows)
+        doc_freq = np.diff(self.indptr)
+        self.idf = np.log1p(self.n_rows / np.maximum(doc_freq, 1)).astype(np.float32)
+        # deleção -> termos (o próprio termo também é chave), ordenado pela deleção
+        pairs = sorted(
+            (key, i) for i, term in enumerate(terms) if len(term) >= SEARCH_MIN_FUZZY
+            for key in _deletes(term) | {term}
+        )
+        self.deletion_keys = np.array([k for k, _ in pairs], dtype=self.vocab.dtype)
+        self.deletion_terms = np.array([i for _, i in pairs], dtype=np.int64)
+
+    def _range(self, keys, lo_key, hi_key=None):
+        """Posições [lo, hi) de `keys` (ordenado) com lo_key <= chave < hi_key (só lo_key: chave igual)."""
+        if len(lo_key) > keys.dtype.itemsize:
+            # mais longa que qualquer chave: nada casa (e searchsorted truncaria a busca)
+            return 0, 0
+        lo = int(np.searchsorted(keys, lo_key, side="left"))
+        hi = int(np.searchsorted(keys, lo_key, side="right") if hi_key is None else np.searchsorted(keys, hi_key))
+        return lo, hi
+
+    def _term(self, token):
+        """Índice de `token` no vocabulário, ou None."""
+        lo, hi = self._range(self.vocab, token.encode("ascii"))
+        return lo if hi > lo else None
+
+    @classmethod
+    def from_frame(cls, df, fields=SEARCH_FIELDS):
+        """Índice sobre as colunas de `fields` presentes (e com dados) em `df`."""
+        present = [(df[c], w) for c, w in fields.items() if c in df.columns and df[c].notna().any()]
+        return cls(present, len(df))
+
+    def _matches(self, token):
+        """Termos do vocabulário que casam `token`: dict índice do termo -> qualidade."""
+        found = {}
+        key = token.encode("ascii")
+        if len(token) >= SEARCH_MIN_PREFIX:
+            # termos com prefixo `key`: de key até key com o último byte incrementado
+            lo, hi = self._range(self.vocab, key, key[:-1] + bytes([key[-1] + 1]))
+            # prefixos muito comuns: fica com os termos mais frequentes
+            candidates = range(lo, hi)
+            if hi - lo > SEARCH_MAX_PREFIX_TERMS:
+                freq = np.diff(self.indptr)[lo:hi]
+                candidates = lo + np.argsort(-freq, kind="stable")[:SEARCH_MAX_PREFIX_TERMS]
+            for i in candidates:
+                found[int(i)] = SEARCH_PREFIX
+        if len(token) >= SEARCH_MIN_FUZZY:
+            for deletion in _deletes(key) | {key}:
+                lo, hi = self._range(self.deletion_keys, deletion)
+                for i in self.deletion_terms[lo:hi].tolist():
+                    if i not in found and _within_one_edit(key, self.vocab[i]):
+                        found[i] = SEARCH_FUZZY
+        exact = self._term(token)
+        if exact is not None:
+            found[exact] = SEARCH_EXACT
+        return found
+
+    @profiled("search.query")
+    def search(self, query, k=20, allowed=None, rank=None):
+        """
+        As `k` linhas mais relevantes para `query` (opcionalmente só onde
+        `allowed`, máscara booleana). Retorna DataFrame [row, score, matched]
+        ordenado por matched e score decrescentes; empate por `rank` (posição
+        de cada linha num ranking global) ou pela posição da linha.
+        """
+        tokens = list(dict.fromkeys(search_tokens(query)))
+        if not tokens:
+            return pd.DataFrame({"row": np.empty(0, dtype=np.int64), "score": np.empty(0, dtype=np.float32),
+                                 "matched": np.empty(0, dtype=np.int64)})
+        score = np.zeros(self.n_rows, dtype=np.float32)
+        matched = np.zeros(self.n_rows, dtype=np.int64)
+        for token in tokens:
+            found = self._matches(token)
+            if not found:
+                continue
+            terms = np.fromiter(found, dtype=np.int64, count=len(found))
+            quality = np.fromiter(found.values(), dtype=np.float32, count=len(found))
+            lens = self.indptr[terms + 1] - self.indptr[terms]
+            idx = np.repeat(self.indptr[terms], lens) + (np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens))
+            rows = self.rows[idx]
+            # idf do termo digitado (ou do casamento mais comum): um termo raro casado
+            # por prefixo/erro não passa na frente do casamento exato
+            exact = self._term(token)
+            token_idf = self.idf[exact] if exact is not None else self.idf[terms].min()
+            gain = self.weights[idx] * np.repeat(token_idf * quality, lens)
+            # melhor casamento de cada linha para este termo da consulta
+            order = np.lexsort((-gain, rows))
+            rows, gain = rows[order], gain[order]
+            first = np.ones(len(rows), dtype=bool)
+            first[1:] = rows[1:] != rows[:-1]
+            score[rows[first]] += gain[first]
+            matched[rows[first]] += 1
+
+        hit = matched > 0 if allowed is None else (matched > 0) & allowed
+        rows = np.flatnonzero(hit)
+        tiebreak = rows if rank is None else np.asarray(rank)[rows]
+        order = np.lexsort((tiebreak, -score[rows], -matched[rows]))[:k]
+        rows = rows[order]
+        return pd.DataFrame({"row": rows, "score": score[rows], "matched": matched[rows]})
+
+
+def _open_source(source):
+    """
+    Abre o `source` do DataStore uma única vez: Parquet vira um ParquetFile
+    mapeado; Arrow IPC (store compartilhado) vira a tabela mapeada. O handle
+    aberto continua legível mesmo que o arquivo seja apagado depois (snapshot
+    substituído por outro processo, versão antiga do store compartilhado).
+    """
+    import pyarrow.parquet as pq
+    if str(source).endswith(".arrow"):
+        return _read_arrow(source)
+    return pq.ParquetFile(source, memory_map=True)
+
+
+def _source_schema(handle):
+    """Colunas do handle aberto por `_open_source`."""
+    import pyarrow as pa
+    if isinstance(handle, pa.Table):
+        return handle.column_names
+    return handle.schema_arrow.names
+
+
+def _read_source(handle, columns):
+    """Lê só `columns` do handle (projeção; a tabela Arrow é mapeada, não copiada)."""
+    import pyarrow as pa
+    if isinstance(handle, pa.Table):
+        return handle.select(columns).to_pandas(split_blocks=True)
+    return compact_dtypes(handle.read(columns=columns, use_pandas_metadata=True).to_pandas())
+
+
+_STORE_SEQ = itertools.count(1)
+
+
+def _store_identity(source):
+    """
+    Identidade do conteúdo de um store: o arquivo de origem (o nome do snapshot
+    já carrega a chave do CSV) com o mtime, ou um número de sequência do processo
+    para stores montados só em memória.
+    """
+    if source is None:
+        return f"memory-{next(_STORE_SEQ)}"
+    return f"{source}@{os.stat(source).st_mtime_ns}"
+
+
+class _StoreState:
+    """
+    Uma versão do DataStore: frame, cubo, índices de filtro e estruturas sob
+    demanda montadas sobre esse frame. As linhas e os índices não mudam depois
+    de criado; um `refresh` monta um estado novo e o publica com uma única
+    atribuição, então quem guardou `store._state` continua lendo um conjunto
+    coerente. Colunas lidas sob demanda são acrescentadas ao `df` do próprio
+    estado (mesmas linhas) e as estruturas sob demanda ficam memoizadas nele.
+    """
+
+    def __init__(self, df, cube, version=0):
+        self.df = df
+        self.cube = cube
+        # incrementado a cada refresh; útil como parte de chaves de cache
+        self.version = version
+        self.all_rows = np.arange(len(df))
+        self.all_rows.setflags(write=False)
+        # índices de filtro: valor -> posições de linha ordenadas
+        self.countries = PostingIndex.from_series(df["country"])
+        self.cities = PostingIndex.from_series(df["city"])
+        # culinárias individuais ("Italian, Pizza" -> Italian, Pizza)
+        self.cuisines = PostingIndex.from_lists(df["cuisines"])
+        # Restaurant ID -> posição (primeira ocorrência), para o refresh incremental
+        self.id_lookup = None
+        # ordens de ranking pré-computadas (por coluna), criadas sob demanda
+        self.ranks = {}
+        self.ranked_postings = {}
+        # bins geográficos, índice espacial e busca textual: criados no primeiro uso
+        self.geo = None
+        self.spatial = None
+        self.search = None
+        # quantis de preço por país, montados junto com o cubo (sob demanda se o preço
+        # ainda não foi lido do `source`)
+        self.price_quantiles = price_quantiles(df) if set(PRICE_COLUMNS) <= set(df.columns) else None
+
+
+class DataStore:
+    """
+    Frame normalizado + estruturas derivadas, construídas uma única vez
+    e compartilhadas entre sessões. Tratar `df` como somente leitura.
+
+    Com `source` (Parquet ou Arrow IPC com as mesmas linhas, na mesma ordem), `df` pode
+    começar só com parte das colunas: as demais são lidas do arquivo na
+    primeira vez em que alguém as pede (`view`, `frame`, `rank`, mapas).
+
+    O estado (frame + índices) fica em um único `_StoreState`; cada consulta lê
+    `self._state` uma vez e usa só esse estado, então um `refresh` concorrente
+    nunca mistura o frame novo com índices ou rankings antigos.
+    """
+
+    def __init__(self, df, cube=None, source=None):
+        df = df.reset_index(drop=True)
+        self.identity = _store_identity(source)
+        self._lock = threading.RLock()
+        self._source = source
+        self._source_file = _open_source(source) if source is not None else None
+        self._source_columns = _source_schema(self._source_file) if source is not None else []
+        if "rating_score" not in df.columns and "rating_score" not in self._source_columns and "rating" in df.columns:
+            # fontes sem as notas (ex.: saída de ingest_stream): calcula sobre o frame inteiro
+            df = add_rating_scores(df)
+        # agregados parciais para os KPIs das páginas
+        self._state = _StoreState(df, cube if cube is not None else AggCube.from_frame(df))
+
+    @property
+    def df(self):
+        return self._state.df
+
+    @property
+    def cube(self):
+        return self._state.cube
+
+    @property
+    def version(self):
+        return self._state.version
+
+    @property
+    def countries(self):
+        return self._state.countries
+
+    @property
+    def cities(self):
+        return self._state.cities
+
+    @property
+    def cuisines(self):
+        return self._state.cuisines
+
+    @property
+    def cache_token(self):
+        """Parte das chaves de cache: (identidade do conteúdo, versão compartilhada, versão local)."""
+        return (self.identity, getattr(self, "shared_version", None), self._state.version)
+
+    @property
+    def columns(self):
+        """Colunas disponíveis: já carregadas + carregáveis sob demanda do `source`."""
+        df = self._state.df
+        return list(df.columns) + [c for c in self._source_columns if c not in df.columns]
+
+    def _load_columns(self, state, columns):
+        """Acrescenta ao `df` de `state` as `columns` do `source` que ainda faltam (projeção Parquet)."""
+        missing = [c for c in columns if c not in state.df.columns and c in self._source_columns]
+        if not missing:
+            return
+        with self._lock:
+            missing = [c for c in missing if c not in state.df.columns and c in self._source_columns]
+            if not missing:
+                return
+            with timed("store.load_columns"):
+                extra = _read_source(self._source_file, missing)
+            if len(extra) != len(state.df):
+                raise ValueError(f"{self._source} não corresponde mais ao frame carregado")
+            # mesmas linhas, mesma ordem: os dois frames têm RangeIndex
+            state.df = state.df.assign(**{c: extra[c] for c in missing})
+
+    def ensure_columns(self, columns):
+        """Carrega do `source` (projeção Parquet) as `columns` que ainda não estão em `df`."""
+        self._load_columns(self._state, columns)
+
+    def view(self, columns):
+        """
+        Frame só com as `columns` declaradas pela página. Cada página pede aqui
+        as colunas que usa; as que faltam são lidas do snapshot colunar sob
+        demanda. A seleção copia as colunas pedidas (pandas sem copy-on-write):
+        o ganho está em não ler do disco as que nenhuma página usa.
+        """
+        state = self._state
+        self._load_columns(state, columns)
+        return state.df[[c for c in columns if c in state.df.columns]]
+
+    # estruturas sob demanda: construídas sob o lock, então uma sessão que chega
+    # enquanto o pré-aquecimento constrói espera em vez de repetir o trabalho
+    def _lazy(self, state, name, columns, build):
+        """Estrutura `name` de `state`, criada com `build(df)` no primeiro uso."""
+        value = getattr(state, name)
+        if value is None:
+            with self._lock:
+                value = getattr(state, name)
+                if value is None:
+                    self._load_columns(state, columns)
+                    value = build(state.df)
+                    setattr(state, name, value)
+        return value
+
+    def _geo(self, state):
+        return self._lazy(state, "geo", ["latitude", "longitude", "rating"],
+                          lambda df: GeoGrid(df["latitude"], df["longitude"], df["rating"]))
+
+    def _spatial(self, state):
+        return self._lazy(state, "spatial", ["latitude", "longitude"],
+                          lambda df: SpatialIndex(df["latitude"], df["longitude"]))
+
+    def _search_index(self, state):
+        return self._lazy(state, "search", list(SEARCH_FIELDS), SearchIndex.from_frame)
+
+    def _price_quantiles(self, state):
+        return self._lazy(state, "price_quantiles", PRICE_COLUMNS, price_quantiles)
+
+    @property
+    def geo(self):
+        return self._geo(self._state)
+
+    @property
+    def spatial(self):
+        return self._spatial(self._state)
+
+    @property
+    def search_index(self):
+        return self._search_index(self._state)
+
+    def search(self, query, k=20, countries=None, cities=None, cuisines=None):
+        """
+        Busca textual por nome, bairro, cidade e endereço (prefixo e até 1 erro de
+        digitação), restrita aos filtros; empates pela ordem do ranking por rating_score.
+        Retorna DataFrame [row, score, matched].
+        """
+        state = self._state
+        allowed = None
+        if countries or cities or cuisines:
+            allowed = np.zeros(len(state.df), dtype=bool)
+            allowed[self._select(state, countries, cities, cuisines)] = True
+        return self._search_index(state).search(query, k=k, allowed=allowed, rank=self._rank(state, "rating_score"))
+
+    def nearby(self, lat, lon, radius_km=5.0, k=10, exclude=None, cuisines=None):
+        """
+        Vizinhança de (lat, lon) para a página de Proximidade: restaurantes a até
+        `radius_km` e os `k` mais próximos, sem a linha `exclude` e, com `cuisines`,
+        só os que têm alguma delas. Retorna (in_radius, nearest), DataFrames [row, distance_km].
+        """
+        state = self._state
+        spatial = self._spatial(state)
+        allowed = state.cuisines.mask_for(cuisines) if cuisines else None
+        in_radius = spatial.within(lat, lon, radius_km, allowed=allowed)
+        if exclude is not None:
+            in_radius = in_radius[in_radius["row"] != exclude].reset_index(drop=True)
+        return in_radius, spatial.nearest(lat, lon, k=k, allowed=allowed, exclude=exclude)
+
+    @property
+    def price_quantiles(self):
+        """Quantis de preço por país (moeda local e de referência)."""
+        return self._price_quantiles(self._state)
+
+    def _positions_for_ids(self, state, ids):
+        """Posição de cada Restaurant ID em `ids` no frame de `state` (-1 quando ausente)."""
+        self._load_columns(state, ["Restaurant ID"])
+        if state.id_lookup is None:
+            frame_ids = state.df["Restaurant ID"]
+            first = ~frame_ids.duplicated().to_numpy()
+            state.id_lookup = (pd.Index(frame_ids[first].to_numpy()), np.flatnonzero(first))
+        index, positions = state.id_lookup
+        hit = index.get_indexer(np.asarray(ids))
+        return np.where(hit >= 0, positions[np.maximum(hit, 0)], -1)
+
+    def refresh(self, delta):
+        """
+        Aplica um delta de restaurantes novos/alterados sem recarregar o dataset.
+
+        `delta` pode ser um caminho (CSV/Parquet no formato do Zomato) ou um
+        DataFrame bruto. Linhas são casadas por Restaurant ID: IDs novos são
+        anexados; IDs existentes só são regravados quando o hash da linha muda.
+        O cubo é atualizado subtraindo as linhas antigas e somando as novas; as
+        listas invertidas são reconstruídas a partir dos códigos categóricos.
+        Frame, cubo e índices novos são montados à parte (o estado atual não é
+        alterado) e publicados juntos, numa única atribuição de `_state`.
+        Retorna dict com inserted, updated, unchanged e seconds.
+        """
+        start = time.perf_counter()
+        if isinstance(delta, pd.DataFrame):
+            new = normalize_frame(delta.copy())
+            if "Restaurant ID" in new.columns:
+                new, _ = clean_frame(new)
+        else:
+            new = read_dataset(delta, use_snapshot=False)
+        if "Restaurant ID" not in new.columns:
+            raise ValueError("O delta precisa da coluna 'Restaurant ID'")
+
+        with self._lock:
+            state = self._state
+            # o frame vai divergir do `source`: carrega o que falta e desliga a leitura sob demanda
+            self._load_columns(state, self._source_columns)
+            self._source, self._source_file, self._source_columns = None, None, []
+            df, new = _unify_frames(state.df, new)
+            pos = self._positions_for_ids(state, new["Restaurant ID"])
+            existing = pos >= 0
+            # notas/percentis dependem do frame inteiro: ficam fora da comparação e são recalculados
+            cols = [c for c in df.columns if c in new.columns and c not in SCORE_COLUMNS]
+
+            old_rows = df.iloc[pos[existing]][cols].reset_index(drop=True)
+            cand_rows = new.loc[existing, cols].reset_index(drop=True)
+            changed = (_row_hash(old_rows) != _row_hash(cand_rows)).to_numpy()
+
+            changed_pos = pos[existing][changed]
+            updated = new[existing].iloc[np.flatnonzero(changed)]
+            inserted = new[~existing]
+
+            if len(changed_pos):
+                removed_cube = AggCube.from_frame(df.iloc[changed_pos]).negated()
+                # colunas regravadas em cópias: `df` é cópia rasa e as sessões ainda leem o frame atual
+                for c in cols:
+                    column = df[c].copy()
+                    column.iloc[changed_pos] = updated[c].to_numpy()
+                    df[c] = column
+            else:
+                removed_cube = None
+            if len(inserted):
+                df = concat_frames([df, inserted.reindex(columns=df.columns)])
+
+            touched = pd.concat([updated, inserted]) if len(updated) or len(inserted) else None
+            if touched is not None:
+                parts = [state.cube, AggCube.from_frame(touched)]
+                if removed_cube is not None:
+                    parts.append(removed_cube)
+                df = add_rating_scores(df)
+                # concat descarta `attrs`: o relatório de qualidade e os tempos do carregamento seguem o frame novo
+                df.attrs = dict(state.df.attrs)
+                if "quality_report" in df.attrs:
+                    df.attrs["quality_report"] = {**df.attrs["quality_report"], "rows_out": len(df)}
+                self._state = _StoreState(df, AggCube.merge(parts), version=state.version + 1)
+
+        return {
+            "inserted": int(len(inserted)),
+            "updated": int(len(changed_pos)),
+            "unchanged": int(existing.sum() - len(changed_pos)),
+            "seconds": time.perf_counter() - start,
+        }
+
+    @profiled("store.select")
+    def select(self, countries=None, cities=None, cuisines=None):
+        """
+        Posições (ordenadas) das linhas que atendem aos filtros, obtidas pela
+        interseção das listas invertidas. None/vazio = sem filtro naquela dimensão.
+        Nenhuma cópia do frame é feita.
+        """
+        return self._select(self._state, countries, cities, cuisines)
+
+    def _select(self, state, countries=None, cities=None, cuisines=None):
+        parts = [
+            index.rows_for(values)
+            for index, values in ((state.countries, countries), (state.cities, cities), (state.cuisines, cuisines))
+            if values
+        ]
+        if not parts:
+            return state.all_rows
+        parts.sort(key=len)
+        rows = parts[0]
+        for other in parts[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def rank(self, by="rating"):
+        """
+        Posição de cada linha na ordem global por `by` decrescente, desempate por
+        Votes decrescente e depois pela posição no frame (ordem estável entre reruns).
+        Valores nulos ficam no fim.
+        """
+        return self._rank(self._state, by)
+
+    def _rank(self, state, by):
+        if by not in state.ranks:
+            self._load_columns(state, [by, "Votes"])
+            df = state.df
+            value = pd.to_numeric(df[by], errors="coerce").to_numpy(dtype=np.float64)
+            votes = (
+                pd.to_numeric(df["Votes"], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+                if "Votes" in df.columns else np.zeros(len(df))
+            )
+            value = np.where(np.isnan(value), -np.inf, value)
+            order = np.lexsort((state.all_rows, -votes, -value))
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            state.ranks[by] = rank
+        return state.ranks[by]
+
+    def _ranked(self, state, index, by):
+        """Listas invertidas de `index` reordenadas pelo ranking de `by` (pré-ordenadas)."""
+        key = (id(index), by)
+        if key not in state.ranked_postings:
+            rank = self._rank(state, by)
+            # ordena por (valor, rank): cada fatia do CSR fica em ordem de ranking
+            order = np.lexsort((rank[index.rows], index.codes))
+            state.ranked_postings[key] = index.rows[order]
+        return state.ranked_postings[key]
+
+    @profiled("store.top_k")
+    def top_k(self, rows=None, k=10, by="rating", countries=None, cities=None, cuisines=None):
+        """
+        Posições das `k` melhores linhas por `by` (ver `rank`), já ordenadas.
+
+        Com um único país ou uma única cidade como filtro, a resposta sai direto
+        da lista pré-ordenada daquele valor (O(k)). Nos demais casos usa seleção
+        parcial (argpartition) sobre `rows` ou sobre `select(...)`: O(n), sem sort completo.
+        """
+        state = self._state
+        filters = [(state.countries, countries), (state.cities, cities), (state.cuisines, cuisines)]
+        active = [(index, values) for index, values in filters if values]
+        if rows is None and len(active) == 1 and len(active[0][1]) == 1 and active[0][0] is not state.cuisines:
+            index, values = active[0]
+            i = index._pos.get(str(values[0]))
+            if i is None:
+                return np.empty(0, dtype=np.int64)
+            return self._ranked(state, index, by)[index.indptr[i]:index.indptr[i + 1]][:k]
+
+        if rows is None:
+            rows = self._select(state, countries, cities, cuisines)
+        rows = np.asarray(rows, dtype=np.int64)
+        rank = self._rank(state, by)
+        if len(rows) > k:
+            rows = rows[np.argpartition(rank[rows], k - 1)[:k]]
+        return rows[np.argsort(rank[rows])]
+
+    @profiled("store.frame")
+    def frame(self, rows, columns):
+        """Materializa apenas `columns` das linhas em `rows` (índice = posição no frame)."""
+        state = self._state
+        self._load_columns(state, columns)
+        df = state.df
+        columns = [c for c in columns if c in df.columns]
+        return df.iloc[rows, df.columns.get_indexer(columns)]
+
+
+def price_quantiles(df, qs=(0.25, 0.5, 0.75)):
+    """
+    Quantis de preço por país, em moeda local e em REFERENCE_CURRENCY.
+    Retorna DataFrame indexado por país: currency_code, n, local_q25..., usd_q25...
+    """
+    local_cols = [f"local_q{int(q * 100)}" for q in qs]
+    usd_cols = [f"usd_q{int(q * 100)}" for q in qs]
+    if "price_num" not in df.columns or "country" not in df.columns:
+        return pd.DataFrame(columns=["currency_code", "n"] + local_cols + usd_cols)
+
+    work = pd.DataFrame({
+        "country": df["country"],
+        "local": pd.to_numeric(df["price_num"], errors="coerce").astype("float64"),
+        "usd": pd.to_numeric(df.get("price_usd", np.nan), errors="coerce").astype("float64"),
+    })
+    g = work.groupby("country", observed=True)
+    local = g["local"].quantile(list(qs)).unstack()
+    usd = g["usd"].quantile(list(qs)).unstack()
+    local.columns, usd.columns = local_cols, usd_cols
+    out = pd.concat([g["local"].count().rename("n"), local, usd], axis=1)
+    if "currency_code" in df.columns:
+        codes = df.groupby("country", observed=True)["currency_code"].first().astype(object)
+        out.insert(0, "currency_code", codes)
+    else:
+        out.insert(0, "currency_code", None)
+    out.index = out.index.astype(str)
+    return out
+
+
+def _row_hash(frame):
+    """Hash por linha, estável entre dtypes (numéricos como float64, resto por valor)."""
+    frame = frame.astype({
+        c: "float64" for c in frame.columns
+        if pd.api.types.is_numeric_dtype(frame[c]) and not pd.api.types.is_bool_dtype(frame[c])
+    })
+    return pd.util.hash_pandas_object(frame, index=False)
+
+
+def _unify_frames(a, b):
+    """
+    Alinha os dtypes de `a` e `b` (cópia rasa de `a`): categóricas ganham as
+    categorias novas e numéricas sobem para o tipo comum (np.result_type) nos
+    dois frames. O delta nunca é convertido para um tipo menor: um ID que não
+    cabe no int32 compactado do store promove a coluna do store a int64.
+    """
+    a = a.copy(deep=False)
+    b = b.copy()
+    for c in a.columns.intersection(b.columns):
+        if isinstance(a[c].dtype, pd.CategoricalDtype):
+            extra = pd.Index(b[c].dropna().unique()).difference(a[c].cat.categories)
+            if len(extra):
+                a[c] = a[c].cat.add_categories(extra)
+            b[c] = b[c].astype(a[c].dtype)
+        elif a[c].dtype != b[c].dtype and all(
+            isinstance(s.dtype, np.dtype) and s.dtype.kind in "biuf" for s in (a[c], b[c])
+        ):
+            common = np.result_type(a[c].dtype, b[c].dtype)
+            if a[c].dtype != common:
+                a[c] = a[c].astype(common)
+            if b[c].dtype != common:
+                b[c] = b[c].astype(common)
+    return a, b
+
+
+@profiled("build_store")
+def build_store(path="dataset/zomato.csv", columns=STORE_COLUMNS):
+    """
+    Carrega o dataset e monta o DataStore (sem cache do Streamlit; usado também pelo service.py).
+    Com snapshot colunar disponível só `columns` são lidas na partida; as demais
+    ficam para quando uma página pedir. `columns=None` carrega tudo.
+    """
+    cube = None
+    # saída de ingest_stream: reaproveita o cubo gravado junto do Parquet
+    if str(path).endswith(".parquet") and os.path.exists(f"{path}.cells.parquet"):
+        cube = AggCube.read_parquet(path)
+    source = dataset_source(path) if columns is not None else None
+    if source is None:
+        return DataStore(read_dataset(path), cube=cube)
+    return DataStore(scan_dataset(source, columns=columns), cube=cube, source=source)
+
+
+def get_store(path="dataset/zomato.csv"):
+    """
+    DataStore compartilhado pelo processo (um por caminho de dataset). Com
+    FOME_ZERO_SHARED=1 vem do segmento mapeado em memória, comum a todas as
+    réplicas da máquina. A primeira chamada do processo também inicia o
+    pré-aquecimento em segundo plano (`start_warmup`).
+    """
+    start_warmup(path)
+    return _load_store(path)
+
+
+def _load_store(path):
+    """DataStore de `path` sem disparar o pré-aquecimento (usado pela própria thread do Warmup)."""
+    if shared_enabled():
+        return shared_store(path)
+    return _process_store(path)
+
+
+@st.cache_resource
+def _process_store(path):
+    return build_store(path)
+
+
+def refresh_store(delta, path="dataset/zomato.csv"):
+    """
+    Aplica `delta` ao DataStore compartilhado de `path` (visível a todas as
+    sessões). No modo compartilhado o resultado é publicado como versão nova,
+    adotada pelas demais réplicas no próximo rerun.
+    """
+    store = get_store(path)
+    stats = store.refresh(delta)
+    if shared_enabled() and (stats["inserted"] or stats["updated"]):
+        stats["shared_version"] = publish_store(store, shared_root(path))
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Store compartilhado entre processos (várias réplicas na mesma máquina)
+# ---------------------------------------------------------------------------
+
+SHARED_ENV = "FOME_ZERO_SHARED"
+SHARED_DIRNAME = "shared"
+SHARED_KEEP_VERSIONS = 2
+# índices do DataStore publicados no segmento (arrays viram .npy mapeados)
+SHARED_INDEXES = ["countries", "cities", "cuisines"]
+
+
+def shared_enabled():
+    """Store compartilhado ligado por variável de ambiente (FOME_ZERO_SHARED=1)."""
+    return os.environ.get(SHARED_ENV, "").lower() in ("1", "true", "yes")
+
+
+def shared_root(path="dataset/zomato.csv"):
+    """
+    Diretório dos segmentos compartilhados de `path`. Para um CSV a chave é a
+    mesma do snapshot, então CSV ou normalização novos geram outro diretório.
+    """
+    if os.path.isfile(path) and not str(path).endswith(".parquet"):
+        stem = snapshot_path(path).stem
+    else:
+        stem = f"{Path(path).stem}-{hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]}"
+    return Path(path).parent / SNAPSHOT_DIRNAME / SHARED_DIRNAME / stem
+
+
+def current_version(root):
+    """Versão publicada em `root` (conteúdo do ponteiro CURRENT) ou None."""
+    try:
+        version = (Path(root) / "CURRENT").read_text().strip()
+    except FileNotFoundError:
+        return None
+    return version if (Path(root) / version).is_dir() else None
+
+
+def _arrow_table(df):
+    """Frame -> tabela Arrow sem converter NaN em nulo (floats sem nulos são mapeados sem cópia)."""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, col in enumerate(df.columns):
+        if df[col].dtype.kind == "f":
+            table = table.set_column(i, col, pa.array(df[col].to_numpy()))
+    return table
+
+
+def _write_arrow(table, path):
+    """Grava `table` em Arrow IPC sem compressão (mapeável direto do page cache)."""
+    import pyarrow as pa
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_arrow(path):
+    """Tabela Arrow IPC mapeada em memória (colunas numéricas sem cópia)."""
+    import pyarrow as pa
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+def _save_state(obj, directory, prefix):
+    """
+    Grava o estado de `obj`: arrays NumPy (soltos ou em dicts) viram .npy e
+    DataFrames viram Arrow IPC, abertos depois com mmap; índices internos (ex.:
+    os do cubo) são gravados do mesmo jeito, com prefixo próprio. O restante
+    (chaves, escalares) vai no dict devolvido.
+    """
+    state = {"cls": type(obj), "attrs": {}, "arrays": [], "dict_arrays": {}, "frames": [], "objects": {}}
+    for name, value in vars(obj).items():
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            np.save(directory / f"{prefix}.{name}.npy", value)
+            state["arrays"].append(name)
+        elif (isinstance(value, dict) and value
+              and all(isinstance(v, np.ndarray) and v.dtype != object for v in value.values())):
+            keys = list(value)
+            for i, k in enumerate(keys):
+                np.save(directory / f"{prefix}.{name}.{i}.npy", value[k])
+            state["dict_arrays"][name] = keys
+        elif isinstance(value, pd.DataFrame):
+            _write_arrow(_arrow_table(value), directory / f"{prefix}.{name}.arrow")
+            state["frames"].append(name)
+        elif isinstance(value, PostingIndex):
+            state["objects"][name] = _save_state(value, directory, f"{prefix}.{name}")
+        else:
+            state["attrs"][name] = value
+    return state
+
+
+def _load_state(state, directory, prefix):
+    """Recria o objeto gravado por `_save_state` (arrays somente leitura, mapeados do disco)."""
+    obj = state["cls"].__new__(state["cls"])
+    obj.__dict__.update(state["attrs"])
+    for name in state["arrays"]:
+        setattr(obj, name, np.load(directory / f"{prefix}.{name}.npy", mmap_mode="r"))
+    for name, keys in state["dict_arrays"].items():
+        setattr(obj, name, {k: np.load(directory / f"{prefix}.{name}.{i}.npy", mmap_mode="r")
+                            for i, k in enumerate(keys)})
+    for name in state["frames"]:
+        setattr(obj, name, _read_arrow(directory / f"{prefix}.{name}.arrow").to_pandas(split_blocks=True))
+    for name, sub in state["objects"].items():
+        setattr(obj, name, _load_state(sub, directory, f"{prefix}.{name}"))
+    return obj
+
+
+@profiled("shared.publish")
+def publish_store(store, root, keep=SHARED_KEEP_VERSIONS):
+    """
+    Publica `store` em `root` para outros processos: frame e tabelas do cubo em
+    Arrow IPC sem compressão, arrays dos índices (filtros, cubo, mapa, busca)
+    como .npy e só metadados pequenos em pickle, numa pasta de versão nova. O ponteiro CURRENT é trocado de forma atômica (os.replace) só depois
+    da pasta completa; processos que ainda mapeiam versões antigas continuam
+    lendo normalmente. Mantém as `keep` versões mais recentes. Retorna a versão.
+    """
+    import pickle
+
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    version = f"v{time.time_ns()}-{os.getpid()}"
+    tmp = root / f"{version}.tmp"
+    tmp.mkdir()
+
+    with store._lock:
+        state = store._state
+        store._load_columns(state, store._source_columns)
+        # estruturas sob demanda entram no segmento: a réplica que conecta não reconstrói nada
+        for by in ["rating", "rating_score"]:
+            for name in ["countries", "cities"]:
+                store._ranked(state, getattr(state, name), by)
+        if {"latitude", "longitude"} <= set(state.df.columns):
+            store._geo(state)
+            store._spatial(state)
+        store._search_index(state)
+        if set(PRICE_COLUMNS) <= set(state.df.columns):
+            store._price_quantiles(state)
+
+        _write_arrow(_arrow_table(state.df), tmp / "frame.arrow")
+
+        names = {id(getattr(state, n)): n for n in SHARED_INDEXES}
+        meta = {
+            "store_version": state.version,
+            "quality_report": state.df.attrs.get("quality_report"),
+            "cube": _save_state(state.cube, tmp, "cube"),
+            "price_quantiles": state.price_quantiles,
+            "indexes": {n: _save_state(getattr(state, n), tmp, n) for n in SHARED_INDEXES},
+            "geo": _save_state(state.geo, tmp, "geo") if state.geo is not None else None,
+            "spatial": _save_state(state.spatial, tmp, "spatial") if state.spatial is not None else None,
+            "search": _save_state(state.search, tmp, "search"),
+            "ranks": list(state.ranks),
+            "ranked": [(names[i], by) for i, by in state.ranked_postings if i in names],
+        }
+        for by, rank in state.ranks.items():
+            np.save(tmp / f"rank.{by}.npy", rank)
+        for i, (key, rows) in enumerate(state.ranked_postings.items()):
+            if key[0] in names:
+                np.save(tmp / f"ranked.{i}.npy", rows)
+        with open(tmp / "meta.pkl", "wb") as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(tmp, root / version)
+    pointer = root / f"CURRENT.{os.getpid()}.tmp"
+    pointer.write_text(version)
+    os.replace(pointer, root / "CURRENT")
+
+    # versões antigas: apagar arquivos mapeados é seguro (o mapeamento continua válido)
+    versions = sorted((d for d in root.glob("v*") if d.is_dir() and not d.name.endswith(".tmp")),
+                      key=lambda d: d.stat().st_mtime_ns)
+    for old in versions[:-keep] if keep else []:
+        if old.name != version:
+            for f in old.iterdir():
+                f.unlink(missing_ok=True)
+            old.rmdir()
+    return version
+
+
+@profiled("shared.attach")
+def attach_store(root, version=None):
+    """
+    DataStore a partir do segmento publicado em `root` (versão CURRENT por
+    padrão), sem reconstruir índices: arrays e colunas numéricas são mapeados
+    do page cache, compartilhado por todos os processos da máquina. As colunas
+    do núcleo (STORE_COLUMNS) viram DataFrame na hora; as demais são lidas do
+    arquivo Arrow sob demanda, como no snapshot Parquet.
+    """
+    import pickle
+
+    root = Path(root)
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"nenhum store publicado em {root}")
+    directory = root / version
+    with open(directory / "meta.pkl", "rb") as f:
+        meta = pickle.load(f)
+
+    source = directory / "frame.arrow"
+    table = _read_arrow(source)
+    core = [c for c in STORE_COLUMNS if c in table.column_names]
+    df = table.select(core).to_pandas(split_blocks=True)
+    if meta["quality_report"] is not None:
+        df.attrs["quality_report"] = meta["quality_report"]
+
+    state = _StoreState.__new__(_StoreState)
+    state.df = df
+    state.cube = _load_state(meta["cube"], directory, "cube")
+    state.version = meta["store_version"]
+    state.all_rows = np.arange(len(df))
+    state.all_rows.setflags(write=False)
+    for name, index_state in meta["indexes"].items():
+        setattr(state, name, _load_state(index_state, directory, name))
+    state.id_lookup = None
+    state.ranks = {by: np.load(directory / f"rank.{by}.npy", mmap_mode="r") for by in meta["ranks"]}
+    state.ranked_postings = {
+        (id(getattr(state, name)), by): np.load(directory / f"ranked.{i}.npy", mmap_mode="r")
+        for i, (name, by) in enumerate(meta["ranked"])
+    }
+    state.geo = _load_state(meta["geo"], directory, "geo") if meta["geo"] is not None else None
+    state.spatial = _load_state(meta["spatial"], directory, "spatial") if meta["spatial"] is not None else None
+    state.search = _load_state(meta["search"], directory, "search")
+    state.price_quantiles = meta["price_quantiles"]
+
+    store = DataStore.__new__(DataStore)
+    store.shared_version = version
+    store.identity = _store_identity(source)
+    store._lock = threading.RLock()
+    store._source = source
+    # colunas sob demanda saem desta tabela já mapeada, que continua legível
+    # mesmo depois que publish_store apagar a versão
+    store._source_file = table
+    store._source_columns = table.column_names
+    store._state = state
+    return store
+
+
+@st.cache_resource(max_entries=SHARED_KEEP_VERSIONS)
+def _attached_store(root, version):
+    return attach_store(root, version)
+
+
+def shared_store(path="dataset/zomato.csv"):
+    """
+    DataStore do segmento compartilhado de `path`. A primeira réplica da
+    máquina constrói e publica; as seguintes só mapeiam. Cada chamada confere o
+    ponteiro CURRENT, então uma versão nova publicada (ex.: após um refresh em
+    outro processo) é adotada no rerun seguinte.
+    """
+    root = shared_root(path)
+    version = current_version(root)
+    if version is None:
+        version = publish_store(build_store(path), root)
+    return _attached_store(str(root), version)
+
+
+# ---------------------------------------------------------------------------
+# Ingestão em streaming (dumps maiores que a memória)
+# ---------------------------------------------------------------------------
+
+def _peak_rss_mb():
+    """Pico de memória residente do processo em MB (None se indisponível)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return peak / 1024 / 1024 if peak > 1 << 32 else peak / 1024
+
+
+def _stream_schema(table):
+    """
+    Schema estável entre chunks: inteiros em int64, categorias como
+    dictionary<int32, string> e colunas nulas como string.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for field in table.schema:
+        t = field.type
+        if pa.types.is_integer(t):
+            t = pa.int64()
+        elif pa.types.is_dictionary(t):
+            t = pa.dictionary(pa.int32(), pa.string())
+        elif pa.types.is_null(t) or pa.types.is_large_string(t):
+            t = pa.string()
+        fields.append(pa.field(field.name, t))
+    return pa.schema(fields)
+
+
+class _SeenIds:
+    """
+    Conjunto de Restaurant IDs já vistos: vetor int64 ordenado e sem repetição.
+    A memória cresce com o nº de IDs distintos (8 bytes cada), não com o maior ID;
+    cada lote é consultado e mesclado com searchsorted.
+    """
+
+    def __init__(self):
+        self._ids = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def nbytes(self):
+        return self._ids.nbytes
+
+    def filter_new(self, ids):
+        """Máscara das posições de `ids` ainda não vistas (também dentro do próprio lote)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(self._ids, ids)
+        seen = pos < len(self._ids)
+        seen[seen] = self._ids[pos[seen]] == ids[seen]
+        new = ~seen & ~pd.Series(ids).duplicated().to_numpy()
+        fresh = np.sort(ids[new])
+        if fresh.size:
+            self._ids = np.insert(self._ids, np.searchsorted(self._ids, fresh), fresh)
+        return new
+
+
+def ingest_stream(pattern="dataset/*.csv", out_path="dataset/.cache/stream.parquet",
+                  chunksize=None, chunk_mb=64, dedup=True):
+    """
+    Ingestão em chunks para dumps que não cabem na memória.
+
+    Lê os CSVs de `pattern` em blocos, aplica `normalize_frame` em cada bloco,
+    descarta Restaurant IDs repetidos (entre blocos e arquivos, fica a primeira
+    ocorrência, como em dedupe_frame) e grava:
+    - `out_path`: Parquet normalizado (um row group por bloco)
+    - `out_path`.cells/.prices.parquet: cubo de agregados mesclado bloco a bloco
+
+    O pico de memória é limitado pelo tamanho do bloco: `chunksize` linhas ou,
+    se None, o nº de linhas estimado para ocupar ~`chunk_mb` MB.
+    Retorna dict com estatísticas (linhas, duplicadas, tempo, pico de memória e
+    tamanho do conjunto de IDs vistos).
+    O resultado pode ser aberto com get_store(out_path).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    paths = resolve_paths(pattern)
+    if not paths:
+        raise FileNotFoundError(f"Nenhum CSV encontrado em {pattern}")
+
+    if chunksize is None:
+        sample = pd.read_csv(paths[0], encoding="utf-8", nrows=1000)
+        bytes_per_row = max(sample.memory_usage(deep=True).sum() / max(len(sample), 1), 1)
+        chunksize = max(int(chunk_mb * 1024 * 1024 / bytes_per_row), 1000)
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(f".{os.getpid()}.tmp")
+
+    seen = _SeenIds()
+    quality = {}
+    writer, schema, cube = None, None, None
+    stats = {"files": len(paths), "chunks": 0, "chunksize": chunksize,
+             "rows_read": 0, "rows_written": 0, "duplicates": 0, "max_chunk_mb": 0.0}
+    start = time.perf_counter()
+    try:
+        for path in paths:
+            read_args, column_schema = csv_read_args(path)
+            for chunk in pd.read_csv(path, encoding="utf-8", low_memory=False, chunksize=chunksize, **read_args):
+                stats["rows_read"] += len(chunk)
+                chunk = normalize_frame(chunk, schema=column_schema)
+                if dedup and "Restaurant ID" in chunk.columns:
+                    ids = pd.to_numeric(chunk["Restaurant ID"], errors="coerce")
+                    keep = ids.isna().to_numpy().copy()
+                    keep[~keep] = seen.filter_new(ids[~keep])
+                    stats["duplicates"] += int((~keep).sum())
+                    chunk = chunk[keep]
+                if chunk.empty:
+                    continue
+                chunk = validate_frame(chunk.copy(), quality)
+                for key, value in quality.items():
+                    stats[key] = stats.get(key, 0) + value
+
+                stats["max_chunk_mb"] = max(stats["max_chunk_mb"], float(chunk.memory_usage(deep=True).sum()) / 1024 / 1024)
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    schema = _stream_schema(table)
+                    writer = pq.ParquetWriter(tmp_path, schema)
+                writer.write_table(table.cast(schema))
+
+                chunk_cube = AggCube.from_frame(chunk)
+                cube = chunk_cube if cube is None else AggCube.merge([cube, chunk_cube])
+                stats["chunks"] += 1
+                stats["rows_written"] += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError("Nenhuma linha válida encontrada nos CSVs informados")
+    os.replace(tmp_path, out_path)
+    cube.to_parquet(out_path)
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["peak_rss_mb"] = _peak_rss_mb()
+    stats["seen_ids_mb"] = seen.nbytes / 1024 / 1024
+    stats["out_path"] = str(out_path)
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Payloads de gráficos pré-agregados (histogramas e boxplots)
+# ---------------------------------------------------------------------------
+
+@profiled("chart.histogram_bins")
+def histogram_bins(values, nbins=20, value_range=None):
+    """
+    Contagem por faixa calculada no servidor (NumPy), ignorando nulos.
+    Retorna DataFrame [bin_start, bin_end, bin_mid, count] com `nbins` linhas.
+    """
+    v = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+    v = v[~np.isnan(v)]
+    if len(v) == 0:
+        return pd.DataFrame({"bin_start": [], "bin_end": [], "bin_mid": [], "count": []})
+    counts, edges = np.histogram(v, bins=nbins, range=value_range)
+    return pd.DataFrame({
+        "bin_start": edges[:-1],
+        "bin_end": edges[1:],
+        "bin_mid": (edges[:-1] + edges[1:]) / 2,
+        "count": counts,
+    })
+
+
+@profiled("chart.box_stats")
+def box_stats(groups, values, order=None, max_outliers=50):
+    """
+    Estatísticas de boxplot por grupo, no mesmo critério do Plotly: quartis,
+    bigodes no valor mais extremo dentro de 1,5 × IQR e outliers fora disso
+    (no máximo `max_outliers` por grupo, os mais distantes da mediana).
+    Retorna DataFrame [group, n, q1, median, q3, lowerfence, upperfence, outliers].
+    """
+    data = pd.DataFrame({"group": np.asarray(groups, dtype=object), "value": pd.to_numeric(pd.Series(values), errors="coerce").to_numpy()})
+    data = data.dropna()
+    if data.empty:
+        return pd.DataFrame(columns=["group", "n", "q1", "median", "q3", "lowerfence", "upperfence", "outliers"])
+
+    g = data.groupby("group", sort=False)["value"]
+    q = g.quantile([0.25, 0.5, 0.75]).unstack()
+    stats = pd.DataFrame({"n": g.size(), "q1": q[0.25], "median": q[0.5], "q3": q[0.75]})
+    iqr = stats["q3"] - stats["q1"]
+    lo_limit = (stats["q1"] - 1.5 * iqr).reindex(data["group"]).to_numpy()
+    hi_limit = (stats["q3"] + 1.5 * iqr).reindex(data["group"]).to_numpy()
+    inside = (data["value"].to_numpy() >= lo_limit) & (data["value"].to_numpy() <= hi_limit)
+    stats["lowerfence"] = data[inside].groupby("group", sort=False)["value"].min()
+    stats["upperfence"] = data[inside].groupby("group", sort=False)["value"].max()
+
+    out = data[~inside].copy()
+    out["dist"] = (out["value"] - stats["median"].reindex(out["group"]).to_numpy()).abs()
+    out = out.sort_values("dist", ascending=False, kind="stable").groupby("group", sort=False).head(max_outliers)
+    stats["outliers"] = out.groupby("group", sort=False)["value"].agg(list)
+    stats["outliers"] = stats["outliers"].apply(lambda x: x if isinstance(x, list) else [])
+
+    stats = stats.rename_axis("group").reset_index()
+    if order is not None:
+        stats = stats.set_index("group").reindex([o for o in order if o in set(stats["group"])]).reset_index()
+    return stats
+
+
+@profiled("chart.histogram_figure")
+def histogram_figure(bins, title=None, x_label=None, y_label="count"):
+    """Figura Plotly a partir de `histogram_bins` (uma barra por faixa)."""
+    fig = go.Figure(go.Bar(
+        x=bins["bin_mid"], y=bins["count"], width=(bins["bin_end"] - bins["bin_start"]),
+        customdata=np.column_stack([bins["bin_start"], bins["bin_end"]]) if len(bins) else None,
+        hovertemplate="%{customdata[0]:.2f} – %{customdata[1]:.2f}<br>%{y}<extra></extra>",
+    ))
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label, bargap=0)
+    return fig
+
+
+@profiled("chart.box_figure")
+def box_figure(stats, title=None, x_label=None, y_label=None):
+    """Figura Plotly a partir de `box_stats`: caixas pré-calculadas + outliers."""
+    fig = go.Figure(go.Box(
+        x=stats["group"], q1=stats["q1"], median=stats["median"], q3=stats["q3"],
+        lowerfence=stats["lowerfence"], upperfence=stats["upperfence"],
+        boxpoints=False, name="",
+    ))
+    exploded = stats[["group", "outliers"]].explode("outliers").dropna()
+    if not exploded.empty:
+        fig.add_trace(go.Scatter(
+            x=exploded["group"], y=exploded["outliers"].astype(float), mode="markers",
+            marker={"size": 4}, name="outliers", showlegend=False,
+        ))
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=y_label)
+    return fig
+
+
+@profiled("chart.render")
+def plotly_chart(fig, **kwargs):
+    """st.plotly_chart medido no perfil do rerun (serialização da figura + envio)."""
+    return st.plotly_chart(fig, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Cache de resultados derivados por sessão (LRU)
+# ---------------------------------------------------------------------------
+
+RESULT_CACHE_KEY = "_result_cache"
+RESULT_CACHE_MAX_ENTRIES = 128
+# teto de memória por sessão: listas de linhas ("rows") chegam a MB cada
+RESULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+def result_nbytes(value):
+    """Tamanho aproximado, em bytes, de um resultado guardado no cache."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(result_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(result_nbytes(v) for v in value.values())
+    if isinstance(value, go.Figure):
+        return len(value.to_json())
+    return 64
+
+
+class ResultCache:
+    """
+    Cache LRU de resultados derivados (contagens, agregados, figuras) com
+    contadores de acerto/erro. Limitado a `max_entries` itens e a `max_bytes`
+    (soma de `result_nbytes`): o item usado há mais tempo é descartado
+    primeiro, e um resultado maior que `max_bytes` não é guardado.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._sizes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        """Devolve o valor guardado em `key` ou calcula com `compute()` e guarda."""
+        if key in self._items:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+        self.misses += 1
+        value = compute()
+        size = result_nbytes(value)
+        if size > self.max_bytes:
+            return value
+        self._items[key] = value
+        self._sizes[key] = size
+        self.nbytes += size
+        while len(self._items) > self.max_entries or self.nbytes > self.max_bytes:
+            old, _ = self._items.popitem(last=False)
+            self.nbytes -= self._sizes.pop(old)
+        return value
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def clear(self):
+        self._items.clear()
+        self._sizes.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "max_entries": self.max_entries,
+            "mb": round(self.nbytes / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+        }
+
+
+def filter_key(*parts):
+    """
+    Normaliza a seleção de filtros em uma tupla hashável: listas viram tuplas
+    ordenadas e None/vazio/"Todos" viram () (mesma semântica de `DataStore.select`).
+    Tuplas são mantidas como vieram, para partes em que a ordem importa.
+    """
+    key = []
+    for part in parts:
+        if part is None or (isinstance(part, str) and part == "Todos"):
+            key.append(())
+        elif isinstance(part, tuple):
+            key.append(part)
+        elif isinstance(part, (list, set, np.ndarray, pd.Index)):
+            key.append(tuple(sorted(str(p) for p in part)))
+        else:
+            key.append(part)
+    return tuple(key)
+
+
+def session_cache():
+    """Cache LRU da sessão atual (um por aba do navegador, compartilhado entre as páginas)."""
+    if RESULT_CACHE_KEY not in st.session_state:
+        st.session_state[RESULT_CACHE_KEY] = ResultCache()
+    return st.session_state[RESULT_CACHE_KEY]
+
+
+def derived(store, name, compute, *parts):
+    """
+    Resultado derivado memoizado por (nome, store.cache_token, filtros normalizados).
+    Um `refresh` do store muda a versão, e um store de outro snapshot ou versão
+    compartilhada muda a identidade: os resultados antigos não são reusados. Antes de
+    calcular, consulta os resultados já pré-aquecidos pelo processo (`Warmup`).
+    """
+    key = (name, store.cache_token, filter_key(*parts))
+    return session_cache().get(key, lambda: warm_result(key, compute))
+
+
+def render_search(store, k=10):
+    """
+    Caixa de busca na sidebar: restaurantes por nome, bairro, cidade ou endereço
+    (aceita prefixos e erros de digitação). Retorna o DataFrame [row, score,
+    matched] dos resultados, ou None sem consulta.
+    """
+    query = st.sidebar.text_input("🔎 Buscar restaurante", placeholder="nome, bairro ou endereço")
+    terms = " ".join(search_tokens(query))
+    if not terms:
+        return None
+    found = derived(store, "search", lambda: store.search(terms, k=k), terms, k)
+    if found.empty:
+        st.sidebar.caption("Nenhum restaurante encontrado.")
+        return found
+    table = store.frame(found["row"].to_numpy(), ["name", "city", "Locality", "rating"])
+    st.sidebar.dataframe(table.reset_index(drop=True).astype(object).fillna("-"), hide_index=True)
+    return found
+
+
+# ---------------------------------------------------------------------------
+# Pré-aquecimento em segundo plano
+# ---------------------------------------------------------------------------
+
+WARM_CACHE_MAX_ENTRIES = 2048
+WARM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+WARM_TOP_COLUMNS = ["name", "cuisines", "rating", "Votes", "rating_score", "score_pct_country", "price_num", "price_usd"]
+WARM_CITY_COLUMNS = ["name", "city", "cuisines", "rating", "Votes", "rating_score", "score_pct_city", "price_num", "price_usd"]
+WARM_CUISINE_COLUMNS = [
+    "name", "city", "cuisines", "rating", "Votes", "rating_score", "score_pct_cuisine", "price_num", "price_usd",
+]
+WARM_GEO_COLUMNS = ["latitude", "longitude"]
+WARM_NEARBY_COLUMNS = ["name", "city", "cuisines", "rating", "price_num", "price_usd"]
+# valores iniciais dos sliders da página de Proximidade
+NEARBY_RADIUS_KM = 5.0
+NEARBY_K = 10
+_MISSING = object()
+# Warmup do processo (criado por start_warmup; consultado por `derived`)
+_warmup = None
+
+
+class Warmup:
+    """
+    Pré-cálculo em segundo plano (uma thread por processo): store, ordens de
+    ranking e os resultados derivados das seleções padrão de cada página, para
+    "Todos" e para cada país. Só usa colunas já carregadas (declaradas por alguma
+    página em `store.view`); resultados que dependem de outras colunas ficam para
+    a página calcular. Os resultados ficam em `cache`, com as mesmas chaves de
+    `derived`, e são servidos a qualquer sessão; `status()` informa o progresso.
+    """
+
+    def __init__(self, path="dataset/zomato.csv"):
+        self.path = path
+        self.cache = ResultCache(max_entries=WARM_CACHE_MAX_ENTRIES, max_bytes=WARM_CACHE_MAX_BYTES)
+        self._lock = threading.Lock()
+        self.state = "pending"
+        self.step = None
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fome-zero-warmup", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        # encerrar o processo com a thread dentro do pyarrow aborta o interpretador:
+        # na saída, interrompe entre etapas e espera a etapa corrente terminar
+        atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=30):
+        self._stop.set()
+        self.wait(timeout)
+
+    def wait(self, timeout=None):
+        """Bloqueia até o fim do pré-aquecimento; True se terminou."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def lookup(self, key):
+        """Resultado pré-aquecido de `key` ou _MISSING."""
+        with self._lock:
+            return self.cache.get(key, None) if key in self.cache else _MISSING
+
+    def _put(self, store, name, compute, *parts):
+        key = (name, store.cache_token, filter_key(*parts))
+        with self._lock:
+            if key in self.cache:
+                return self.cache.get(key, None)
+        value = compute()
+        with self._lock:
+            return self.cache.get(key, lambda: value)
+
+    def _run(self):
+        self.started = time.time()
+        self.state = "running"
+        try:
+            self.step = "store"
+            store = _load_store(self.path)
+            steps = warm_steps(store, functools.partial(self._put, store))
+            self.total = len(steps) + 1
+            self.done = 1
+            for name, fn in steps:
+                if self._stop.is_set():
+                    self.state = "stopped"
+                    return
+                self.step = name
+                with timed(f"warmup.{name}"):
+                    fn()
+                self.done += 1
+            self.state = "ready"
+        except Exception as e:
+            self.state = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            logging.getLogger("fome_zero").exception("falha no pré-aquecimento")
+        finally:
+            self.step = None
+            self.finished = time.time()
+
+    def status(self):
+        end = self.finished or time.time()
+        return {
+            "state": self.state,
+            "step": self.step,
+            "done": self.done,
+            "total": self.total,
+            "seconds": round(end - self.started, 2) if self.started else None,
+            "error": self.error,
+            "cache": self.cache.stats(),
+        }
+
+
+def _declared(store, columns):
+    """
+    `columns` que existem no dataset, ou None se alguma delas ainda não foi
+    carregada: o pré-aquecimento não lê colunas que nenhuma página pediu.
+    """
+    columns = [c for c in columns if c in store.columns]
+    loaded = store.df.columns
+    return columns if all(c in loaded for c in columns) else None
+
+
+def _warm_indexes(store):
+    """Ordens de ranking por país e cidade (só colunas do núcleo, usadas por todas as páginas)."""
+    state = store._state
+    for index in [state.countries, state.cities]:
+        store._ranked(state, index, "rating_score")
+
+
+def _warm_country(store, put, cf):
+    """Resultados da seleção padrão das páginas de País, Cidades e Culinárias para `cf`."""
+    top_cols = _declared(store, WARM_TOP_COLUMNS)
+    city_cols = _declared(store, WARM_CITY_COLUMNS)
+    cuisine_cols = _declared(store, WARM_CUISINE_COLUMNS)
+    geo = _declared(store, WARM_GEO_COLUMNS) is not None
+
+    rows = put("rows", lambda: store.select(countries=cf), cf, None, None)
+    put("kpis", lambda: store.cube.query(countries=cf), cf, None, None)
+    put("rating_bins", lambda: histogram_bins(store.frame(rows, ["rating"])["rating"], nbins=20), cf, None, None)
+    if top_cols is not None:
+        put("top_table", lambda: store.frame(store.top_k(k=10, by="rating_score", countries=cf), top_cols)
+            .reset_index(drop=True), cf, None, None, 10)
+    city_counts = put("city_counts", lambda: store.cities.counts(rows=rows), cf, None, None)
+    cuisine_counts = put("cuisine_counts", lambda: store.cuisines.counts(rows=rows), cf, None, None)
+    if cuisine_cols is not None:
+        put("cuisine_top_table", lambda: store.frame(store.top_k(rows, k=50, by="rating_score"), cuisine_cols)
+            .astype(object).fillna("-"), cf, None, None, 50)
+
+    # página de Culinárias: boxplot das 12 mais frequentes e agregado por culinária
+    top_cuisines = cuisine_counts.index[:12].tolist()
+    if top_cuisines:
+        def cuisine_box():
+            subset = store.cuisines.explode(store.view(["rating"]), top_cuisines, ["rating"], rows=rows)
+            subset = subset.rename(columns={"key": "cuisines"}).dropna(subset=["rating"])
+            return box_stats(subset["cuisines"], subset["rating"], order=top_cuisines)
+        put("cuisine_box", cuisine_box, cf, None, tuple(top_cuisines))
+    put("cuisine_agg", lambda: (
+        store.cuisines.aggregate(store.df["rating"], rows=rows)
+        .rename(columns={"key": "cuisines", "mean": "rating_mean"})
+        .dropna(subset=["rating_mean"])
+    ), cf, None, None)
+
+    # página de Cidades: por padrão as 10 primeiras cidades (em ordem alfabética) do país
+    cities = sorted(city_counts.index.tolist())
+    cities = cities if len(cities) <= 10 else cities[:10]
+    city_rows = put("rows", lambda: store.select(countries=cf, cities=cities), cf, cities, None)
+    put("kpis", lambda: store.cube.query(countries=cf, cities=cities), cf, cities, None)
+    if geo:
+        put("map", lambda: store.geo.aggregate(city_rows, max_points=500), cf, cities, None)
+    if cities:
+        def city_box():
+            subset = store.frame(city_rows, ["city", "rating"])
+            return box_stats(subset["city"], subset["rating"], order=cities)
+        put("city_box", city_box, cf, tuple(cities))
+    if city_cols is not None:
+        put("city_top_table", lambda: store.frame(store.top_k(city_rows, k=50, by="rating_score"), city_cols)
+            .astype(object).fillna("-"), cf, cities, None, 50)
+
+
+def _warm_home(store, put):
+    """Home com a seleção padrão (todos os países, nenhuma culinária)."""
+    countries = store.countries.keys
+    rows = put("rows", lambda: store.select(countries=countries), countries, None, None)
+    put("kpis", lambda: store.cube.query(countries=countries), countries, None, None)
+    put("cuisine_counts", lambda: store.cuisines.counts(rows=rows), countries, None, None)
+    put("rating_bins", lambda: histogram_bins(store.frame(rows, ["rating"])["rating"], nbins=20),
+        countries, None, None)
+    if _declared(store, WARM_GEO_COLUMNS) is not None:
+        put("map", lambda: store.geo.aggregate(rows, max_points=500), countries, None, None)
+
+
+def _warm_nearby(store, put):
+    """Proximidade com a seleção padrão (primeiro país, primeira cidade, primeiro restaurante)."""
+    if _declared(store, WARM_GEO_COLUMNS) is None or len(store.spatial.rows) == 0:
+        return
+    cf = store.countries.keys[:1]
+    rows = put("rows", lambda: store.select(countries=cf), cf, None, None)
+    city_counts = put("city_counts", lambda: store.cities.counts(rows=rows), cf, None, None)
+    cities = sorted(city_counts.index.tolist())[:1]
+    if not cities:
+        return
+    city_rows = put("rows", lambda: store.select(countries=cf, cities=cities), cf, cities, None)
+    geo_rows = put("geo_rows", lambda: city_rows[store.geo.valid[city_rows]].tolist(), cf, cities, None)
+    if not geo_rows:
+        return
+    ref_row = geo_rows[0]
+    df = store.df
+    ref_lat, ref_lon = float(df["latitude"].iat[ref_row]), float(df["longitude"].iat[ref_row])
+    ref_cuisines = tuple(c.strip() for c in str(df["cuisines"].iat[ref_row]).split(",") if c.strip())
+    key = (ref_lat, ref_lon, NEARBY_RADIUS_KM, NEARBY_K, ref_row, ref_cuisines)
+
+    in_radius, nearest = put("nearby", lambda: store.nearby(ref_lat, ref_lon, NEARBY_RADIUS_KM, k=NEARBY_K,
+                                                            exclude=ref_row, cuisines=list(ref_cuisines)), *key)
+    put("nearby_rating", lambda: store.frame(in_radius["row"].to_numpy(), ["rating"])["rating"].mean(), *key)
+    if not in_radius.empty:
+        put("nearby_map", lambda: store.geo.aggregate(in_radius["row"].to_numpy(), max_points=500), *key)
+    table_cols = _declared(store, WARM_NEARBY_COLUMNS)
+    if not nearest.empty and table_cols is not None and "name" in table_cols and df["name"].notna().any():
+        def nearest_table():
+            table = store.frame(nearest["row"].to_numpy(), table_cols).reset_index(drop=True)
+            table.insert(0, "distância (km)", nearest["distance_km"].round(2))
+            return table
+        put("nearby_table", nearest_table, *key, tuple(table_cols))
+
+
+def warm_steps(store, put):
+    """
+    Etapas do pré-aquecimento, em ordem de prioridade: [(nome, função)].
+    As chaves espelham as chamadas de `derived` das páginas com a seleção padrão
+    (mudou uma página, ajustar aqui). Países mais frequentes primeiro.
+    """
+    steps = [("indexes", lambda: _warm_indexes(store)), ("home", lambda: _warm_home(store, put))]
+    steps.append(("Todos", lambda: _warm_country(store, put, None)))
+    steps.append(("nearby", lambda: _warm_nearby(store, put)))
+    for country in store.countries.counts().index:
+        steps.append((country, lambda cf=[country]: _warm_country(store, put, cf)))
+    return steps
+
+
+@st.cache_resource
+def start_warmup(path="dataset/zomato.csv"):
+    """Inicia o pré-aquecimento de `path` (uma vez por processo) e devolve o Warmup."""
+    global _warmup
+    _warmup = Warmup(path).start()
+    return _warmup
+
+
+def warm_result(key, compute):
+    """Resultado pré-aquecido de `key`, ou `compute()` quando ainda não existe."""
+    if _warmup is not None:
+        value = _warmup.lookup(key)
+        if value is not _MISSING:
+            return value
+    return compute()
+
+
+def render_warmup_status():
+    """Aviso discreto na sidebar enquanto o pré-aquecimento não terminou."""
+    if _warmup is None or _warmup.ready:
+        return
+    status = _warmup.status()
+    if status["state"] == "failed":
+        st.sidebar.caption(f"⚠️ Pré-aquecimento falhou: {status['error']}")
+    elif status["total"]:
+        st.sidebar.caption(f"⏳ Pré-aquecendo resultados ({status['done']}/{status['total']})…")
+    else:
+        st.sidebar.caption("⏳ Carregando dados…")